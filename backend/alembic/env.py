@@ -21,6 +21,13 @@ if config.config_file_name is not None:
 from models import Base
 target_metadata = Base.metadata
 
+# The app's DATABASE_URL (environment or backend/.env) wins over the URL in
+# alembic.ini, so migrations always target the database the app will use.
+from database import get_database_url
+database_url = get_database_url()
+if database_url:
+    config.set_main_option("sqlalchemy.url", database_url.replace("%", "%%"))
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
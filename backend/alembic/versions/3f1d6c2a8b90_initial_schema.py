@@ -0,0 +1,129 @@
+"""Initial schema
+
+Revision ID: 3f1d6c2a8b90
+Revises: 
+Create Date: 2026-10-19 09:12:41.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1d6c2a8b90'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Schema as it was created by Base.metadata.create_all() before the
+    # image_url migration, so a fresh database can be built with
+    # 'alembic upgrade head' alone.
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(), nullable=False),
+    sa.Column('password', sa.String(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email')
+    )
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_table('pokemon',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('tcg_id', sa.String(), nullable=True),
+    sa.Column('tcg_image_url', sa.String(), nullable=True),
+    sa.Column('tcg_set', sa.String(), nullable=True),
+    sa.Column('tcg_rarity', sa.String(), nullable=True),
+    sa.Column('types', sa.JSON(), nullable=True),
+    sa.Column('strengths', sa.JSON(), nullable=True),
+    sa.Column('weaknesses', sa.JSON(), nullable=True),
+    sa.Column('moves', sa.JSON(), nullable=True),
+    sa.Column('abilities', sa.JSON(), nullable=True),
+    sa.Column('hp', sa.Integer(), nullable=True),
+    sa.Column('attack', sa.Integer(), nullable=True),
+    sa.Column('defense', sa.Integer(), nullable=True),
+    sa.Column('special_attack', sa.Integer(), nullable=True),
+    sa.Column('special_defense', sa.Integer(), nullable=True),
+    sa.Column('speed', sa.Integer(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index(op.f('ix_pokemon_id'), 'pokemon', ['id'], unique=False)
+    op.create_table('trainers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('tcg_id', sa.String(), nullable=True),
+    sa.Column('tcg_image_url', sa.String(), nullable=True),
+    sa.Column('tcg_set', sa.String(), nullable=True),
+    sa.Column('tcg_rarity', sa.String(), nullable=True),
+    sa.Column('effect', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_trainers_id'), 'trainers', ['id'], unique=False)
+    op.create_table('energy',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('tcg_id', sa.String(), nullable=True),
+    sa.Column('tcg_image_url', sa.String(), nullable=True),
+    sa.Column('tcg_set', sa.String(), nullable=True),
+    sa.Column('tcg_rarity', sa.String(), nullable=True),
+    sa.Column('energy_type', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_energy_id'), 'energy', ['id'], unique=False)
+    op.create_table('decks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_decks_id'), 'decks', ['id'], unique=False)
+    op.create_table('deck_pokemon',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('deck_id', sa.Integer(), nullable=True),
+    sa.Column('pokemon_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['deck_id'], ['decks.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['pokemon_id'], ['pokemon.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_deck_pokemon_id'), 'deck_pokemon', ['id'], unique=False)
+    op.create_table('deck_trainers',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('deck_id', sa.Integer(), nullable=True),
+    sa.Column('trainer_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['deck_id'], ['decks.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['trainer_id'], ['trainers.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_deck_trainers_id'), 'deck_trainers', ['id'], unique=False)
+    op.create_table('deck_energy',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('deck_id', sa.Integer(), nullable=True),
+    sa.Column('energy_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['deck_id'], ['decks.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['energy_id'], ['energy.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_deck_energy_id'), 'deck_energy', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_deck_energy_id'), table_name='deck_energy')
+    op.drop_table('deck_energy')
+    op.drop_index(op.f('ix_deck_trainers_id'), table_name='deck_trainers')
+    op.drop_table('deck_trainers')
+    op.drop_index(op.f('ix_deck_pokemon_id'), table_name='deck_pokemon')
+    op.drop_table('deck_pokemon')
+    op.drop_index(op.f('ix_decks_id'), table_name='decks')
+    op.drop_table('decks')
+    op.drop_index(op.f('ix_energy_id'), table_name='energy')
+    op.drop_table('energy')
+    op.drop_index(op.f('ix_trainers_id'), table_name='trainers')
+    op.drop_table('trainers')
+    op.drop_index(op.f('ix_pokemon_id'), table_name='pokemon')
+    op.drop_table('pokemon')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_table('users')
@@ -1,7 +1,7 @@
 """Added image_url column to Pokemon table
 
 Revision ID: 9c4777fd0b4b
-Revises: 
+Revises: 3f1d6c2a8b90
 Create Date: 2025-02-22 16:23:23.518594
 
 """
@@ -13,7 +13,7 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision: str = '9c4777fd0b4b'
-down_revision: Union[str, None] = None
+down_revision: Union[str, None] = '3f1d6c2a8b90'
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
@@ -0,0 +1,33 @@
+"""Add jobs.owner_id
+
+Revision ID: a8d3f5e2c961
+Revises: f2b6d8a41c97
+Create Date: 2026-10-19 19:05:12.480213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8d3f5e2c961'
+down_revision: Union[str, None] = 'f2b6d8a41c97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.add_column(sa.Column('owner_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_jobs_owner_id_users', 'users', ['owner_id'], ['id'],
+                                    ondelete='SET NULL')
+        batch_op.create_index('ix_jobs_owner_id', ['owner_id'], unique=False)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('jobs') as batch_op:
+        batch_op.drop_index('ix_jobs_owner_id')
+        batch_op.drop_constraint('fk_jobs_owner_id_users', type_='foreignkey')
+        batch_op.drop_column('owner_id')
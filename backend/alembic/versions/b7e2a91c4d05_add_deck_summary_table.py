@@ -0,0 +1,43 @@
+"""Add deck_summary table
+
+Revision ID: b7e2a91c4d05
+Revises: 9c4777fd0b4b
+Create Date: 2026-10-19 11:40:12.530871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e2a91c4d05'
+down_revision: Union[str, None] = '9c4777fd0b4b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Existing decks get their rows from 'python deck_summary.py rebuild';
+    # until then GET /deck/ builds a missing summary on first read.
+    op.create_table('deck_summary',
+    sa.Column('deck_id', sa.Integer(), nullable=False),
+    sa.Column('pokemon_count', sa.Integer(), nullable=False),
+    sa.Column('trainer_count', sa.Integer(), nullable=False),
+    sa.Column('energy_count', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.Column('coverage', sa.Float(), nullable=False),
+    sa.Column('weakness', sa.Float(), nullable=False),
+    sa.Column('stats', sa.Float(), nullable=False),
+    sa.Column('energy', sa.Float(), nullable=False),
+    sa.Column('strengths', sa.JSON(), nullable=True),
+    sa.Column('weaknesses', sa.JSON(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.ForeignKeyConstraint(['deck_id'], ['decks.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('deck_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('deck_summary')
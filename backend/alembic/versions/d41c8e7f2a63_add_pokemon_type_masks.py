@@ -0,0 +1,102 @@
+"""Add type mask columns to pokemon
+
+Revision ID: d41c8e7f2a63
+Revises: b7e2a91c4d05
+Create Date: 2026-10-19 14:05:31.208114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41c8e7f2a63'
+down_revision: Union[str, None] = 'b7e2a91c4d05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The type bit layout as of this revision (bit i is TYPES[i]), with each
+# type's strong-against and weak-to masks, copied here so the backfill does
+# not change if the app's type chart does.
+TYPES = ('Normal', 'Fire', 'Water', 'Electric', 'Grass', 'Ice',
+         'Fighting', 'Poison', 'Ground', 'Flying', 'Psychic', 'Bug',
+         'Rock', 'Ghost', 'Dragon', 'Dark', 'Steel', 'Fairy')
+STRONG_AGAINST = {
+    'Normal': 0x0, 'Fire': 0x10830, 'Water': 0x1102, 'Electric': 0x204,
+    'Grass': 0x1104, 'Ice': 0x4310, 'Fighting': 0x19021, 'Poison': 0x20010,
+    'Ground': 0x1108a, 'Flying': 0x850, 'Psychic': 0xc0, 'Bug': 0x8410,
+    'Rock': 0xa22, 'Ghost': 0x2400, 'Dragon': 0x4000, 'Dark': 0x2400,
+    'Steel': 0x21020, 'Fairy': 0xc040,
+}
+WEAK_TO = {
+    'Normal': 0x40, 'Fire': 0x1104, 'Water': 0x18, 'Electric': 0x100,
+    'Grass': 0xaa2, 'Ice': 0x11042, 'Fighting': 0x20600, 'Poison': 0x500,
+    'Ground': 0x34, 'Flying': 0x1028, 'Psychic': 0xa800, 'Bug': 0x1202,
+    'Rock': 0x10154, 'Ghost': 0xa000, 'Dragon': 0x24020, 'Dark': 0x20840,
+    'Steel': 0x142, 'Fairy': 0x10080,
+}
+
+
+def _mask(names):
+    bits = {p_type: 1 << i for i, p_type in enumerate(TYPES)}
+    mask = 0
+    for name in names or ():
+        mask |= bits.get(str(name).capitalize(), 0)
+    return mask
+
+
+def _derived(types_mask, table):
+    mask = 0
+    for i, p_type in enumerate(TYPES):
+        if types_mask & (1 << i):
+            mask |= table[p_type]
+    return mask
+
+
+def _type_profile_masks(types, strengths, weaknesses):
+    types_mask = _mask(types)
+    return (
+        types_mask,
+        _mask(strengths) if strengths is not None else _derived(types_mask, STRONG_AGAINST),
+        _mask(weaknesses) if weaknesses is not None else _derived(types_mask, WEAK_TO),
+    )
+
+
+def upgrade() -> None:
+    op.add_column('pokemon', sa.Column('types_mask', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('pokemon', sa.Column('strengths_mask', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('pokemon', sa.Column('weaknesses_mask', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the JSON columns; new rows get their masks from the
+    # Pokemon model's before_insert/before_update listener.
+    pokemon = sa.table('pokemon', sa.column('id', sa.Integer), sa.column('types', sa.JSON),
+                       sa.column('strengths', sa.JSON), sa.column('weaknesses', sa.JSON),
+                       sa.column('types_mask', sa.Integer), sa.column('strengths_mask', sa.Integer),
+                       sa.column('weaknesses_mask', sa.Integer))
+    connection = op.get_bind()
+    rows = connection.execute(sa.select(pokemon.c.id, pokemon.c.types, pokemon.c.strengths,
+                                        pokemon.c.weaknesses)).all()
+    updates = []
+    for row in rows:
+        types, strengths, weaknesses = _type_profile_masks(row.types, row.strengths, row.weaknesses)
+        updates.append({'row_id': row.id, 'new_types': types,
+                        'new_strengths': strengths, 'new_weaknesses': weaknesses})
+    if updates:
+        connection.execute(
+            pokemon.update().where(pokemon.c.id == sa.bindparam('row_id'))
+            .values(types_mask=sa.bindparam('new_types'),
+                    strengths_mask=sa.bindparam('new_strengths'),
+                    weaknesses_mask=sa.bindparam('new_weaknesses')),
+            updates)
+
+    op.create_index('ix_pokemon_type_masks', 'pokemon',
+                    ['types_mask', 'strengths_mask', 'weaknesses_mask', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_pokemon_type_masks', table_name='pokemon')
+    op.drop_column('pokemon', 'weaknesses_mask')
+    op.drop_column('pokemon', 'strengths_mask')
+    op.drop_column('pokemon', 'types_mask')
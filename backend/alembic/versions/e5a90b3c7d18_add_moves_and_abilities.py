@@ -0,0 +1,65 @@
+"""Add moves and abilities tables
+
+Revision ID: e5a90b3c7d18
+Revises: d41c8e7f2a63
+Create Date: 2026-10-19 16:42:08.551237
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5a90b3c7d18'
+down_revision: Union[str, None] = 'd41c8e7f2a63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('moves',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('type', sa.String(), nullable=True),
+    sa.Column('power', sa.Integer(), nullable=True),
+    sa.Column('accuracy', sa.Integer(), nullable=True),
+    sa.Column('pp', sa.Integer(), nullable=True),
+    sa.Column('damage_class', sa.String(), nullable=True),
+    sa.Column('effect', sa.String(), nullable=True),
+    sa.Column('has_details', sa.Boolean(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('abilities',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('effect', sa.String(), nullable=True),
+    sa.Column('has_details', sa.Boolean(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('pokemon_moves',
+    sa.Column('pokemon_id', sa.Integer(), nullable=False),
+    sa.Column('move_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['move_id'], ['moves.id'], ),
+    sa.ForeignKeyConstraint(['pokemon_id'], ['pokemon.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('pokemon_id', 'move_id')
+    )
+    op.create_table('pokemon_abilities',
+    sa.Column('pokemon_id', sa.Integer(), nullable=False),
+    sa.Column('ability_id', sa.Integer(), nullable=False),
+    sa.Column('is_hidden', sa.Boolean(), nullable=False),
+    sa.Column('slot', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['ability_id'], ['abilities.id'], ),
+    sa.ForeignKeyConstraint(['pokemon_id'], ['pokemon.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('pokemon_id', 'ability_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('pokemon_abilities')
+    op.drop_table('pokemon_moves')
+    op.drop_table('abilities')
+    op.drop_table('moves')
@@ -0,0 +1,53 @@
+"""Add jobs table and pokemon.has_image
+
+Revision ID: f2b6d8a41c97
+Revises: e5a90b3c7d18
+Create Date: 2026-10-19 18:20:44.102385
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b6d8a41c97'
+down_revision: Union[str, None] = 'e5a90b3c7d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(length=64), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=True),
+    sa.Column('status', sa.String(length=16), nullable=False),
+    sa.Column('dedupe_key', sa.String(length=255), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('locked_by', sa.String(length=255), nullable=True),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('result', sa.JSON(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_jobs_type', 'jobs', ['type'], unique=False)
+    op.create_index('ix_jobs_claim', 'jobs', ['status', 'run_at', 'id'], unique=False)
+    op.create_index('uq_jobs_active_dedupe_key', 'jobs', ['dedupe_key'], unique=True,
+                    sqlite_where=sa.text("status IN ('queued', 'running')"),
+                    postgresql_where=sa.text("status IN ('queued', 'running')"))
+    op.add_column('pokemon', sa.Column('has_image', sa.Boolean(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('pokemon', 'has_image')
+    op.drop_index('uq_jobs_active_dedupe_key', table_name='jobs')
+    op.drop_index('ix_jobs_claim', table_name='jobs')
+    op.drop_index('ix_jobs_type', table_name='jobs')
+    op.drop_table('jobs')
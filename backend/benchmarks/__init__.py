@@ -0,0 +1,7 @@
+"""
+    Benchmarks for the deck builder backend.
+
+    Run them from the 'backend' folder, e.g.:
+        python -m benchmarks.load_test --output results.json
+        python -m benchmarks.compare before.json after.json
+"""
@@ -0,0 +1,105 @@
+import argparse
+import gc
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+"""
+    Compares the memory used by the Pokémon catalogue when it is loaded as
+    ORM objects (db.query(Pokemon).all(), as a session holds them) and as the
+    columnar PokemonCatalogue, on a temporary SQLite database filled with
+    synthetic Pokémon.
+
+    Usage (from the 'backend' folder):
+        python -m benchmarks.catalogue_memory --pokemon 1025
+"""
+
+
+def _fill(pokemon: int, seed: int):
+    from database import SessionLocal, create_tables
+    from models import Pokemon
+    from type_matchups import type_chart, get_strengths_and_weaknesses
+
+    create_tables()
+    rng = random.Random(seed)
+    types = list(type_chart)
+    db = SessionLocal()
+    try:
+        for pokemon_id in range(1, pokemon + 1):
+            pokemon_types = rng.sample(types, rng.choice((1, 2)))
+            strengths, weaknesses = get_strengths_and_weaknesses(pokemon_types)
+            db.add(Pokemon(
+                id=pokemon_id, name=f"pokemon-{pokemon_id}",
+                image_url=f"https://example.invalid/sprites/{pokemon_id}.png",
+                types=pokemon_types, strengths=strengths, weaknesses=weaknesses,
+                moves=["tackle", "growl", "ember", "protect"],
+                abilities=["blaze", "solar-power"],
+                **{column: rng.randint(20, 160) for column in
+                   ("hp", "attack", "defense", "special_attack", "special_defense", "speed")},
+            ))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _measure(db, load):
+    """
+        Returns (result, traced bytes still held, seconds). The time comes
+        from a separate untraced run, since tracing slows allocation down.
+    """
+
+    start = time.perf_counter()
+    load()
+    seconds = time.perf_counter() - start
+    db.expunge_all()
+
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark catalogue memory use.")
+    parser.add_argument("--pokemon", type=int, default=1025)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'catalogue.db')}"
+    from database import SessionLocal
+    from models import Pokemon
+    from pokemon_catalogue import build_catalogue
+
+    _fill(args.pokemon, args.seed)
+
+    db = SessionLocal()
+    try:
+        # The ORM objects stay referenced by the session's identity map (and
+        # the returned list) while they are measured.
+        orm_objects, orm_bytes, orm_seconds = _measure(db, lambda: db.query(Pokemon).all())
+        assert len(orm_objects) == args.pokemon
+        del orm_objects
+        db.expunge_all()
+
+        catalogue, columnar_bytes, columnar_seconds = _measure(db, lambda: build_catalogue(db))
+        assert len(catalogue) == args.pokemon
+    finally:
+        db.close()
+
+    n = args.pokemon
+    print(f"Pokémon: {n}")
+    print(f"ORM objects: {orm_bytes / n:8.0f} bytes/record, "
+          f"{orm_bytes / 1024:8.0f} KiB, load {orm_seconds * 1000:6.1f} ms")
+    print(f"columnar:    {columnar_bytes / n:8.0f} bytes/record, "
+          f"{columnar_bytes / 1024:8.0f} KiB, load {columnar_seconds * 1000:6.1f} ms "
+          f"({catalogue.records.itemsize} bytes/record in the array)")
+    return {"orm_bytes": orm_bytes, "columnar_bytes": columnar_bytes}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import json
+
+"""
+    Compares two JSON reports written by 'benchmarks.load_test' and prints
+    the change per endpoint, e.g. between the parent commit and a branch.
+
+    Usage:
+        python -m benchmarks.compare before.json after.json
+"""
+
+
+METRICS = (
+    ("rps", lambda r: r["rps"]),
+    ("p50", lambda r: r["latency_ms"]["p50"]),
+    ("p95", lambda r: r["latency_ms"]["p95"]),
+    ("p99", lambda r: r["latency_ms"]["p99"]),
+    ("db/req", lambda r: r["db_queries_per_request"]),
+    ("out/req", lambda r: r["outbound_calls_per_request"]),
+)
+
+
+def compare(before: dict, after: dict):
+    """
+        Pairs up endpoint results from two reports.
+        Args:
+            before (dict): The baseline report.
+            after (dict): The report to compare against it.
+        Returns:
+            list: One dict per endpoint, mapping metric name to
+            (before, after, percent change).
+    """
+
+    old = {r["endpoint"]: r for r in before["results"]}
+    rows = []
+    for result in after["results"]:
+        base = old.get(result["endpoint"])
+        if not base:
+            continue
+        row = {"endpoint": result["endpoint"]}
+        for name, getter in METRICS:
+            a, b = getter(base), getter(result)
+            change = ((b - a) / a * 100) if a else 0.0
+            row[name] = (a, b, round(change, 1))
+        rows.append(row)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Diff two load test reports.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args(argv)
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+
+    print(f"before: {before.get('commit')}  after: {after.get('commit')}")
+    for row in compare(before, after):
+        print(row["endpoint"])
+        for name, _ in METRICS:
+            a, b, change = row[name]
+            print(f"  {name:<8} {a:>10.2f} -> {b:>10.2f}  ({change:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
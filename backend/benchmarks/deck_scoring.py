@@ -0,0 +1,74 @@
+import argparse
+import time
+import numpy as np
+
+"""
+    Compares batch deck scoring (one score_arrays() call over all decks)
+    with scoring each deck on its own, on synthetic decks.
+
+    Usage (from the 'backend' folder):
+        python -m benchmarks.deck_scoring --decks 10000 --deck-size 20
+"""
+
+
+def synthetic_links(decks: int, deck_size: int, seed: int):
+    """
+        Builds random (deck, Pokémon) and (deck, Energy) link arrays.
+        Returns:
+            tuple: Arguments for deck_analytics.score_arrays().
+    """
+
+    from deck_analytics import TYPES
+
+    rng = np.random.default_rng(seed)
+    n_types = len(TYPES)
+    catalogue = np.zeros((1000, n_types), dtype=bool)
+    catalogue[np.arange(1000), rng.integers(0, n_types, 1000)] = True
+    dual = rng.random(1000) < 0.4
+    catalogue[np.flatnonzero(dual), rng.integers(0, n_types, dual.sum())] = True
+    stats = rng.integers(200, 700, 1000).astype(float)
+
+    pokemon_deck = np.repeat(np.arange(decks), deck_size)
+    picks = rng.integers(0, 1000, decks * deck_size)
+    energy_deck = np.repeat(np.arange(decks), deck_size // 2)
+    energy_types = np.zeros((len(energy_deck), n_types), dtype=bool)
+    energy_types[np.arange(len(energy_deck)), rng.integers(0, n_types, len(energy_deck))] = True
+    return decks, pokemon_deck, catalogue[picks], stats[picks], energy_deck, energy_types
+
+
+def main(argv=None):
+    from deck_analytics import score_arrays
+
+    parser = argparse.ArgumentParser(description="Benchmark batch deck scoring.")
+    parser.add_argument("--decks", type=int, default=10000)
+    parser.add_argument("--deck-size", type=int, default=20)
+    parser.add_argument("--loop-sample", type=int, default=500,
+                        help="Decks scored one by one (extrapolated to --decks).")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    n, pokemon_deck, pokemon_types, stats, energy_deck, energy_types = synthetic_links(
+        args.decks, args.deck_size, args.seed)
+
+    start = time.perf_counter()
+    batch = score_arrays(n, pokemon_deck, pokemon_types, stats, energy_deck, energy_types)
+    batch_seconds = time.perf_counter() - start
+
+    sample = min(args.loop_sample, n)
+    start = time.perf_counter()
+    for deck in range(sample):
+        p = pokemon_deck == deck
+        e = energy_deck == deck
+        single = score_arrays(1, np.zeros(p.sum(), dtype=np.intp), pokemon_types[p],
+                              stats[p], np.zeros(e.sum(), dtype=np.intp), energy_types[e])
+        assert single["score"][0] == batch["score"][deck]
+    loop_seconds = (time.perf_counter() - start) / sample * n
+
+    print(f"decks: {n}, Pokémon per deck: {args.deck_size}")
+    print(f"batch:    {batch_seconds * 1000:9.1f} ms ({n / batch_seconds:,.0f} decks/s)")
+    print(f"per deck: {loop_seconds * 1000:9.1f} ms (extrapolated from {sample} decks)")
+    return {"batch_seconds": batch_seconds, "loop_seconds": loop_seconds}
+
+
+if __name__ == "__main__":
+    main()
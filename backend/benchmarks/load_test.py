@@ -0,0 +1,336 @@
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+"""
+    Load test for the deck API hot paths.
+
+    Boots the app under uvicorn against SQLite (default) or a local PostgreSQL
+    database, with every third-party upstream replaced by the offline stub
+    server. It seeds users with realistically sized decks, waits for the
+    startup warm-up to finish (GET /ready), then drives concurrent traffic
+    at each endpoint in turn and reports, per endpoint: requests/second,
+    p50/p95/p99 latency, database queries per request and outbound
+    (upstream) calls per request.
+
+    Results are written as JSON so two runs can be diffed with
+    'python -m benchmarks.compare'.
+
+    Usage (from the 'backend' folder):
+        python -m benchmarks.load_test --users 50 --deck-size 20 \\
+            --concurrency 16 --requests 500 --output results.json
+        python -m benchmarks.load_test --database-url postgresql://...
+"""
+
+
+ENDPOINTS = ("auth_login", "deck_get", "deck_post", "pokemon_get")
+
+BENCH_PASSWORD = "bench-password"
+
+
+def percentile(sorted_values, pct):
+    """
+        Nearest-rank percentile of an already sorted list.
+        Args:
+            sorted_values (list): Values in ascending order.
+            pct (float): Percentile between 0 and 100.
+        Returns:
+            float: The percentile value, or 0.0 for an empty list.
+    """
+
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class QueryCounter:
+    """
+        Counts SQL statements sent through an engine, via SQLAlchemy events.
+    """
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self._lock = threading.Lock()
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+
+
+def seed_database(db, corpus, users: int, deck_size: int, rng):
+    """
+        Loads the fixture catalogue and creates benchmark users with decks.
+        Args:
+            db (Session): The database session.
+            corpus (FixtureCorpus): The stub server's fixture corpus.
+            users (int): How many users (one deck each) to create.
+            deck_size (int): Pokémon per deck; Trainer and Energy cards are
+                added at roughly the ratio a real TCG deck uses.
+            rng (Random): Random source for deck contents.
+        Returns:
+            list: The created users' emails.
+    """
+
+    from models import User, Pokemon, Trainer, Energy, Deck, DeckPokemon, DeckTrainer, DeckEnergy
+    from auth import hash_password
+    from tcg_routes import cache_tcg_data
+    from pokemon_provider import fetch_pokemon_data, pokemon_columns
+
+    for pokemon_id in corpus.pokemon:
+        if not db.get(Pokemon, pokemon_id):
+            db.add(Pokemon(**pokemon_columns(fetch_pokemon_data(pokemon_id))))
+    db.commit()
+    cache_tcg_data(db)
+
+    pokemon_ids = list(corpus.pokemon)
+    trainer_ids = [t.id for t in db.query(Trainer.id)]
+    energy_ids = [e.id for e in db.query(Energy.id)]
+    password = hash_password(BENCH_PASSWORD)
+
+    run_tag = f"{int(time.time())}-{rng.randrange(1 << 30)}"
+    emails = []
+    for i in range(users):
+        email = f"bench-{run_tag}-{i}@example.com"
+        user = User(email=email, password=password)
+        db.add(user)
+        db.flush()
+        deck = Deck(user_id=user.id)
+        db.add(deck)
+        db.flush()
+        for pokemon_id in rng.sample(pokemon_ids, min(deck_size, len(pokemon_ids))):
+            db.add(DeckPokemon(deck_id=deck.id, pokemon_id=pokemon_id))
+        for trainer_id in rng.sample(trainer_ids, min(deck_size // 2, len(trainer_ids))):
+            db.add(DeckTrainer(deck_id=deck.id, trainer_id=trainer_id))
+        for energy_id in rng.sample(energy_ids, min(deck_size // 2, len(energy_ids))):
+            db.add(DeckEnergy(deck_id=deck.id, energy_id=energy_id))
+        emails.append(email)
+    db.commit()
+    return emails
+
+
+def start_app_server(app, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port,
+                                           log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def wait_until_ready(base_url, timeout=300.0):
+    """
+        Polls GET /ready until the startup warm-up has finished, so its
+        upstream calls and queries are not counted against the first
+        endpoint measured.
+        Raises:
+            TimeoutError: If the app is not ready within timeout seconds.
+    """
+
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    with httpx.Client(base_url=base_url, timeout=10) as http:
+        while http.get("/ready").status_code != 200:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"App not ready after {timeout:.0f}s")
+            time.sleep(0.1)
+
+
+def run_endpoint(name, base_url, users, pokemon_ids, requests_total, concurrency, rng_seed):
+    """
+        Fires requests_total requests at one endpoint from concurrency threads.
+        Returns:
+            tuple: (latencies in ms, error count, wall time in seconds)
+    """
+
+    import httpx
+
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    remaining = [requests_total]
+
+    def worker(worker_id):
+        nonlocal errors
+        rng = random.Random(rng_seed + worker_id)
+        with httpx.Client(base_url=base_url, timeout=60) as http:
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                email, token = rng.choice(users)
+                headers = {"Authorization": f"Bearer {token}"}
+                start = time.perf_counter()
+                if name == "auth_login":
+                    response = http.post("/auth/login",
+                                         json={"email": email, "password": BENCH_PASSWORD})
+                elif name == "deck_get":
+                    response = http.get("/deck/", headers=headers)
+                elif name == "deck_post":
+                    response = http.post("/deck/", headers=headers, json={
+                        "pokemon_ids": rng.sample(pokemon_ids, 2),
+                        "trainer_names": [],
+                        "energy_types": [],
+                    })
+                else:
+                    response = http.get(f"/pokemon/{rng.choice(pokemon_ids)}",
+                                        headers=headers)
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    if response.status_code >= 400:
+                        errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return latencies, errors, time.perf_counter() - start
+
+
+def summarise(name, latencies, errors, wall, queries, outbound):
+    ordered = sorted(latencies)
+    count = len(ordered)
+    return {
+        "endpoint": name,
+        "requests": count,
+        "errors": errors,
+        "rps": round(count / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(sum(ordered) / count, 3) if count else 0.0,
+            "p50": round(percentile(ordered, 50), 3),
+            "p95": round(percentile(ordered, 95), 3),
+            "p99": round(percentile(ordered, 99), 3),
+            "max": round(ordered[-1], 3) if count else 0.0,
+        },
+        "db_queries": queries,
+        "db_queries_per_request": round(queries / count, 2) if count else 0.0,
+        "outbound_calls": outbound,
+        "outbound_calls_per_request": (round(sum(outbound.values()) / count, 2)
+                                       if count else 0.0),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the deck API hot paths.")
+    parser.add_argument("--database-url",
+                        help="Defaults to a fresh SQLite file in the temp folder.")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--deck-size", type=int, default=20,
+                        help="Pokémon per deck (Trainer/Energy scale with it).")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200,
+                        help="Requests per endpoint.")
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--upstream-latency-ms", type=float, default=20.0)
+    parser.add_argument("--upstream-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--upstream-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write JSON results to this file.")
+    args = parser.parse_args(argv)
+
+    from stub_server import StubUpstreamServer
+
+    stub = StubUpstreamServer(latency_ms=args.upstream_latency_ms,
+                              jitter_ms=args.upstream_jitter_ms,
+                              error_rate=args.upstream_error_rate,
+                              seed=args.seed).start()
+    database_url = args.database_url or (
+        f"sqlite:///{tempfile.mkstemp(prefix='deck_bench_', suffix='.db')[1]}")
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.update(stub.env())
+
+    from main import app
+    from auth import create_access_token
+    from database import SessionLocal, create_tables, get_engine
+
+    create_tables()
+    rng = random.Random(args.seed)
+    db = SessionLocal()
+    try:
+        emails = seed_database(db, stub.corpus, args.users, args.deck_size, rng)
+    finally:
+        db.close()
+    users = [(email, create_access_token({"sub": email})) for email in emails]
+    pokemon_ids = list(stub.corpus.pokemon)
+
+    port = _free_port()
+    server, thread = start_app_server(app, port)
+    base_url = f"http://127.0.0.1:{port}"
+    counter = QueryCounter(get_engine())
+
+    results = []
+    try:
+        wait_until_ready(base_url)
+        for name in args.endpoints:
+            counter.reset()
+            stub.reset_stats()
+            latencies, errors, wall = run_endpoint(name, base_url, users, pokemon_ids,
+                                                   args.requests, args.concurrency,
+                                                   args.seed)
+            outbound = {k: v for k, v in stub.stats().items() if k != "errors"}
+            results.append(summarise(name, latencies, errors, wall, counter.count, outbound))
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+        stub.stop()
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "database": database_url.split(":", 1)[0],
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "database_url")},
+        "results": results,
+    }
+
+    print(f"{'endpoint':<12} {'req':>6} {'err':>5} {'rps':>9} {'p50':>9} {'p95':>9} "
+          f"{'p99':>9} {'db/req':>7} {'out/req':>8}")
+    for r in results:
+        lat = r["latency_ms"]
+        print(f"{r['endpoint']:<12} {r['requests']:>6} {r['errors']:>5} {r['rps']:>9.1f} "
+              f"{lat['p50']:>9.1f} {lat['p95']:>9.1f} {lat['p99']:>9.1f} "
+              f"{r['db_queries_per_request']:>7.1f} {r['outbound_calls_per_request']:>8.1f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
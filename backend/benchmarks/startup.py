@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+"""
+    Measures how long the API takes to start.
+
+    Each run is a fresh Python process (so nothing is cached in memory) that
+    times 'import main', runs the app's lifespan startup and serves a first
+    request to GET /. It also reports whether importing the app created a
+    database engine, which it should not: the schema is migrated separately
+    with Alembic and connections are opened on first use.
+
+    Usage (from the 'backend' folder):
+        python -m benchmarks.startup --runs 5 --output startup.json
+"""
+
+
+PROBE = r"""
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+import database
+engine_at_import = database._engine is not None
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    started = time.perf_counter()
+    status = client.get("/").status_code
+    first = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "lifespan_ms": (started - imported) * 1000,
+    "first_response_ms": (first - start) * 1000,
+    "status": status,
+    "engine_at_import": engine_at_import,
+}))
+"""
+
+
+def measure_once(env):
+    """
+        Starts one fresh interpreter and returns its timings.
+        Args:
+            env (dict): Environment for the child process.
+        Returns:
+            dict: import_ms, lifespan_ms, first_response_ms, status and
+            engine_at_import.
+    """
+
+    output = subprocess.check_output([sys.executable, "-c", PROBE], env=env,
+                                     cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                     text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure API startup time.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--database-url",
+                        help="Defaults to a SQLite file in the temp folder.")
+    parser.add_argument("--output", help="Write JSON results to this file.")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, LOG_LEVEL="WARNING")
+    # The cache warm-up runs in the background and reports its own duration
+    # on GET /ready; it is left out so runs do not depend on the network.
+    env.setdefault("WARMUP_ENABLED", "0")
+    env["DATABASE_URL"] = args.database_url or (
+        f"sqlite:///{os.path.join(tempfile.gettempdir(), 'deck_startup.db')}")
+
+    runs = [measure_once(env) for _ in range(args.runs)]
+    report = {"runs": runs}
+    for key in ("import_ms", "lifespan_ms", "first_response_ms"):
+        values = [run[key] for run in runs]
+        report[key] = {"median": round(statistics.median(values), 1),
+                       "max": round(max(values), 1)}
+    report["engine_at_import"] = any(run["engine_at_import"] for run in runs)
+
+    for key in ("import_ms", "lifespan_ms", "first_response_ms"):
+        print(f"{key:<18} median {report[key]['median']:>8.1f}  max {report[key]['max']:>8.1f}")
+    print(f"{'engine_at_import':<18} {report['engine_at_import']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
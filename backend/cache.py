@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+from profiling import METRICS
+
+"""
+    This module provides the small in-process caches used in front of the
+    third-party APIs (PokéAPI data, type listings, image probes) and the
+    Trainer/Energy catalogue.
+
+    Every CountingCache registers itself by name and counts hits and misses,
+    so the warm-up report (GET /ready) and GET /metrics can show how well
+    each cache is doing.
+"""
+
+
+_MISSING = object()
+
+_caches = {}
+_registry_lock = threading.Lock()
+
+
+class CountingCache:
+    """
+        A thread-safe LRU cache that counts hits and misses.
+
+        Args:
+            name (str): Unique name used in reports and metrics.
+            maxsize (int, optional): Maximum entries; the least recently used
+                entry is evicted beyond it. None means unbounded.
+            ttl (float, optional): Seconds an entry stays valid. None means
+                entries never expire.
+    """
+
+    def __init__(self, name: str, maxsize: int = None, ttl: float = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _caches[name] = self
+
+    def get(self, key, default=None):
+        """
+            Returns the cached value for key, or default on a miss.
+        """
+
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            if self.maxsize is not None and len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            return entry is not _MISSING and (entry[1] is None or entry[1] > time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+            Returns:
+                dict: size, hits, misses and hit_rate (None before any lookup).
+        """
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def cache_stats():
+    """
+        Returns:
+            dict: cache name -> CountingCache.stats()
+    """
+
+    with _registry_lock:
+        caches = list(_caches.values())
+    return {cache.name: cache.stats() for cache in caches}
+
+
+def clear_all():
+    """
+        Empties every registered cache (e.g. after pointing the app at
+        different upstream URLs).
+    """
+
+    with _registry_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.clear()
+
+
+def _collect_metrics():
+    for name, stats in cache_stats().items():
+        labels = {"cache": name}
+        METRICS.set("cache_hits_total", labels, stats["hits"])
+        METRICS.set("cache_misses_total", labels, stats["misses"])
+        METRICS.set("cache_entries", labels, stats["size"])
+
+
+METRICS.describe("cache_hits_total", "Cache lookups that found a value, by cache.")
+METRICS.describe("cache_misses_total", "Cache lookups that found nothing, by cache.")
+METRICS.describe("cache_entries", "Entries currently held, by cache.")
+METRICS.add_collector(_collect_metrics)
@@ -1,41 +1,394 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, event, insert, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
 from dotenv import load_dotenv
+import contextvars
+import logging
+import math
 import os
+import random
+import threading
+import time
 
 """
     This module sets up the database connection and session for the application.
-    It loads environment variables, creates the SQLAlchemy engine, and defines 
-    the base class for models.
+    Nothing happens at import time: the .env file is read and the SQLAlchemy
+    engine is created the first time a session (or the engine) is needed, so
+    importing the app is cheap and never touches the database.
+
+    The schema is managed with Alembic ('alembic upgrade head'); the app itself
+    never runs DDL on startup.
+
+    Read replicas (DATABASE_REPLICA_URLS, comma-separated) are optional.
+    SessionLocal() always uses the primary; ReadSessionLocal() sends queries
+    to a replica until the session writes, and from then on to the primary.
+    A replica is only used while its replication lag is below
+    REPLICA_MAX_LAG_SECONDS. For read-your-writes, the client carries the
+    time of its last write: ReadYourWritesMiddleware sets a "last_write"
+    cookie when a request commits a write, and read sessions of requests
+    sending a cookie younger than READ_YOUR_WRITES_SECONDS use the primary.
+    Nothing is kept in the process, so this holds across workers and hosts.
 """
 
-env_path = os.path.join(os.path.dirname(__file__), ".env")
-load_dotenv(env_path)
+logger = logging.getLogger(__name__)
 
-print("DEBUG: DATABASE_URL =", os.getenv("DATABASE_URL"))
+ENV_PATH = os.path.join(os.path.dirname(__file__), ".env")
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+Base = declarative_base()
 
-engine = create_engine(DATABASE_URL)
+_engine = None
+_engine_lock = threading.Lock()
+_engine_hooks = []
+_env_loaded = False
+_replicas = None
+_replica_lag = {}
 
+LAST_WRITE_COOKIE = "last_write"
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# The last-write time sent by the client and the one committed by the
+# current request, shared by all sessions of the request.
+_request_writes = contextvars.ContextVar("request_writes", default=None)
 
-Base = declarative_base()
+
+def load_environment():
+    """
+        Loads the backend's .env file into the process environment (once).
+        Variables that are already set are left alone.
+    """
+
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv(ENV_PATH)
+        _env_loaded = True
+
+
+def get_database_url():
+    """
+        Returns the configured DATABASE_URL.
+    """
+
+    load_environment()
+    return os.getenv("DATABASE_URL")
+
+
+def on_engine_created(hook):
+    """
+        Registers a callback that receives the engine once it exists
+        (immediately, if it has already been created).
+        Args:
+            hook (callable): Called with the Engine.
+    """
+
+    _engine_hooks.append(hook)
+    if _engine is not None:
+        hook(_engine)
+    for replica in _replicas or []:
+        hook(replica)
+
+
+def get_engine():
+    """
+        Returns the SQLAlchemy engine, creating it on first use.
+        Returns:
+            Engine: The shared engine.
+    """
+
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                url = get_database_url()
+                engine = create_engine(url, pool_pre_ping=True)
+                logger.debug("Database engine created", extra={
+                    "database_url": make_url(url).render_as_string(hide_password=True)})
+                for hook in _engine_hooks:
+                    hook(engine)
+                _engine = engine
+    return _engine
+
+
+def get_replica_engines():
+    """
+        Returns the read replica engines (DATABASE_REPLICA_URLS), creating
+        them on first use; an empty list when none are configured.
+    """
+
+    global _replicas
+    if _replicas is None:
+        with _engine_lock:
+            if _replicas is None:
+                load_environment()
+                urls = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",")
+                        if url.strip()]
+                engines = [create_engine(url, pool_pre_ping=True) for url in urls]
+                for engine in engines:
+                    for hook in _engine_hooks:
+                        hook(engine)
+                _replicas = engines
+    return _replicas
+
+
+def set_replica_engines(engines):
+    """
+        Replaces the replica engines (None reads DATABASE_REPLICA_URLS again
+        on next use) and forgets the measured lag.
+    """
+
+    global _replicas
+    _replicas = engines
+    _replica_lag.clear()
+
+
+def replica_lag(engine) -> float:
+    """
+        Returns how many seconds a replica is behind the primary: measured
+        on PostgreSQL, assumed 0 for other databases, and infinite if the
+        replica cannot be queried.
+    """
+
+    if engine.dialect.name != "postgresql":
+        return 0.0
+    try:
+        with engine.connect() as connection:
+            lag = connection.execute(text(
+                "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+                "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END")).scalar()
+    except Exception:
+        logger.warning("Replica %s is unreachable", engine.url.host, exc_info=True)
+        return math.inf
+    return float(lag or 0.0)
+
+
+def _current_lag(engine) -> float:
+    checked = _replica_lag.get(engine)
+    now = time.monotonic()
+    if checked is None or now - checked[1] > float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "2")):
+        checked = _replica_lag[engine] = (replica_lag(engine), now)
+    return checked[0]
+
+
+def choose_replica():
+    """
+        Picks a random replica among those less than REPLICA_MAX_LAG_SECONDS
+        behind (lag is measured at most every REPLICA_LAG_CHECK_SECONDS).
+        Returns:
+            Engine: A replica, or None if none is healthy.
+    """
+
+    max_lag = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+    healthy = [engine for engine in get_replica_engines() if _current_lag(engine) <= max_lag]
+    return random.choice(healthy) if healthy else None
+
+
+def read_your_writes_seconds() -> float:
+    return float(os.getenv("READ_YOUR_WRITES_SECONDS",
+                           os.getenv("REPLICA_MAX_LAG_SECONDS", "5")))
+
+
+def wrote_recently(last_write) -> bool:
+    """
+        Tells whether a write committed at last_write (a Unix time) is less
+        than READ_YOUR_WRITES_SECONDS (default: REPLICA_MAX_LAG_SECONDS) old.
+        Times in the future by more than the window (a forged or badly
+        skewed value) do not count.
+    """
+
+    if last_write is None:
+        return False
+    return abs(time.time() - last_write) < read_your_writes_seconds()
+
+
+def current_last_write():
+    """
+        Returns the time of the current request's last write: the one it
+        committed, else the one its client sent; None outside requests or
+        if there is none.
+    """
+
+    writes = _request_writes.get()
+    if writes is None:
+        return None
+    return writes["committed"] or writes["sent"]
+
+
+class RoutingSession(Session):
+    """
+        A session that reads from a replica while it is read-only and has
+        not written, and otherwise uses the primary. Once it switches to the
+        primary it stays there, so it never reads its own writes from a
+        replica.
+    """
+
+    def __init__(self, *args, read_only: bool = False, last_write=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.read_only = read_only
+        self.info["last_write"] = last_write
+        self._replica = None
+
+    def use_primary(self):
+        """
+            Sends every further statement of this session to the primary.
+        """
+
+        self.read_only = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self.read_only and self._replica is None:
+            if wrote_recently(self.info.get("last_write") or current_last_write()):
+                self.read_only = False
+            else:
+                self._replica = choose_replica()
+                self.read_only = self._replica is not None
+        return self._replica if self.read_only else get_engine()
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _flush_to_primary(session, flush_context, instances):
+    # Runs before the flush asks for a connection.
+    session.use_primary()
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _write_to_primary(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.use_primary()
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _remember_write(session):
+    writes = _request_writes.get()
+    if session.info.pop("wrote", False) and writes is not None:
+        writes["committed"] = time.time()
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_flush(session):
+    session.info.pop("wrote", None)
+
+
+_session_factory = sessionmaker(class_=RoutingSession, autocommit=False, autoflush=False)
+
+
+def dispose_engine():
+    """
+        Closes all pooled connections, e.g. on application shutdown.
+    """
+
+    if _engine is not None:
+        _engine.dispose()
+    for replica in _replicas or []:
+        replica.dispose()
+
+
+def SessionLocal(**kwargs):
+    """
+        Creates a new database session bound to the (lazily created) engine.
+        Returns:
+            Session: A SQLAlchemy session.
+    """
+
+    return _session_factory(bind=get_engine(), **kwargs)
+
+
+def ReadSessionLocal(last_write=None, **kwargs):
+    """
+        Creates a session for read-mostly work, whose queries go to a
+        healthy read replica if one is configured (see RoutingSession).
+        Args:
+            last_write (float, optional): When the client last wrote, if
+                not known from the request (see set_last_write()).
+        Returns:
+            Session: A SQLAlchemy session.
+    """
+
+    return _session_factory(bind=get_engine(), read_only=True, last_write=last_write, **kwargs)
+
+
+def set_last_write(db, last_write):
+    """
+        Records when the client a session reads for last wrote, for
+        read-your-writes. Call it before the session's first query.
+    """
+
+    db.info["last_write"] = last_write
+
+
+class ReadYourWritesMiddleware:
+    """
+        ASGI middleware that reads the client's "last_write" cookie for the
+        request's sessions and, when the request commits a write, sets it
+        to the commit time for READ_YOUR_WRITES_SECONDS.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            sent = float(HTTPConnection(scope).cookies.get(LAST_WRITE_COOKIE, ""))
+        except ValueError:
+            sent = None
+        writes = {"sent": sent, "committed": None}
+        token = _request_writes.set(writes)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and writes["committed"] is not None:
+                MutableHeaders(scope=message).append("set-cookie", (
+                    f"{LAST_WRITE_COOKIE}={writes['committed']:.3f}; "
+                    f"Max-Age={math.ceil(read_your_writes_seconds())}; Path=/; HttpOnly; SameSite=Lax"))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _request_writes.reset(token)
+
+
+def insert_ignore(db, model, rows):
+    """
+        Inserts rows, skipping those that conflict with a stored row (another
+        request may store the same row at the same time). Databases without
+        ON CONFLICT get a plain INSERT.
+        Args:
+            db (Session): The session to insert with.
+            model: The mapped class.
+            rows (list): Dicts of column values.
+    """
+
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        db.execute(insert(model), rows)
+        return
+    db.execute(dialect_insert(model).on_conflict_do_nothing(), rows)
 
 
 def create_tables():
     """
         Imports all models and creates the database tables if they do not exist.
-        This function is used for initial table creation and debugging.
+        This is meant for throwaway databases (tests, benchmarks); real
+        databases are migrated with Alembic.
     """
 
     from models import Base
-    print("Creating tables in the database...")
-    Base.metadata.create_all(engine)
-    print("✅ Tables successfully created!")
-    engine.dispose()
+    logger.info("Creating tables in the database...")
+    Base.metadata.create_all(get_engine())
+    logger.info("Tables successfully created")
 
 
 if __name__ == "__main__":
+    from logging_config import configure_logging
+    configure_logging(fmt="text")
     create_tables()
+    dispose_engine()
@@ -0,0 +1,331 @@
+import argparse
+import json
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import Pokemon, Energy, Deck, DeckPokemon, DeckEnergy
+from type_matchups import type_chart
+
+"""
+    This module scores decks. A deck's score (0-100) combines four components,
+    each between 0 and 1:
+
+      - coverage:   share of the 18 types the deck's Pokémon are strong against,
+      - weakness:   1 minus the share of the deck weak to its most common
+                    weakness, so a deck that folds to a single type scores low,
+      - stats:      average base stat total of the deck's Pokémon, relative
+                    to STAT_TOTAL_REFERENCE (capped at 1),
+      - energy:     share of the deck's Pokémon that at least one of the
+                    deck's Energy cards can power.
+
+    Everything is computed on columnar numpy arrays: a type matrix per
+    Pokémon, one row per (deck, card) link, and per-deck sums with
+    np.add.at / np.bincount. score_decks() scores any number of decks with a
+    handful of SQL queries and no per-deck Python loop, which is what the
+    leaderboard and nightly rescoring use; analyse_deck() runs the same code
+    on the cards of a single deck.
+
+    Usage (from the 'backend' folder):
+        python deck_analytics.py leaderboard --limit 20
+        python deck_analytics.py rescore --output scores.json
+"""
+
+
+TYPES = list(type_chart)
+TYPE_INDEX = {name: i for i, name in enumerate(TYPES)}
+
+WEIGHTS = {"coverage": 0.3, "weakness": 0.25, "stats": 0.25, "energy": 0.2}
+
+STAT_TOTAL_REFERENCE = 600
+STAT_COLUMNS = ("hp", "attack", "defense", "special_attack", "special_defense", "speed")
+
+# TCG Energy types and the Pokémon types they power.
+ENERGY_TYPES = {
+    "Grass": ("Grass", "Bug", "Poison"),
+    "Fire": ("Fire",),
+    "Water": ("Water", "Ice"),
+    "Lightning": ("Electric",),
+    "Psychic": ("Psychic", "Ghost", "Poison"),
+    "Fighting": ("Fighting", "Rock", "Ground"),
+    "Darkness": ("Dark",),
+    "Metal": ("Steel",),
+    "Fairy": ("Fairy",),
+    "Dragon": ("Dragon",),
+    "Colorless": ("Normal", "Flying"),
+}
+
+
+def _type_matrix(key: str):
+    matrix = np.zeros((len(TYPES), len(TYPES)), dtype=bool)
+    for name, matchups in type_chart.items():
+        for other in matchups[key]:
+            matrix[TYPE_INDEX[name], TYPE_INDEX[other]] = True
+    return matrix
+
+
+# STRONG[a, b]: type a is strong against type b; WEAK[a, b]: a is weak to b.
+STRONG = _type_matrix("strong_against")
+WEAK = _type_matrix("weak_to")
+
+
+def type_mask(types) -> np.ndarray:
+    """
+        Converts a list of type names into a boolean vector over TYPES.
+        Unknown names are ignored.
+    """
+
+    mask = np.zeros(len(TYPES), dtype=bool)
+    for name in types or ():
+        index = TYPE_INDEX.get(str(name).capitalize())
+        if index is not None:
+            mask[index] = True
+    return mask
+
+
+def energy_mask(energy_type: str, name: str = "") -> np.ndarray:
+    """
+        Returns the Pokémon types an Energy card can power, as a boolean vector.
+        Args:
+            energy_type (str): The card's energy_type column (e.g. "Fire").
+            name (str): The card name, used when energy_type is empty or a
+                subtype such as "Basic" (e.g. "Darkness Energy").
+        Returns:
+            np.ndarray: Boolean vector over TYPES; "Double Colorless" style
+            cards power Colorless types.
+    """
+
+    mask = np.zeros(len(TYPES), dtype=bool)
+    words = f"{energy_type or ''} {name or ''}".replace("-", " ").split()
+    for word in words:
+        word = word.capitalize()
+        for powered in ENERGY_TYPES.get(word, (word,) if word in TYPE_INDEX else ()):
+            mask[TYPE_INDEX[powered]] = True
+    return mask
+
+
+def stat_total(pokemon) -> int:
+    return sum(getattr(pokemon, column) or 0 for column in STAT_COLUMNS)
+
+
+def per_deck_sum(deck: np.ndarray, rows: np.ndarray, n_decks: int) -> np.ndarray:
+    """
+        Sums the rows belonging to each deck (a grouped sum with one bincount
+        over the flattened (deck, column) index, much faster than np.add.at).
+        Args:
+            deck (np.ndarray): Deck number of each row, shape (N,).
+            rows (np.ndarray): Values, shape (N, K).
+            n_decks (int): Number of decks.
+        Returns:
+            np.ndarray: Shape (n_decks, K).
+    """
+
+    width = rows.shape[1]
+    index = (deck[:, None] * width + np.arange(width)).ravel()
+    sums = np.bincount(index, weights=rows.ravel(), minlength=n_decks * width)
+    return sums.reshape(n_decks, width)
+
+
+def score_arrays(n_decks: int, pokemon_deck: np.ndarray, pokemon_types: np.ndarray,
+                 pokemon_stats: np.ndarray, energy_deck: np.ndarray,
+                 energy_types: np.ndarray):
+    """
+        Scores decks given one row per (deck, card) link.
+        Args:
+            n_decks (int): Number of decks; decks are numbered 0..n_decks-1.
+            pokemon_deck (np.ndarray): Deck number of each Pokémon link, shape (P,).
+            pokemon_types (np.ndarray): Type mask of each linked Pokémon, shape (P, 18).
+            pokemon_stats (np.ndarray): Base stat total of each linked Pokémon, shape (P,).
+            energy_deck (np.ndarray): Deck number of each Energy link, shape (E,).
+            energy_types (np.ndarray): Powered types of each linked Energy, shape (E, 18).
+        Returns:
+            dict: "score" (int array, 0-100), one float array per component,
+            plus "pokemon_count", "strong_against" (bool, shape (n_decks, 18))
+            and "weakness_counts" (Pokémon weak to each type, same shape).
+    """
+
+    n_types = len(TYPES)
+    counts = np.bincount(pokemon_deck, minlength=n_decks).astype(float)
+    has_pokemon = counts > 0
+    safe_counts = np.where(has_pokemon, counts, 1.0)
+
+    deck_types = per_deck_sum(pokemon_deck, pokemon_types, n_decks) > 0
+    strong_against = deck_types.astype(np.float32) @ STRONG.astype(np.float32)
+    coverage = (strong_against > 0).sum(axis=1) / n_types
+
+    pokemon_weak = (pokemon_types.astype(np.float32) @ WEAK.astype(np.float32)) > 0
+    deck_weak = per_deck_sum(pokemon_deck, pokemon_weak, n_decks)
+    weakness = np.where(has_pokemon, 1.0 - deck_weak.max(axis=1) / safe_counts, 0.0)
+
+    stat_sums = np.bincount(pokemon_deck, weights=pokemon_stats, minlength=n_decks)
+    stats = np.minimum(stat_sums / safe_counts / STAT_TOTAL_REFERENCE, 1.0)
+
+    deck_energy = per_deck_sum(energy_deck, energy_types, n_decks) > 0
+    powered = (pokemon_types & deck_energy[pokemon_deck]).any(axis=1)
+    energy = np.bincount(pokemon_deck, weights=powered, minlength=n_decks) / safe_counts
+
+    components = {"coverage": coverage, "weakness": weakness, "stats": stats, "energy": energy}
+    total = sum(WEIGHTS[name] * values for name, values in components.items())
+    components["score"] = np.rint(np.where(has_pokemon, total, 0.0) * 100).astype(int)
+    components["pokemon_count"] = counts.astype(int)
+    components["strong_against"] = strong_against > 0
+    components["weakness_counts"] = np.rint(deck_weak).astype(int)
+    return components
+
+
+def analyse_deck(pokemon_list, energy_list):
+    """
+        Scores a single deck from its cards.
+        Args:
+            pokemon_list (list): Pokemon objects in the deck.
+            energy_list (list): Energy objects in the deck.
+        Returns:
+            dict: "score" (int, 0-100) and the four components (floats, 0-1).
+    """
+
+    n_types = len(TYPES)
+    pokemon_types = np.array([type_mask(p.types) for p in pokemon_list],
+                             dtype=bool).reshape(-1, n_types)
+    energy_types = np.array([energy_mask(e.energy_type, e.name) for e in energy_list],
+                            dtype=bool).reshape(-1, n_types)
+    result = score_arrays(
+        1,
+        np.zeros(len(pokemon_list), dtype=np.intp),
+        pokemon_types,
+        np.array([stat_total(p) for p in pokemon_list], dtype=float),
+        np.zeros(len(energy_list), dtype=np.intp),
+        energy_types,
+    )
+    analysis = {name: round(float(result[name][0]), 4) for name in WEIGHTS}
+    analysis["score"] = int(result["score"][0])
+    return analysis
+
+
+def deck_score(pokemon_list, energy_list) -> int:
+    """
+        Returns the 0-100 score of a single deck (see analyse_deck).
+    """
+
+    return analyse_deck(pokemon_list, energy_list)["score"]
+
+
+def score_decks(db: Session, deck_ids=None):
+    """
+        Scores many decks at once with columnar arrays.
+        Args:
+            db (Session): The database session.
+            deck_ids (list, optional): Decks to score; all decks when omitted.
+        Returns:
+            dict: "deck_id" (int array) plus the arrays from score_arrays(),
+            all aligned by position.
+    """
+
+    deck_query = select(Deck.id).order_by(Deck.id)
+    if deck_ids is not None:
+        deck_query = deck_query.where(Deck.id.in_(deck_ids))
+    ids = np.fromiter(db.execute(deck_query).scalars(), dtype=np.int64)
+    position = {deck_id: i for i, deck_id in enumerate(ids.tolist())}
+
+    # A card listed twice in a deck counts once, as in analyse_deck().
+    link_query = select(DeckPokemon.deck_id, DeckPokemon.pokemon_id).distinct()
+    catalogue_query = select(Pokemon.id, Pokemon.types,
+                             *[getattr(Pokemon, column) for column in STAT_COLUMNS])
+    energy_query = (select(DeckEnergy.deck_id, Energy.id, Energy.energy_type, Energy.name)
+                    .join(Energy, Energy.id == DeckEnergy.energy_id).distinct())
+    if deck_ids is not None:
+        link_query = link_query.where(DeckPokemon.deck_id.in_(deck_ids))
+        catalogue_query = catalogue_query.where(Pokemon.id.in_(
+            select(DeckPokemon.pokemon_id).where(DeckPokemon.deck_id.in_(deck_ids))))
+        energy_query = energy_query.where(DeckEnergy.deck_id.in_(deck_ids))
+
+    catalogue = {}
+    for row in db.execute(catalogue_query):
+        catalogue[row.id] = (type_mask(row.types), sum(value or 0 for value in row[2:]))
+
+    n_types = len(TYPES)
+    pokemon_deck, pokemon_types, pokemon_stats = [], [], []
+    for deck_id, pokemon_id in db.execute(link_query):
+        if deck_id in position and pokemon_id in catalogue:
+            mask, total = catalogue[pokemon_id]
+            pokemon_deck.append(position[deck_id])
+            pokemon_types.append(mask)
+            pokemon_stats.append(total)
+
+    energy_cache = {}
+    energy_deck, energy_types = [], []
+    for deck_id, _, energy_type, name in db.execute(energy_query):
+        if deck_id in position:
+            key = (energy_type, name)
+            if key not in energy_cache:
+                energy_cache[key] = energy_mask(energy_type, name)
+            energy_deck.append(position[deck_id])
+            energy_types.append(energy_cache[key])
+
+    result = score_arrays(
+        len(ids),
+        np.array(pokemon_deck, dtype=np.intp),
+        np.array(pokemon_types, dtype=bool).reshape(-1, n_types),
+        np.array(pokemon_stats, dtype=float),
+        np.array(energy_deck, dtype=np.intp),
+        np.array(energy_types, dtype=bool).reshape(-1, n_types),
+    )
+    result["deck_id"] = ids
+    return result
+
+
+def leaderboard(db: Session, limit: int = 10):
+    """
+        Returns the highest scoring decks.
+        Args:
+            db (Session): The database session.
+            limit (int): Number of decks.
+        Returns:
+            list: Dicts with deck_id, score and components, best first.
+    """
+
+    scores = score_decks(db)
+    if not len(scores["deck_id"]):
+        return []
+    limit = min(limit, len(scores["deck_id"]))
+    top = np.argpartition(-scores["score"], limit - 1)[:limit]
+    top = top[np.lexsort((scores["deck_id"][top], -scores["score"][top]))]
+    return [
+        {
+            "deck_id": int(scores["deck_id"][i]),
+            "score": int(scores["score"][i]),
+            **{name: round(float(scores[name][i]), 4) for name in WEIGHTS},
+        }
+        for i in top
+    ]
+
+
+def main(argv=None):
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Score decks in bulk.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    top = sub.add_parser("leaderboard", help="Print the best decks.")
+    top.add_argument("--limit", type=int, default=10)
+    rescore = sub.add_parser("rescore", help="Score every deck.")
+    rescore.add_argument("--output", help="Write deck_id/score JSON lines to this file.")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "leaderboard":
+            for row in leaderboard(db, args.limit):
+                print(json.dumps(row))
+            return
+        scores = score_decks(db)
+    finally:
+        db.close()
+
+    print(f"Scored {len(scores['deck_id'])} decks, "
+          f"mean score {scores['score'].mean() if len(scores['score']) else 0:.1f}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for deck_id, score in zip(scores["deck_id"].tolist(), scores["score"].tolist()):
+                f.write(json.dumps({"deck_id": deck_id, "score": score}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
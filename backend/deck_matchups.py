@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from cache import CountingCache
+from deck_analytics import TYPES, STRONG, WEAK, per_deck_sum
+from models import Deck, DeckPokemon
+from pokemon_catalogue import get_catalogue
+
+"""
+    This module plays every deck against every other deck on type advantage
+    (type_matchups.type_chart) and ranks them.
+
+    Each deck becomes a type profile: for each of the 18 types, the share of
+    its Pokémon that have it. Type a beats type b if a is strong against b
+    or b is weak to a, and ADVANTAGE = BEATS - BEATS.T. The margin of deck A
+    over deck B is then profile_A @ ADVANTAGE @ profile_B: how much more of
+    A's type pairings against B are advantaged than disadvantaged (-1 to 1).
+    A positive margin is a win, a negative one a loss, zero a tie. The
+    matrix is antisymmetric, so B's margin over A is the negative.
+
+    The full round robin is never materialised. Decks with the same profile
+    are merged (most decks share their profile with others), and the
+    profile-by-profile matrix is computed in MATCHUP_BLOCK x MATCHUP_BLOCK
+    blocks over the upper triangle only, each block counting towards both
+    its rows and (negated) its columns. Deck cards are read in batches of
+    MATCHUP_LOAD_BATCH links, so memory stays bounded by the profiles (18
+    floats per deck) and one block, even with 100k decks.
+
+    Results are cached for MATCHUP_CACHE_SECONDS.
+
+    Usage (from the 'backend' folder):
+        python deck_matchups.py --limit 20
+"""
+
+
+MATCHUP_BLOCK = int(os.getenv("MATCHUP_BLOCK", "1024"))
+MATCHUP_LOAD_BATCH = int(os.getenv("MATCHUP_LOAD_BATCH", "50000"))
+MATCHUP_CACHE_SECONDS = float(os.getenv("MATCHUP_CACHE_SECONDS", "300"))
+
+# Blocks are computed in float32; margins this close to zero are ties
+# (rounding noise). Real margins are multiples of 1 / (Pokémon in A x in B).
+EPSILON = 1e-6
+
+BEATS = STRONG | WEAK.T
+ADVANTAGE = BEATS.astype(np.float64) - BEATS.T.astype(np.float64)
+
+matchup_cache = CountingCache("matchups", maxsize=1, ttl=MATCHUP_CACHE_SECONDS)
+
+
+def matchup_matrix(rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """
+        Returns the margin of each row profile over each column profile,
+        shape (len(rows), len(cols)). Meant for small sets of decks; use
+        round_robin() for the whole field.
+    """
+
+    return rows @ ADVANTAGE @ cols.T
+
+
+def load_type_profiles(db: Session, batch_size: int = None):
+    """
+        Builds the type profile of every deck with at least one Pokémon.
+        Links are read in deck order, batch_size rows at a time, and each
+        batch is summed into the decks it covers.
+        Args:
+            db (Session): The database session.
+            batch_size (int, optional): Links per batch (MATCHUP_LOAD_BATCH).
+        Returns:
+            tuple: deck ids (n,), profiles (n, 18) and Pokémon counts (n,),
+            plus the number of decks left out because they have no Pokémon.
+    """
+
+    batch_size = batch_size or MATCHUP_LOAD_BATCH
+    ids = np.fromiter(db.execute(select(Deck.id).order_by(Deck.id)).scalars(), dtype=np.int64)
+    n_types = len(TYPES)
+    type_counts = np.zeros((len(ids), n_types))
+    pokemon_counts = np.zeros(len(ids))
+    if not len(ids):
+        return ids, np.zeros((0, n_types)), np.zeros(0, dtype=int), 0
+    catalogue = get_catalogue()
+
+    # A card listed twice in a deck counts once, as in deck_analytics.
+    links = (select(DeckPokemon.deck_id, DeckPokemon.pokemon_id).distinct()
+             .order_by(DeckPokemon.deck_id, DeckPokemon.pokemon_id)
+             .execution_options(yield_per=batch_size))
+    for batch in db.execute(links).partitions():
+        batch = np.array(batch, dtype=np.int64).reshape(-1, 2)
+        deck = np.minimum(np.searchsorted(ids, batch[:, 0]), len(ids) - 1)
+        rows = catalogue.rows(batch[:, 1])
+        known = (rows >= 0) & (ids[deck] == batch[:, 0])
+        deck, rows = deck[known], rows[known]
+        if not len(deck):
+            continue
+        # Links come in deck order, so a batch only touches a range of decks.
+        first, last = deck.min(), deck.max() + 1
+        local = deck - first
+        type_counts[first:last] += per_deck_sum(local, catalogue.type_matrix(rows), last - first)
+        pokemon_counts[first:last] += np.bincount(local, minlength=last - first)
+
+    playing = pokemon_counts > 0
+    profiles = type_counts[playing] / pokemon_counts[playing, None]
+    return ids[playing], profiles, pokemon_counts[playing].astype(int), int((~playing).sum())
+
+
+def round_robin(profiles: np.ndarray, block: int = None):
+    """
+        Plays every profile against every other one, block by block.
+        Args:
+            profiles (np.ndarray): Type profiles, shape (n, 18).
+            block (int, optional): Block size (MATCHUP_BLOCK).
+        Returns:
+            dict: Per deck "wins", "losses", "ties" and mean "margin"
+            (arrays aligned with profiles), and the number of "distinct"
+            profiles.
+    """
+
+    block = block or MATCHUP_BLOCK
+    n = len(profiles)
+    unique, inverse, weights = np.unique(profiles.reshape(n, len(TYPES)), axis=0,
+                                         return_inverse=True, return_counts=True)
+    inverse = inverse.ravel()
+    weights = weights.astype(np.float32)
+    attack = (unique @ ADVANTAGE).astype(np.float32)
+    targets = unique.astype(np.float32)
+    u = len(unique)
+    wins, losses, margin = np.zeros(u), np.zeros(u), np.zeros(u)
+
+    for i in range(0, u, block):
+        rows = slice(i, i + block)
+        for j in range(i, u, block):
+            cols = slice(j, j + block)
+            margins = attack[rows] @ targets[cols].T
+            won = (margins > EPSILON).astype(np.float32)
+            lost = (margins < -EPSILON).astype(np.float32)
+            wins[rows] += won @ weights[cols]
+            losses[rows] += lost @ weights[cols]
+            margin[rows] += margins @ weights[cols]
+            if j != i:
+                # The lower triangle is the same block, seen from the columns.
+                wins[cols] += weights[rows] @ lost
+                losses[cols] += weights[rows] @ won
+                margin[cols] -= weights[rows] @ margins
+
+    opponents = max(n - 1, 0)
+    wins, losses = np.rint(wins[inverse]).astype(int), np.rint(losses[inverse]).astype(int)
+    return {
+        "wins": wins,
+        "losses": losses,
+        "ties": opponents - wins - losses,
+        "margin": margin[inverse] / max(opponents, 1),
+        "distinct": u,
+    }
+
+
+def compute_matchups(db: Session):
+    """
+        Loads the type profiles of all decks and plays the round robin
+        (cached for MATCHUP_CACHE_SECONDS).
+        Returns:
+            dict: "deck_id", "profiles", "pokemon_count" and the arrays from
+            round_robin(), aligned by position, plus "without_pokemon".
+    """
+
+    cached = matchup_cache.get("all")
+    if cached is not None:
+        return cached
+    ids, profiles, pokemon_counts, without_pokemon = load_type_profiles(db)
+    result = round_robin(profiles)
+    opponents = max(len(ids) - 1, 1)
+    result.update(deck_id=ids, profiles=profiles, pokemon_count=pokemon_counts,
+                  without_pokemon=without_pokemon,
+                  win_rate=(result["wins"] + result["ties"] / 2) / opponents)
+    matchup_cache.set("all", result)
+    return result
+
+
+def _deck_entry(matchups: dict, i: int, rank: int):
+    profile = matchups["profiles"][i]
+    return {
+        "rank": rank,
+        "deck_id": int(matchups["deck_id"][i]),
+        "wins": int(matchups["wins"][i]),
+        "losses": int(matchups["losses"][i]),
+        "ties": int(matchups["ties"][i]),
+        "win_rate": round(float(matchups["win_rate"][i]), 4),
+        "margin": round(float(matchups["margin"][i]), 4),
+        "types": [TYPES[t] for t in np.argsort(-profile, kind="stable") if profile[t] > 0],
+    }
+
+
+def meta_report(matchups: dict):
+    """
+        Summarises the field: how common each type is, how a deck of a
+        single type would fare against it, and how decks fare by their
+        most common type.
+    """
+
+    profiles = matchups["profiles"]
+    if not len(profiles):
+        return {"decks": 0, "without_pokemon": matchups["without_pokemon"],
+                "distinct_profiles": 0, "type_share": {}, "type_matchups": {}, "archetypes": []}
+    field = profiles.mean(axis=0)
+    # A deck of only type t has margin ADVANTAGE[t] @ field against the field.
+    against_field = ADVANTAGE @ field
+    dominant = profiles.argmax(axis=1)
+    decks = np.bincount(dominant, minlength=len(TYPES))
+    win_rates = np.bincount(dominant, weights=matchups["win_rate"], minlength=len(TYPES))
+    return {
+        "decks": len(profiles),
+        "without_pokemon": matchups["without_pokemon"],
+        "distinct_profiles": matchups["distinct"],
+        "type_share": {TYPES[t]: round(float(field[t]), 4)
+                       for t in np.argsort(-field, kind="stable") if field[t] > 0},
+        "type_matchups": {TYPES[t]: round(float(against_field[t]), 4)
+                          for t in np.argsort(-against_field, kind="stable")},
+        "archetypes": [{"type": TYPES[t], "decks": int(decks[t]),
+                        "win_rate": round(float(win_rates[t] / decks[t]), 4)}
+                       for t in np.argsort(-decks, kind="stable") if decks[t]],
+    }
+
+
+def matchup_report(db: Session, limit: int = 10, deck_id: int = None):
+    """
+        Returns the matchup leaderboard and the meta report.
+        Args:
+            db (Session): The database session.
+            limit (int): Number of decks in the leaderboard.
+            deck_id (int, optional): A deck to report on as "deck", wherever it ranks.
+        Returns:
+            dict: "leaderboard" (best win rate first, then margin), "meta"
+            and "deck" (None if deck_id has no Pokémon or is not given).
+    """
+
+    matchups = compute_matchups(db)
+    order = np.lexsort((matchups["deck_id"], -matchups["margin"], -matchups["win_rate"]))
+    deck = None
+    if deck_id is not None:
+        position = np.flatnonzero(matchups["deck_id"][order] == deck_id)
+        if len(position):
+            deck = _deck_entry(matchups, order[position[0]], int(position[0]) + 1)
+    return {
+        "leaderboard": [_deck_entry(matchups, i, rank + 1) for rank, i in enumerate(order[:limit])],
+        "meta": meta_report(matchups),
+        "deck": deck,
+    }
+
+
+def main(argv=None):
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Play every deck against every other deck.")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        report = matchup_report(db, args.limit)
+    finally:
+        db.close()
+    for row in report["leaderboard"]:
+        print(json.dumps(row))
+    print(json.dumps(report["meta"], indent=2))
+
+
+if __name__ == "__main__":
+    main()
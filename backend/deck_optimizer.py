@@ -0,0 +1,366 @@
+import time
+import numpy as np
+from deck_analytics import (TYPES, WEIGHTS, STAT_TOTAL_REFERENCE,
+                            ENERGY_TYPES, score_arrays, type_mask, energy_mask)
+from pokemon_catalogue import PokemonCatalogue, get_catalogue
+from type_matchups import types_to_mask
+
+"""
+    This module searches the in-memory Pokémon catalogue (see
+    pokemon_catalogue.py) for the best scoring team under constraints: team
+    size, Pokémon that must be included, the types that are allowed and the
+    number of Energy types the team may need.
+
+    The objective is the deck score from deck_analytics (coverage, shared
+    weakness, stats, energy). Each Pokémon needs the Energy of its primary
+    type and the suggested Energy cards are exactly those, so the energy
+    component is always 1 and the constraint is what keeps it honest.
+
+    Types are the 18-bit masks stored on each Pokémon (see
+    type_matchups.TYPE_BITS), so the coverage of a team is an OR of its
+    members' strength masks and its size a popcount. The search is a beam
+    search with branch-and-bound pruning:
+
+      - Pokémon with the same types only differ in stats, so at most 'size'
+        of them (the strongest) are kept as candidates; this removes most of
+        a 1000+ catalogue without losing any optimal team,
+      - a team is extended only with candidates after its last member, so
+        each team is built in exactly one order,
+      - every (beam x candidate) extension is scored at once with numpy,
+      - an extension is pruned when an optimistic bound on its final score
+        (all remaining coverage reachable, no new shared weakness, the best
+        remaining stats) cannot beat the best complete team found so far,
+        starting with greedy teams (the incumbent is the score of the
+        last team that would still be returned),
+      - teams with identical coverage, weaknesses and energy keep only the
+        one with the best stats.
+
+    The time budget is checked between steps; once it has run out the
+    remaining steps are completed greedily, so the caller always gets full
+    teams and "complete" says whether the search ran to the end.
+"""
+
+
+ENERGY_NAMES = list(ENERGY_TYPES)
+ENERGY_BITS = {name: 1 << i for i, name in enumerate(ENERGY_NAMES)}
+
+# The Energy a Pokémon type needs: the first TCG Energy that powers it.
+POKEMON_ENERGY = {}
+for _energy, _powered in ENERGY_TYPES.items():
+    for _p_type in _powered:
+        POKEMON_ENERGY.setdefault(_p_type, _energy)
+
+N_TYPES = len(TYPES)
+
+# The Energy bit each primary type needs, by type index; the extra last entry
+# (index -1, no known type) is Colorless.
+TYPE_ENERGY_BITS = np.array([ENERGY_BITS[POKEMON_ENERGY[p_type]] for p_type in TYPES]
+                            + [ENERGY_BITS["Colorless"]], dtype=np.int64)
+
+
+class Catalogue:
+    """
+        The optimizer's arrays, derived from one PokemonCatalogue snapshot
+        and aligned with its records.
+
+        Attributes:
+            snapshot (PokemonCatalogue): The shared columnar catalogue.
+            ids (np.ndarray): Pokémon ids.
+            types_mask (np.ndarray): 18-bit type masks.
+            strong (np.ndarray): Masks of the types each Pokémon is strong against.
+            weak (np.ndarray): Bool matrix (N, 18) of the types each Pokémon is weak to.
+            stats (np.ndarray): Base stat totals.
+            energy (np.ndarray): Bit of the Energy each Pokémon needs.
+    """
+
+    def __init__(self, snapshot: PokemonCatalogue):
+        records = snapshot.records
+        self.snapshot = snapshot
+        self.ids = records["id"].astype(np.int64)
+        self.types_mask = records["types_mask"].astype(np.int64)
+        self.strong = records["strengths_mask"].astype(np.int64)
+        weak = records["weaknesses_mask"].astype(np.int64)
+        self.weak = ((weak[:, None] >> np.arange(N_TYPES)) & 1).astype(bool)
+        self.stats = records["stat_total"].astype(float)
+        # Index -1 (no known type) picks the last entry, Colorless.
+        self.energy = TYPE_ENERGY_BITS[records["type1"]]
+
+    def types(self, row: int):
+        return self.snapshot.types(row)
+
+
+def required_energy(types) -> str:
+    """
+        Returns the TCG Energy a Pokémon with these types needs (Colorless
+        when it has no known type).
+    """
+
+    for p_type in types or ():
+        energy = POKEMON_ENERGY.get(str(p_type).capitalize())
+        if energy:
+            return energy
+    return "Colorless"
+
+
+_derived = {}
+
+
+def load_catalogue() -> Catalogue:
+    """
+        Returns the optimizer arrays for the current Pokémon catalogue,
+        deriving them once per catalogue version.
+    """
+
+    snapshot = get_catalogue()
+    catalogue = _derived.get(snapshot.version)
+    if catalogue is None or catalogue.snapshot is not snapshot:
+        catalogue = Catalogue(snapshot)
+        _derived.clear()
+        _derived[snapshot.version] = catalogue
+    return catalogue
+
+
+def _candidates(catalogue: Catalogue, size: int, allowed_mask, excluded):
+    keep = ~np.isin(catalogue.ids, np.array(sorted(excluded), dtype=np.int64))
+    if allowed_mask is not None:
+        keep &= (catalogue.types_mask & ~allowed_mask) == 0
+    indices = np.flatnonzero(keep)
+    # Best stats first, so that within a type signature the first 'size'
+    # Pokémon are the ones worth keeping.
+    indices = indices[np.lexsort((catalogue.ids[indices], -catalogue.stats[indices]))]
+    kept, per_signature = [], {}
+    for index in indices.tolist():
+        signature = int(catalogue.types_mask[index])
+        if per_signature.get(signature, 0) < size:
+            per_signature[signature] = per_signature.get(signature, 0) + 1
+            kept.append(index)
+    return np.array(sorted(kept), dtype=np.intp)
+
+
+def _objective(coverage_bits, worst_weakness, stat_sum, members, size):
+    return (WEIGHTS["coverage"] * coverage_bits / N_TYPES
+            + WEIGHTS["weakness"] * (1.0 - worst_weakness / size)
+            + WEIGHTS["stats"] * np.minimum(stat_sum / np.maximum(members, 1)
+                                            / STAT_TOTAL_REFERENCE, 1.0)
+            + WEIGHTS["energy"])
+
+
+class _Search:
+    """
+        Beam search with branch-and-bound over one candidate list.
+    """
+
+    def __init__(self, catalogue, candidates, base, size, max_energy_types, results):
+        self.size = size
+        self.results = results
+        self.max_energy_types = max_energy_types
+        self.strong = catalogue.strong[candidates]
+        self.weak = catalogue.weak[candidates].astype(np.int16)
+        self.stats = catalogue.stats[candidates]
+        self.energy = catalogue.energy[candidates]
+        self.candidates = candidates
+        self.n = len(candidates)
+
+        # suffix_strong[i]: strengths reachable with candidates i..n-1;
+        # suffix_stats[i]: best stat total among them.
+        self.suffix_strong = np.zeros(self.n + 1, dtype=np.int64)
+        self.suffix_stats = np.zeros(self.n + 1, dtype=float)
+        for i in range(self.n - 1, -1, -1):
+            self.suffix_strong[i] = self.suffix_strong[i + 1] | self.strong[i]
+            self.suffix_stats[i] = max(self.suffix_stats[i + 1], self.stats[i])
+
+        members = len(base)
+        self.base = {
+            "strong": np.array([np.bitwise_or.reduce(catalogue.strong[base])
+                                if members else 0], dtype=np.int64),
+            "weak": catalogue.weak[base].sum(axis=0, dtype=np.int16)[None, :],
+            "stats": np.array([catalogue.stats[base].sum()]),
+            "energy": np.array([np.bitwise_or.reduce(catalogue.energy[base])
+                                if members else 0], dtype=np.int64),
+            "last": np.array([-1], dtype=np.intp),
+            "chosen": np.zeros((1, 0), dtype=np.intp),
+        }
+        self.base_members = members
+        self.best = -np.inf
+        self.explored = 0
+        self.pruned = 0
+
+    def run(self, beam_width: int, deadline: float, results: int):
+        """
+            Extends the base team to full size, keeping beam_width teams per
+            step (results once the deadline has passed).
+            Returns:
+                tuple: (beam state dict, whether the deadline was met)
+        """
+
+        beam = self.base
+        complete = True
+        for step in range(self.size - self.base_members):
+            width = beam_width
+            if time.perf_counter() > deadline:
+                width, complete = results, False
+            beam = self._expand(beam, self.base_members + step + 1, width)
+            if not len(beam["last"]):
+                break
+        return beam, complete
+
+    def _expand(self, beam, members, width):
+        remaining = self.size - members
+        index = np.arange(self.n)
+        valid = index[None, :] > beam["last"][:, None]
+        # Enough candidates must be left after this one to fill the team.
+        valid &= (self.n - 1 - index)[None, :] >= remaining
+
+        strong = beam["strong"][:, None] | self.strong[None, :]
+        energy = beam["energy"][:, None] | self.energy[None, :]
+        if self.max_energy_types is not None:
+            valid &= np.bitwise_count(energy) <= self.max_energy_types
+        weak = beam["weak"][:, None, :] + self.weak[None, :, :]
+        worst = weak.max(axis=2)
+        stat_sum = beam["stats"][:, None] + self.stats[None, :]
+
+        score = _objective(np.bitwise_count(strong), worst, stat_sum, members, self.size)
+        if remaining:
+            reachable = strong | self.suffix_strong[index + 1][None, :]
+            best_stats = stat_sum + remaining * self.suffix_stats[index + 1][None, :]
+            bound = _objective(np.bitwise_count(reachable), worst, best_stats,
+                               self.size, self.size)
+        else:
+            bound = score
+
+        self.explored += int(valid.sum())
+        promising = valid & (bound >= self.best - 1e-9)
+        self.pruned += int((valid & ~promising).sum())
+        score = np.where(promising, score, -np.inf)
+
+        flat = score.ravel()
+        n_valid = int(promising.sum())
+        if not n_valid:
+            return {key: value[:0] for key, value in beam.items()}
+        top = min(n_valid, width * 4)
+        order = np.argpartition(-flat, top - 1)[:top]
+        order = order[np.argsort(-flat[order], kind="stable")]
+
+        picked, seen = [], set()
+        for flat_index in order.tolist():
+            parent, candidate = divmod(flat_index, self.n)
+            key = (int(strong[parent, candidate]), int(energy[parent, candidate]),
+                   weak[parent, candidate].tobytes())
+            if key in seen:
+                continue
+            seen.add(key)
+            picked.append((parent, candidate))
+            if len(picked) == width:
+                break
+
+        if not remaining and len(picked) >= self.results:
+            # The incumbent is the results-th best full team: anything that
+            # cannot beat it would not be returned.
+            parent, candidate = picked[self.results - 1]
+            self.best = max(self.best, float(score[parent, candidate]))
+
+        parents = np.array([p for p, _ in picked], dtype=np.intp)
+        chosen = np.array([c for _, c in picked], dtype=np.intp)
+        return {
+            "strong": strong[parents, chosen],
+            "weak": weak[parents, chosen],
+            "stats": stat_sum[parents, chosen],
+            "energy": energy[parents, chosen],
+            "last": chosen,
+            "chosen": np.column_stack([beam["chosen"][parents], chosen]),
+        }
+
+
+def _describe(catalogue: Catalogue, members):
+    energies = sorted({required_energy(catalogue.types(i)) for i in members},
+                      key=ENERGY_NAMES.index)
+    result = score_arrays(
+        1,
+        np.zeros(len(members), dtype=np.intp),
+        np.array([type_mask(catalogue.types(i)) for i in members],
+                 dtype=bool).reshape(-1, N_TYPES),
+        catalogue.stats[members],
+        np.zeros(len(energies), dtype=np.intp),
+        np.array([energy_mask(name) for name in energies], dtype=bool).reshape(-1, N_TYPES),
+    )
+    weakness_counts = result["weakness_counts"][0]
+    return {
+        "pokemon": [{"id": int(catalogue.ids[i]), "name": catalogue.snapshot.name(i),
+                     "types": catalogue.types(i)} for i in members],
+        "energy_cards": [f"{name} Energy" for name in energies],
+        "score": int(result["score"][0]),
+        **{name: round(float(result[name][0]), 4) for name in WEIGHTS},
+        "strengths": [TYPES[t] for t in result["strong_against"][0].nonzero()[0]],
+        "weaknesses": {TYPES[t]: int(weakness_counts[t]) for t in weakness_counts.nonzero()[0]},
+    }
+
+
+def optimize_deck(size: int = 6, required_pokemon_ids=(),
+                  allowed_types=None, max_energy_types=None, exclude_pokemon_ids=(),
+                  results: int = 3, beam_width: int = 64, time_budget_ms: int = 500):
+    """
+        Searches the catalogue for the best scoring teams under constraints.
+        Args:
+            size (int): Number of Pokémon in a team.
+            required_pokemon_ids (list): Pokémon every team must contain.
+            allowed_types (list, optional): Only Pokémon whose types all are
+                in this list are added (required Pokémon are always kept).
+            max_energy_types (int, optional): Maximum number of different
+                Energy types a team may need.
+            exclude_pokemon_ids (list): Pokémon never to add.
+            results (int): Number of teams to return.
+            beam_width (int): Partial teams kept per step.
+            time_budget_ms (int): Time after which the search finishes greedily.
+        Returns:
+            dict: "decks" (best first, each with its Pokémon, Energy cards,
+            score and components), the candidate, explored and pruned
+            counts, "complete" and "elapsed_ms".
+        Raises:
+            ValueError: If the constraints cannot be met by any team.
+    """
+
+    start = time.perf_counter()
+    deadline = start + time_budget_ms / 1000
+    catalogue = load_catalogue()
+
+    required = list(dict.fromkeys(required_pokemon_ids))
+    rows = catalogue.snapshot.rows(required)
+    unknown = [pokemon_id for pokemon_id, row in zip(required, rows.tolist()) if row < 0]
+    if unknown:
+        raise ValueError(f"Unknown Pokémon ids: {unknown}")
+    if len(required) > size:
+        raise ValueError("More required Pokémon than the deck size")
+    base = rows.astype(np.intp)
+    if max_energy_types is not None:
+        needed = {required_energy(catalogue.types(i)) for i in base}
+        if len(needed) > max_energy_types:
+            raise ValueError("The required Pokémon need more Energy types than allowed")
+
+    allowed_mask = None
+    if allowed_types is not None:
+        allowed_mask = types_to_mask(allowed_types)
+    candidates = _candidates(catalogue, size, allowed_mask,
+                             set(exclude_pokemon_ids) | set(required))
+
+    search = _Search(catalogue, candidates, base, size, max_energy_types, results)
+    # A greedy pass (one team per result) gives the first incumbent.
+    greedy, _ = search.run(results, deadline, results)
+    beam, complete = search.run(beam_width, deadline, results)
+
+    teams = {}
+    for row in [*beam["chosen"].tolist(), *greedy["chosen"].tolist()]:
+        teams.setdefault(tuple(sorted(row)), row)
+    if not teams:
+        raise ValueError("No deck satisfies the constraints")
+    decks = [_describe(catalogue, np.concatenate([base, candidates[row]]).astype(np.intp))
+             for row in teams.values()]
+    decks.sort(key=lambda deck: -deck["score"])
+    decks = decks[:results]
+    return {
+        "decks": decks,
+        "candidates": int(len(candidates)),
+        "explored": search.explored,
+        "pruned": search.pruned,
+        "complete": complete,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    }
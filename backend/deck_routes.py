@@ -1,25 +1,48 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import logging
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
-from database import SessionLocal
+from database import SessionLocal, ReadSessionLocal, set_last_write, current_last_write
 from models import (User, Deck, DeckPokemon, Pokemon,
                     Trainer, Energy, DeckTrainer, DeckEnergy)
-from schemas import DeckUpdate
-from auth import oauth2_scheme, decode_token, get_api_key
-from synergy import calculate_deck_score
-from recommendations import generate_recommendations
-from utils import fetch_pokemon_data, fetch_trainer_data, fetch_energy_data
+from schemas import DeckUpdate, OptimizeRequest
+from auth import (oauth2_scheme, decode_token, get_api_key,
+                  create_scoped_token, decode_scoped_token)
+from deck_analytics import WEIGHTS, leaderboard
+from deck_matchups import matchup_report
+from deck_optimizer import optimize_deck
+from move_data import link_pokemon
+from deck_summary import refresh_deck_summary, get_deck_summary, summary_to_dict
+from what_if import load_deck_model, run_what_if, WHATIF_BUDGET_MS
+from deck_simulator import (load_deck_draws, run_simulation, SIMULATE_TRIALS,
+                            SIMULATE_MAX_TRIALS, SIMULATE_BUDGET_MS)
+from recommendations import generate_recommendations, iter_recommendations, degraded_upstreams
+from pokemon_provider import fetch_pokemon_data, pokemon_columns
+from utils import fetch_trainer_data, fetch_energy_data
 from fastapi.encoders import jsonable_encoder
+from profiling import span
 
 
 """
     This module handles all API routes related to deck management.
     It provides endpoints for getting the user deck, saving/updating the
     deck, and removing cards.
+
+    GET /deck returns at once; its recommendations are streamed separately
+    over Server-Sent Events from GET /deck/recommendations/stream, using
+    the short-lived "recommendations_token" of the deck response.
 """
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+RECOMMENDATIONS_SCOPE = "recommendations"
+RECOMMENDATIONS_TOKEN_MINUTES = float(os.getenv("RECOMMENDATIONS_TOKEN_MINUTES", "5"))
+
 
 def get_db():
     """
@@ -55,18 +78,78 @@ def get_current_user(token: str = Depends(oauth2_scheme),
     return user
 
 
+def get_read_db():
+    """
+        Provides a read-mostly session, served by a read replica when one is
+        configured (see database.ReadSessionLocal).
+        Yields:
+            Session: A SQLAlchemy session.
+    """
+
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_current_reader(token: str = Depends(oauth2_scheme),
+                       db: Session = Depends(get_read_db)):
+    """
+        Same as get_current_user(), for endpoints using get_read_db().
+    """
+
+    return get_current_user(token, db)
+
+
+def _degraded_status():
+    """
+        Tells clients whether the response was built from local data only
+        because an upstream's circuit breaker is open.
+    """
+
+    down = degraded_upstreams()
+    return {"degraded": bool(down), "unavailable_upstreams": down}
+
+
+def _sse(event: str, data, event_id: int = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _recommendations_stream(user: User, deck_id: int):
+    """
+        Returns the short-lived token and URL with which the client streams
+        the deck's recommendations (see stream_recommendations()).
+    """
+
+    # EventSource sends no cookies here, so the token carries the last write.
+    token = create_scoped_token(user.email, RECOMMENDATIONS_SCOPE, RECOMMENDATIONS_TOKEN_MINUTES,
+                                deck_id=deck_id, last_write=current_last_write())
+    return {"recommendations_token": token,
+            "recommendations_url": f"/deck/recommendations/stream?token={token}"}
+
+
 @router.get("/", openapi_extra={"security": [{"BearerAuth": []}]})
-def get_user_deck(user: User = Depends(get_current_user),
-                  db: Session = Depends(get_db)):
+def get_user_deck(inline_recommendations: bool = False,
+                  user: User = Depends(get_current_reader),
+                  db: Session = Depends(get_read_db)):
     """
         Retrieves the user's deck, including all Pokémon, Trainer, and Energy cards,
-        as well as a deck count and dynamic recommendations.
+        as well as a deck count and a token to stream its recommendations.
         Args:
+            inline_recommendations (bool): Compute the recommendations in this
+                response instead (slow: it may wait on PokéAPI and PokémonDB).
             user (User): The current authenticated user.
             db (Session): The database session.
         Returns:
-            dict: A dictionary containing the deck details, deck count, and
-            recommendations.
+            dict: A dictionary containing the deck details, deck count, the
+            deck score (0-100) with its components ("deck_analysis"),
+            recommendations (empty unless inline), "recommendations_token",
+            "recommendations_url", and "degraded" / "unavailable_upstreams".
     """
 
     user_deck = db.query(Deck).filter(and_(Deck.user_id == user.id)).first()
@@ -93,13 +176,12 @@ def get_user_deck(user: User = Depends(get_current_user),
         Energy.id.in_([entry.energy_id for entry in energy_entries])
     ).all()
 
-    base_score = calculate_deck_score(pokemon_list, trainer_list, energy_list)
-    max_score = 360
-    if base_score > max_score:
-        base_score = max_score
-    deck_score_percent = int(round((base_score / max_score) * 100))
+    summary = get_deck_summary(db, user_deck.id)
 
-    recommendations = generate_recommendations(user_deck, db)
+    if inline_recommendations:
+        recommendations = generate_recommendations(user_deck, db)
+    else:
+        recommendations = []
 
     return {
         "deck": {
@@ -117,12 +199,238 @@ def get_user_deck(user: User = Depends(get_current_user),
                 for e in energy_list
             ],
         },
-        "deck_count": len(pokemon_list) + len(trainer_list) + len(energy_list),
-        "deck_score": deck_score_percent,
+        "deck_count": summary.pokemon_count + summary.trainer_count + summary.energy_count,
+        "deck_score": summary.score,
+        "deck_analysis": {name: getattr(summary, name) for name in WEIGHTS},
         "recommendations": recommendations,
+        **_recommendations_stream(user, user_deck.id),
+        **_degraded_status(),
+    }
+
+
+@router.get("/recommendations/stream")
+def stream_recommendations(token: str = Query(...), db: Session = Depends(get_read_db)):
+    """
+        Streams the recommendations of the user's deck as Server-Sent Events,
+        each as soon as it is computed: one "recommendation" event per item,
+        then a "done" event with the count and the degraded status. The
+        token comes from GET /deck, because EventSource cannot send an
+        Authorization header.
+        Args:
+            token (str): The "recommendations_token" of GET /deck.
+            db (Session): The database session.
+        Returns:
+            StreamingResponse: A text/event-stream response.
+        Raises:
+            HTTPException: 401 if the token is invalid, 404 if the deck is gone.
+    """
+
+    claims = decode_scoped_token(token, RECOMMENDATIONS_SCOPE)
+    set_last_write(db, claims.get("last_write"))
+    deck = (db.query(Deck).join(User, User.id == Deck.user_id)
+            .filter(Deck.id == claims.get("deck_id"), User.email == claims.get("sub")).first())
+    if not deck:
+        raise HTTPException(status_code=404, detail="Deck not found")
+    deck_id = deck.id
+
+    def events():
+        # The request's session is closed once the response starts.
+        stream_db = ReadSessionLocal(last_write=claims.get("last_write"))
+        count = 0
+        try:
+            yield ": stream open\n\n"
+            for item in iter_recommendations(stream_db.get(Deck, deck_id), stream_db):
+                count += 1
+                yield _sse("recommendation", item, count)
+            yield _sse("done", {"count": count, **_degraded_status()})
+        except Exception:
+            logger.exception("Recommendation stream for deck %s failed", deck_id)
+            yield _sse("error", {"detail": "Could not compute recommendations", "count": count})
+        finally:
+            stream_db.close()
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.get("/summary", openapi_extra={"security": [{"BearerAuth": []}]})
+def get_user_deck_summary(user: User = Depends(get_current_reader),
+                          db: Session = Depends(get_read_db)):
+    """
+        Returns the header of the user's deck (card counts, score and its
+        components, type strengths and weaknesses) from the materialised
+        deck_summary row, without loading any cards.
+        Args:
+            user (User): The current authenticated user.
+            db (Session): The database session.
+        Returns:
+            dict: The deck summary.
+        Raises:
+            HTTPException: If no deck is found.
+    """
+
+    user_deck = db.query(Deck.id).filter(and_(Deck.user_id == user.id)).first()
+    if not user_deck:
+        raise HTTPException(status_code=404, detail="No deck found")
+    return summary_to_dict(get_deck_summary(db, user_deck.id))
+
+
+@router.get("/leaderboard", openapi_extra={"security": [{"BearerAuth": []}]})
+def get_leaderboard(limit: int = 10,
+                    user: User = Depends(get_current_reader),
+                    db: Session = Depends(get_read_db)):
+    """
+        Returns the highest scoring decks, scored in one batch over all decks.
+        Args:
+            limit (int): Number of decks to return (1-100).
+            user (User): The current authenticated user.
+            db (Session): The database session.
+        Returns:
+            dict: "leaderboard", a list of deck ids with their score and
+            score components, best first; "your_deck_id" marks the caller's deck.
+    """
+
+    limit = max(1, min(limit, 100))
+    with span("cpu", "leaderboard"):
+        rows = leaderboard(db, limit)
+    user_deck = db.query(Deck.id).filter(and_(Deck.user_id == user.id)).first()
+    return {
+        "leaderboard": rows,
+        "your_deck_id": user_deck.id if user_deck else None,
     }
 
 
+@router.get("/matchups", openapi_extra={"security": [{"BearerAuth": []}]})
+def get_matchups(limit: int = 10,
+                 user: User = Depends(get_current_reader),
+                 db: Session = Depends(get_read_db)):
+    """
+        Plays every deck against every other deck on type advantage and
+        returns the best records with a report on the field (see
+        deck_matchups.py). Results may be up to MATCHUP_CACHE_SECONDS old.
+        Args:
+            limit (int): Number of decks to return (1-100).
+            user (User): The current authenticated user.
+            db (Session): The database session.
+        Returns:
+            dict: "leaderboard" (wins, losses, ties, win rate and mean margin
+            per deck, best first), "meta" and "your_deck", the caller's
+            deck with its rank (None if it has no Pokémon).
+    """
+
+    limit = max(1, min(limit, 100))
+    user_deck = db.query(Deck.id).filter(and_(Deck.user_id == user.id)).first()
+    with span("cpu", "deck_matchups"):
+        report = matchup_report(db, limit, user_deck.id if user_deck else None)
+    return {
+        "leaderboard": report["leaderboard"],
+        "meta": report["meta"],
+        "your_deck": report["deck"],
+    }
+
+
+@router.get("/{deck_id}/what-if", openapi_extra={"security": [{"BearerAuth": []}]})
+def get_what_if(deck_id: int,
+                limit: int = 10,
+                budget_ms: int = WHATIF_BUDGET_MS,
+                user: User = Depends(get_current_user),
+                db: Session = Depends(get_db)):
+    """
+        Ranks every single-card change (adding a Pokémon or Energy card from
+        the local catalogue, or removing a card from the deck) by how much it
+        would change the deck score. Scoring runs on a worker process pool
+        without any network calls and stops at the latency budget.
+        Args:
+            deck_id (int): The deck to analyse; it must belong to the user.
+            limit (int): Number of changes to return (1-100).
+            budget_ms (int): Scoring time budget in milliseconds (50-5000).
+            user (User): The current authenticated user.
+            db (Session): The database session.
+        Returns:
+            dict: The base score, the best changes with their score delta
+            per component, and whether every candidate was evaluated.
+        Raises:
+            HTTPException: If the deck does not exist or is not the user's.
+    """
+
+    deck = db.query(Deck).filter(and_(Deck.id == deck_id, Deck.user_id == user.id)).first()
+    if not deck:
+        raise HTTPException(status_code=404, detail="No deck found")
+    model = load_deck_model(db, deck.id)
+    with span("cpu", "what_if"):
+        return run_what_if(model, budget_ms=max(50, min(budget_ms, 5000)),
+                           limit=max(1, min(limit, 100)))
+
+
+@router.get("/{deck_id}/simulate", openapi_extra={"security": [{"BearerAuth": []}]})
+def get_simulation(deck_id: int,
+                   trials: int = SIMULATE_TRIALS,
+                   budget_ms: int = SIMULATE_BUDGET_MS,
+                   turns: int = 4,
+                   hand_size: int = 7,
+                   prize_count: int = 6,
+                   seed: int = None,
+                   user: User = Depends(get_current_reader),
+                   db: Session = Depends(get_read_db)):
+    """
+        Estimates by Monte Carlo simulation how often the deck's opening hand
+        is playable, which cards end up as prizes and the odds of having
+        drawn each kind of card (and an Energy for a Pokémon) by each turn.
+        Trials run on the worker process pool and stop at the latency budget.
+        Args:
+            deck_id (int): The deck to simulate; it must belong to the user.
+            trials (int): Number of shuffles (1 to SIMULATE_MAX_TRIALS).
+            budget_ms (int): Simulation time budget in milliseconds (50-10000).
+            turns (int): Turns to report draw odds for (0-30).
+            hand_size (int): Cards in the opening hand (1-20).
+            prize_count (int): Prize cards set aside (0-10).
+            seed (int, optional): Seed, for reproducible results.
+            user (User): The current authenticated user.
+            db (Session): The database session.
+        Returns:
+            dict: Opening-hand, prize and draw-by-turn probabilities, and how
+            many trials ran within the budget.
+        Raises:
+            HTTPException: If the deck does not exist or is not the user's.
+    """
+
+    deck = db.query(Deck).filter(and_(Deck.id == deck_id, Deck.user_id == user.id)).first()
+    if not deck:
+        raise HTTPException(status_code=404, detail="No deck found")
+    draws = load_deck_draws(db, deck.id)
+    with span("cpu", "deck_simulator"):
+        return run_simulation(draws, trials=max(1, min(trials, SIMULATE_MAX_TRIALS)),
+                              budget_ms=max(50, min(budget_ms, 10000)),
+                              turns=max(0, min(turns, 30)),
+                              hand_size=max(1, min(hand_size, 20)),
+                              prize_count=max(0, min(prize_count, 10)), seed=seed)
+
+
+@router.post("/optimize", openapi_extra={"security": [{"BearerAuth": []}]})
+def post_optimize(request: OptimizeRequest,
+                  user: User = Depends(get_current_user),
+                  db: Session = Depends(get_db)):
+    """
+        Suggests the best scoring teams from the local Pokémon catalogue
+        under the given constraints (deck size, required Pokémon, allowed
+        types, number of Energy types), with the Energy cards they need.
+        Args:
+            request (OptimizeRequest): The constraints and search settings.
+            user (User): The current authenticated user.
+            db (Session): The database session.
+        Returns:
+            dict: The best teams with their scores, and search statistics.
+        Raises:
+            HTTPException: If no team can satisfy the constraints.
+    """
+
+    with span("cpu", "deck_optimizer"):
+        try:
+            return optimize_deck(**request.model_dump())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/", openapi_extra={"security": [{"BearerAuth": []}]})
 def save_deck(
     deck_update: DeckUpdate,
@@ -131,8 +439,9 @@ def save_deck(
 
     """
         Updates the user's deck by adding new Pokémon, Trainer, and Energy cards.
-        It avoids duplicate entries and returns updated deck details including
-        the deck score and dynamic recommendations.
+        It avoids duplicate entries and returns the added cards and the deck
+        score at once; the recommendations are streamed with the returned
+        token, as for GET /deck.
 
         Args:
             deck_update (DeckUpdate): The update payload with Pokémon IDs, Trainer names,
@@ -146,8 +455,10 @@ def save_deck(
                 - "added_pokemon": Any newly added Pokémon details,
                 - "added_trainers": Any newly added Trainer cards,
                 - "added_energy": Any newly added Energy cards,
-                - "deck_score": The updated synergy score,
-                - "recommendations": Dynamic suggestions to improve the deck.
+                - "deck_score": The updated deck score (0-100),
+                - "recommendations_token" / "recommendations_url": To stream
+                  suggestions to improve the deck,
+                - "degraded": Whether an upstream was unavailable.
     """
 
     user_deck = db.query(Deck).filter(and_(Deck.user_id == user.id)).first()
@@ -173,9 +484,10 @@ def save_deck(
             if not existing_pokemon:
                 pokemon_data = fetch_pokemon_data(pokemon_id)
                 if pokemon_data:
-                    pokemon_data.pop("id", None)
-                    new_pokemon = Pokemon(id=pokemon_id, **pokemon_data)
+                    new_pokemon = Pokemon(**pokemon_columns(pokemon_data))
                     db.add(new_pokemon)
+                    db.flush()
+                    link_pokemon(db, pokemon_id, fetch=False)
                     db.commit()
                     db.refresh(new_pokemon)
                     existing_pokemon = new_pokemon
@@ -222,33 +534,18 @@ def save_deck(
                 "tcg_image_url": existing_energy.tcg_image_url
             })
 
+    with span("cpu", "deck_score"):
+        summary = refresh_deck_summary(db, user_deck.id)
     db.commit()
 
-    pokemon_entries = db.query(DeckPokemon).filter(and_(DeckPokemon.deck_id == user_deck.id)).all()
-    trainer_entries = db.query(DeckTrainer).filter(and_(DeckTrainer.deck_id == user_deck.id)).all()
-    energy_entries = db.query(DeckEnergy).filter(and_(DeckEnergy.deck_id == user_deck.id)).all()
-
-    full_pokemon_list = db.query(Pokemon).filter(
-        Pokemon.id.in_([entry.pokemon_id for entry in pokemon_entries])
-    ).all()
-    full_trainer_list = db.query(Trainer).filter(
-        Trainer.id.in_([entry.trainer_id for entry in trainer_entries])
-    ).all()
-    full_energy_list = db.query(Energy).filter(
-        Energy.id.in_([entry.energy_id for entry in energy_entries])
-    ).all()
-
-    deck_score = calculate_deck_score(full_pokemon_list, full_trainer_list, full_energy_list)
-
-    recommendations = generate_recommendations(user_deck, db)
-
     return {
         "message": "Deck updated successfully",
         "added_pokemon": added_pokemon,
         "added_trainers": added_trainers,
         "added_energy": added_energy,
-        "deck_score": deck_score,
-        "recommendations": recommendations
+        "deck_score": summary.score,
+        **_recommendations_stream(user, user_deck.id),
+        **_degraded_status(),
     }
 
 
@@ -275,6 +572,7 @@ def remove_pokemon_from_deck(pokemon_id: int,
     db.query(DeckPokemon).filter(
         and_(DeckPokemon.deck_id == user_deck.id, DeckPokemon.pokemon_id == pokemon_id)
     ).delete()
+    refresh_deck_summary(db, user_deck.id)
     db.commit()
     return {"message": "Pokémon removed from deck"}
 
@@ -302,6 +600,7 @@ def remove_trainer_from_deck(trainer_id: int,
     db.query(DeckTrainer).filter(
         and_(DeckTrainer.deck_id == user_deck.id, DeckTrainer.trainer_id == trainer_id)
     ).delete()
+    refresh_deck_summary(db, user_deck.id)
     db.commit()
     return {"message": "Trainer removed from deck"}
 
@@ -329,5 +628,6 @@ def remove_energy_from_deck(energy_id: int,
     db.query(DeckEnergy).filter(
         and_(DeckEnergy.deck_id == user_deck.id, DeckEnergy.energy_id == energy_id)
     ).delete()
+    refresh_deck_summary(db, user_deck.id)
     db.commit()
     return {"message": "Energy removed from deck"}
@@ -0,0 +1,304 @@
+import logging
+import os
+import time
+from concurrent.futures import wait
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from deck_analytics import ENERGY_TYPES, TYPES, energy_mask, type_mask
+from models import Pokemon, Energy, DeckPokemon, DeckTrainer, DeckEnergy
+from what_if import get_pool, shutdown_pool
+
+"""
+    This module estimates how a deck draws, by Monte Carlo simulation.
+
+    A deck is reduced to card groups and their counts: the Trainer cards,
+    the Energy cards of each Energy type, and the Pokémon grouped by which
+    of the deck's Energy types can power them. Each trial shuffles the
+    group labels of the whole deck (one row of a (trials, cards) array,
+    shuffled with Generator.permuted), deals the opening hand, sets the
+    prize cards aside and draws one card per turn. Counting is done on
+    one-hot arrays for a whole chunk of trials at once, so there is no
+    per-trial Python loop.
+
+    Opening-hand odds are taken over all shuffles. A hand without a Pokémon
+    is a mulligan and is reshuffled, so prize and draw odds are taken over
+    the shuffles that give a playable hand. "Turn N" means N cards drawn
+    after the opening hand.
+
+    Chunks of trials run on the what-if worker pool (what_if.get_pool()):
+    workers only get the group counts, so tasks are tiny and need no
+    database. Chunks that do not finish within the latency budget are
+    dropped and the result is marked partial; every chunk has its own seed,
+    so a given seed gives the same numbers with or without the pool.
+
+    Settings (environment variables):
+        SIMULATE_TRIALS         default number of trials (default 100000)
+        SIMULATE_MAX_TRIALS     upper limit per request (default 1000000)
+        SIMULATE_CHUNK_TRIALS   trials per task (default 10000)
+        SIMULATE_PARALLEL_MIN   smallest trial count sent to the pool (default 40000)
+        SIMULATE_BUDGET_MS      default latency budget (default 1000)
+"""
+
+
+logger = logging.getLogger(__name__)
+
+SIMULATE_TRIALS = int(os.getenv("SIMULATE_TRIALS", "100000"))
+SIMULATE_MAX_TRIALS = int(os.getenv("SIMULATE_MAX_TRIALS", "1000000"))
+SIMULATE_CHUNK_TRIALS = int(os.getenv("SIMULATE_CHUNK_TRIALS", "10000"))
+SIMULATE_PARALLEL_MIN = int(os.getenv("SIMULATE_PARALLEL_MIN", "40000"))
+SIMULATE_BUDGET_MS = int(os.getenv("SIMULATE_BUDGET_MS", "1000"))
+
+HAND_SIZE = 7
+PRIZE_COUNT = 6
+
+POKEMON, TRAINER, ENERGY = "pokemon", "trainer", "energy"
+
+
+def energy_kind(energy_type: str, name: str = "") -> str:
+    """
+        Returns the TCG Energy type of an Energy card ("Fire", "Colorless",
+        ...), read from its energy_type or name; "Special" if neither names one.
+    """
+
+    for word in f"{energy_type or ''} {name or ''}".replace("-", " ").split():
+        if word.capitalize() in ENERGY_TYPES:
+            return word.capitalize()
+    return "Special"
+
+
+class DeckDraws:
+    """
+        A deck as card groups for the simulator.
+
+        counts (g,): cards per group; kinds: POKEMON, TRAINER or ENERGY per
+        group; categories: the reported columns ("pokemon", "trainer",
+        "energy" and one per Energy type) with a (g, c) membership matrix;
+        powers (g, g): powers[p, e] if Energy group e can power Pokémon group p.
+    """
+
+    def __init__(self, deck_id: int, pokemon_types, energy_cards, trainer_count: int):
+        self.deck_id = deck_id
+        kinds = sorted({energy_kind(energy_type, name) for energy_type, name in energy_cards})
+        kind_masks = {kind: np.zeros(len(TYPES), dtype=bool) for kind in kinds}
+        for energy_type, name in energy_cards:
+            kind_masks[energy_kind(energy_type, name)] |= energy_mask(energy_type, name)
+
+        # Pokémon are grouped by the Energy types of the deck that power them.
+        pokemon_groups = {}
+        for types in pokemon_types:
+            mask = type_mask(types)
+            powered_by = tuple(kind for kind in kinds if (kind_masks[kind] & mask).any())
+            pokemon_groups[powered_by] = pokemon_groups.get(powered_by, 0) + 1
+        energy_counts = {kind: 0 for kind in kinds}
+        for energy_type, name in energy_cards:
+            energy_counts[energy_kind(energy_type, name)] += 1
+
+        groups = ([(POKEMON, powered_by, count) for powered_by, count in sorted(pokemon_groups.items())]
+                  + ([(TRAINER, None, trainer_count)] if trainer_count else [])
+                  + [(ENERGY, kind, count) for kind, count in energy_counts.items()])
+        self.kinds = [kind for kind, _, _ in groups]
+        self.counts = np.array([count for _, _, count in groups], dtype=np.int64)
+        self.categories = [POKEMON, TRAINER, ENERGY, *kinds]
+        self.members = np.zeros((len(groups), len(self.categories)), dtype=np.int64)
+        self.powers = np.zeros((len(groups), len(groups)), dtype=bool)
+        for g, (kind, detail, _) in enumerate(groups):
+            self.members[g, self.categories.index(kind)] = 1
+            if kind == ENERGY:
+                self.members[g, self.categories.index(detail)] = 1
+        for p, (kind, powered_by, _) in enumerate(groups):
+            if kind != POKEMON:
+                continue
+            for e, (other, detail, _) in enumerate(groups):
+                self.powers[p, e] = other == ENERGY and detail in powered_by
+
+    @property
+    def size(self) -> int:
+        return int(self.counts.sum())
+
+    @property
+    def pokemon_groups(self) -> np.ndarray:
+        return np.array([kind == POKEMON for kind in self.kinds], dtype=bool)
+
+
+def load_deck_draws(db: Session, deck_id: int):
+    """
+        Loads the cards of a deck into a DeckDraws.
+        Args:
+            db (Session): The database session.
+            deck_id (int): The deck to simulate.
+        Returns:
+            DeckDraws: The deck's card groups.
+    """
+
+    pokemon_types = db.execute(select(Pokemon.types)
+                               .join(DeckPokemon, DeckPokemon.pokemon_id == Pokemon.id)
+                               .where(DeckPokemon.deck_id == deck_id)).scalars().all()
+    energy_cards = db.execute(select(Energy.energy_type, Energy.name)
+                              .join(DeckEnergy, DeckEnergy.energy_id == Energy.id)
+                              .where(DeckEnergy.deck_id == deck_id)).all()
+    trainer_count = len(db.execute(select(DeckTrainer.id)
+                                   .where(DeckTrainer.deck_id == deck_id)).all())
+    return DeckDraws(deck_id, pokemon_types, [tuple(card) for card in energy_cards],
+                     trainer_count)
+
+
+def simulate_chunk(counts: np.ndarray, members: np.ndarray, powers: np.ndarray,
+                   pokemon_groups: np.ndarray, hand_size: int, prize_count: int,
+                   turns: int, trials: int, seed):
+    """
+        Runs one chunk of trials. Pure numpy: runs in the worker processes
+        and needs no database or network access.
+        Args:
+            counts (np.ndarray): Cards per group, shape (g,).
+            members (np.ndarray): Group to reported category, shape (g, c).
+            powers (np.ndarray): Which Energy groups power which Pokémon groups, (g, g).
+            pokemon_groups (np.ndarray): Which groups are Pokémon, shape (g,).
+            hand_size (int): Cards in the opening hand.
+            prize_count (int): Prize cards set aside after the hand.
+            turns (int): Turns to draw for (one card each).
+            trials (int): Number of shuffles.
+            seed (np.random.SeedSequence): Seed of this chunk.
+        Returns:
+            dict: Sums over the chunk (see run_simulation()).
+    """
+
+    rng = np.random.default_rng(seed)
+    deck = np.repeat(np.arange(len(counts)), counts)
+    dealt = hand_size + prize_count + turns
+    cards = rng.permuted(np.tile(deck, (trials, 1)), axis=1)[:, :dealt]
+    one_hot = (cards[:, :, None] == np.arange(len(counts))).astype(np.int32)
+
+    hand = one_hot[:, :hand_size].sum(axis=1)
+    prizes = one_hot[:, hand_size:hand_size + prize_count].sum(axis=1)
+    # Cards seen by each turn, turn 0 being the opening hand: (trials, turns + 1, g).
+    seen = np.concatenate([hand[:, None], hand[:, None] + np.cumsum(
+        one_hot[:, hand_size + prize_count:], axis=1)], axis=1)
+
+    hand_categories = hand @ members
+    playable = (hand[:, pokemon_groups] > 0).any(axis=1)
+    seen_any = seen > 0
+    powered = seen_any & ((seen_any.astype(np.int32) @ powers.T.astype(np.int32)) > 0)
+    # Mulligans are reshuffled: prizes and draws only count kept hands.
+    kept = playable
+    prize_categories = prizes[kept] @ members
+    return {
+        "trials": trials,
+        "playable": int(playable.sum()),
+        "playable_with_energy": int((playable & (hand_categories[:, 2] > 0)).sum()),
+        "hand": hand_categories.sum(axis=0),
+        "kept": int(kept.sum()),
+        "prizes": prize_categories.sum(axis=0),
+        "prized_any": (prize_categories > 0).sum(axis=0),
+        "seen_any": ((seen[kept] @ members) > 0).sum(axis=0),
+        "powered": powered[kept].any(axis=2).sum(axis=0),
+    }
+
+
+def _combine(results):
+    totals = {}
+    for result in results:
+        for name, value in result.items():
+            totals[name] = totals[name] + value if name in totals else value
+    return totals
+
+
+def run_simulation(deck: DeckDraws, trials: int = SIMULATE_TRIALS,
+                   budget_ms: int = SIMULATE_BUDGET_MS, turns: int = 4,
+                   hand_size: int = HAND_SIZE, prize_count: int = PRIZE_COUNT, seed: int = None):
+    """
+        Simulates opening hands, prize cards and draws within a latency budget.
+        Hand and prize sizes are reduced when the deck is too small for them,
+        and turns stop when the deck runs out.
+        Args:
+            deck (DeckDraws): The deck to simulate.
+            trials (int): Number of shuffles.
+            budget_ms (int): Time allowed for the simulation, in milliseconds.
+            turns (int): Number of turns to report draw odds for.
+            hand_size (int): Cards in the opening hand.
+            prize_count (int): Prize cards set aside.
+            seed (int, optional): Seed, for reproducible results.
+        Returns:
+            dict: Opening-hand odds, expected prize cards and the chance of
+            having drawn each kind of card by each turn, with the number of
+            trials run, whether the result is partial, and the elapsed time.
+    """
+
+    start = time.perf_counter()
+    deadline = start + budget_ms / 1000
+    hand_size = min(hand_size, deck.size)
+    prize_count = min(prize_count, deck.size - hand_size)
+    turns = min(turns, deck.size - hand_size - prize_count)
+
+    chunks = [min(SIMULATE_CHUNK_TRIALS, trials - i) for i in range(0, trials, SIMULATE_CHUNK_TRIALS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    args = (deck.counts, deck.members, deck.powers, deck.pokemon_groups,
+            hand_size, prize_count, turns)
+    results = {}
+    pool = get_pool() if deck.size and trials >= SIMULATE_PARALLEL_MIN else None
+
+    if pool is not None:
+        try:
+            futures = {pool.submit(simulate_chunk, *args, size, seeds[i]): i
+                       for i, size in enumerate(chunks)}
+            done, pending = wait(futures, timeout=max(0.0, deadline - time.perf_counter()))
+            for future in pending:
+                future.cancel()
+            for future in done:
+                results[futures[future]] = future.result()
+        except BrokenProcessPool:
+            logger.warning("Simulation worker pool broke; simulating in-process")
+            shutdown_pool()
+    pooled = len(results)
+
+    # As in what_if.run_what_if(): the rest runs here until the budget runs
+    # out, and at least one chunk always runs.
+    for i, size in enumerate(chunks if deck.size else ()):
+        if i in results:
+            continue
+        if results and time.perf_counter() > deadline:
+            break
+        results[i] = simulate_chunk(*args, size, seeds[i])
+
+    totals = _combine(results.values())
+    run = totals.get("trials", 0)
+    kept = totals.get("kept", 0)
+
+    def share(count, total):
+        return round(float(count) / total, 4) if total else None
+
+    def by_category(values, total):
+        return {name: share(values[c], total) for c, name in enumerate(deck.categories)}
+
+    opening = prizes = None
+    draws = []
+    if run:
+        opening = {
+            "has_pokemon": share(totals["playable"], run),
+            "has_pokemon_and_energy": share(totals["playable_with_energy"], run),
+            "mulligan": share(run - totals["playable"], run),
+            "expected": by_category(totals["hand"], run),
+        }
+    if kept:
+        prizes = {"expected": by_category(totals["prizes"], kept),
+                  "any_prized": by_category(totals["prized_any"], kept)}
+        draws = [{"turn": turn,
+                  "drawn": by_category(totals["seen_any"][turn], kept),
+                  "pokemon_with_energy": share(totals["powered"][turn], kept)}
+                 for turn in range(turns + 1)]
+
+    return {
+        "deck_id": deck.deck_id,
+        "deck_size": deck.size,
+        "hand_size": hand_size,
+        "prize_count": prize_count,
+        "trials": trials,
+        "trials_run": int(run),
+        "partial": bool(deck.size) and run < trials,
+        "parallel": pooled > 0,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        "opening_hand": opening,
+        "prizes": prizes,
+        "draws": draws,
+    }
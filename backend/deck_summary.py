@@ -0,0 +1,214 @@
+import argparse
+import json
+from datetime import datetime, timezone
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from database import insert_ignore
+from deck_analytics import TYPES, WEIGHTS, score_decks
+from models import Deck, DeckSummary, DeckTrainer, DeckEnergy
+
+"""
+    This module maintains the 'deck_summary' table: one row per deck with the
+    card counts, the deck score and its components, and the types the deck is
+    strong against / weak to (with how many Pokémon share each weakness).
+
+    Every route that changes a deck calls refresh_deck_summary() before its
+    commit, so the summary is written in the same transaction as the change.
+    Reads (GET /deck/summary, the header of GET /deck/) then come from one
+    primary-key lookup instead of the association tables.
+
+    rebuild_summaries() recomputes many decks at once with the batch scorer,
+    and check_summaries() reports (and optionally repairs) rows that are
+    missing or out of date.
+
+    Usage (from the 'backend' folder):
+        python deck_summary.py rebuild
+        python deck_summary.py check [--repair]
+"""
+
+
+SUMMARY_FIELDS = ("pokemon_count", "trainer_count", "energy_count", "score",
+                  *WEIGHTS, "strengths", "weaknesses")
+
+
+def _distinct_counts(db: Session, column, deck_column, deck_ids):
+    query = (select(deck_column, func.count(func.distinct(column)))
+             .group_by(deck_column))
+    if deck_ids is not None:
+        query = query.where(deck_column.in_(deck_ids))
+    return dict(db.execute(query).all())
+
+
+def compute_summaries(db: Session, deck_ids=None):
+    """
+        Computes summary values for many decks in one pass.
+        Args:
+            db (Session): The database session.
+            deck_ids (list, optional): Decks to compute; all decks when omitted.
+        Returns:
+            dict: deck_id -> dict of SUMMARY_FIELDS values.
+    """
+
+    scores = score_decks(db, deck_ids)
+    trainers = _distinct_counts(db, DeckTrainer.trainer_id, DeckTrainer.deck_id, deck_ids)
+    energies = _distinct_counts(db, DeckEnergy.energy_id, DeckEnergy.deck_id, deck_ids)
+
+    summaries = {}
+    for i, deck_id in enumerate(scores["deck_id"].tolist()):
+        weakness_counts = scores["weakness_counts"][i]
+        summaries[deck_id] = {
+            "pokemon_count": int(scores["pokemon_count"][i]),
+            "trainer_count": trainers.get(deck_id, 0),
+            "energy_count": energies.get(deck_id, 0),
+            "score": int(scores["score"][i]),
+            **{name: round(float(scores[name][i]), 4) for name in WEIGHTS},
+            "strengths": [TYPES[t] for t in scores["strong_against"][i].nonzero()[0]],
+            "weaknesses": {TYPES[t]: int(weakness_counts[t])
+                           for t in weakness_counts.nonzero()[0]},
+        }
+    return summaries
+
+
+def _apply(summary: DeckSummary, values: dict):
+    for field, value in values.items():
+        setattr(summary, field, value)
+    summary.updated_at = datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def refresh_deck_summary(db: Session, deck_id: int):
+    """
+        Recomputes one deck's summary inside the caller's transaction. Pending
+        card changes are flushed first; the caller commits.
+        Args:
+            db (Session): The session holding the deck change.
+            deck_id (int): The deck to refresh.
+        Returns:
+            DeckSummary: The (new or updated) row.
+    """
+
+    db.flush()
+    values = compute_summaries(db, [deck_id]).get(deck_id)
+    if values is None:
+        return None
+    summary = db.get(DeckSummary, deck_id)
+    if summary is None:
+        # Two saves of a deck without a summary may both get here: the
+        # second insert is skipped and it updates the first one's row.
+        insert_ignore(db, DeckSummary, [{"deck_id": deck_id, **values}])
+        summary = db.get(DeckSummary, deck_id)
+    _apply(summary, values)
+    return summary
+
+
+def get_deck_summary(db: Session, deck_id: int):
+    """
+        Returns a deck's summary. If it is missing (e.g. for decks created
+        before the table existed), it is computed without being stored, so
+        read-only sessions never write; rebuild_summaries() or
+        'python deck_summary.py check --repair' stores it.
+    """
+
+    summary = db.get(DeckSummary, deck_id)
+    if summary is None:
+        values = compute_summaries(db, [deck_id]).get(deck_id)
+        if values is None:
+            return None
+        summary = DeckSummary(deck_id=deck_id)
+        _apply(summary, values)
+    return summary
+
+
+def summary_to_dict(summary: DeckSummary):
+    return {
+        "deck_id": summary.deck_id,
+        **{field: getattr(summary, field) for field in SUMMARY_FIELDS},
+        "deck_count": summary.pokemon_count + summary.trainer_count + summary.energy_count,
+        "updated_at": summary.updated_at.isoformat() if summary.updated_at else None,
+    }
+
+
+def rebuild_summaries(db: Session, deck_ids=None, batch_size: int = 5000):
+    """
+        Recomputes and stores summaries in bulk, one commit per batch.
+        Args:
+            db (Session): The database session.
+            deck_ids (list, optional): Decks to rebuild; all decks when omitted.
+            batch_size (int): Decks per batch.
+        Returns:
+            int: The number of summaries written.
+    """
+
+    if deck_ids is None:
+        deck_ids = db.execute(select(Deck.id).order_by(Deck.id)).scalars().all()
+    written = 0
+    for start in range(0, len(deck_ids), batch_size):
+        batch = deck_ids[start:start + batch_size]
+        computed = compute_summaries(db, batch)
+        existing = {s.deck_id: s for s in
+                    db.query(DeckSummary).filter(DeckSummary.deck_id.in_(batch))}
+        for deck_id, values in computed.items():
+            summary = existing.get(deck_id)
+            if summary is None:
+                summary = DeckSummary(deck_id=deck_id)
+                db.add(summary)
+            _apply(summary, values)
+            written += 1
+        db.commit()
+    return written
+
+
+def check_summaries(db: Session, repair: bool = False, batch_size: int = 5000):
+    """
+        Compares stored summaries with freshly computed ones.
+        Args:
+            db (Session): The database session.
+            repair (bool): Rebuild the decks that do not match.
+            batch_size (int): Decks per batch.
+        Returns:
+            dict: "checked", and the deck ids that are "missing" a summary or
+            have a "stale" one.
+    """
+
+    deck_ids = db.execute(select(Deck.id).order_by(Deck.id)).scalars().all()
+    missing, stale = [], []
+    for start in range(0, len(deck_ids), batch_size):
+        batch = deck_ids[start:start + batch_size]
+        computed = compute_summaries(db, batch)
+        stored = {s.deck_id: s for s in
+                  db.query(DeckSummary).filter(DeckSummary.deck_id.in_(batch))}
+        for deck_id, values in computed.items():
+            summary = stored.get(deck_id)
+            if summary is None:
+                missing.append(deck_id)
+            elif any(getattr(summary, field) != value for field, value in values.items()):
+                stale.append(deck_id)
+    if repair and (missing or stale):
+        rebuild_summaries(db, missing + stale, batch_size)
+    return {"checked": len(deck_ids), "missing": missing, "stale": stale}
+
+
+def main(argv=None):
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain the deck_summary table.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="Recompute every deck summary.")
+    check = sub.add_parser("check", help="Report missing or stale summaries.")
+    check.add_argument("--repair", action="store_true", help="Rebuild the ones that differ.")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            print(f"Rebuilt {rebuild_summaries(db)} deck summaries.")
+        else:
+            report = check_summaries(db, repair=args.repair)
+            print(json.dumps(report))
+            if (report["missing"] or report["stale"]) and not args.repair:
+                raise SystemExit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, and_
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import (User, Deck, DeckPokemon, DeckTrainer, DeckEnergy,
+                    Trainer, Energy)
+from deck_routes import get_current_user, get_db
+from ndjson_io import stream_table_ndjson, iter_ndjson, EXPORT_BATCH_SIZE
+
+"""
+    This module provides streaming NDJSON export endpoints.
+    The card catalogue (Pokémon, Trainer and Energy tables) can be downloaded
+    in full, and a logged-in user can download their own deck. Responses are
+    generated row by row from a server-side cursor, so memory use stays the
+    same for ten rows or ten million. Use 'ndjson_io.py import' to load the
+    files into another database.
+
+    Current endpoints:
+      - GET /export/catalogue/{table}
+      - GET /export/deck
+"""
+
+
+router = APIRouter()
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+CATALOGUE_TABLES = ("pokemon", "trainers", "energy")
+
+
+@router.get("/catalogue/{table}")
+def export_catalogue(table: str):
+    """
+        Streams one catalogue table as NDJSON, one row per line.
+        Args:
+            table (str): One of "pokemon", "trainers" or "energy".
+        Returns:
+            StreamingResponse: The NDJSON stream.
+        Raises:
+            HTTPException: If the table is not part of the catalogue.
+    """
+
+    if table not in CATALOGUE_TABLES:
+        raise HTTPException(status_code=404,
+                            detail=f"Unknown catalogue table '{table}'.")
+    return StreamingResponse(
+        stream_table_ndjson(table),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{table}.ndjson"'}
+    )
+
+
+def iter_deck_cards(deck_id: int, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+        Yields the cards of one deck as portable references. Pokémon are
+        identified by their PokéAPI id and TCG cards by their TCG id, so the
+        deck can be rebuilt in a database where the row ids differ.
+        Args:
+            deck_id (int): The deck to export.
+            batch_size (int): Rows fetched per round trip.
+        Yields:
+            dict: One card reference per deck entry.
+    """
+
+    db = SessionLocal()
+    try:
+        pokemon_rows = db.execute(
+            select(DeckPokemon.pokemon_id)
+            .where(and_(DeckPokemon.deck_id == deck_id))
+            .order_by(DeckPokemon.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for pokemon_id, in pokemon_rows:
+            yield {"card_type": "pokemon", "pokemon_id": pokemon_id}
+
+        trainer_rows = db.execute(
+            select(Trainer.tcg_id, Trainer.name)
+            .join(DeckTrainer, DeckTrainer.trainer_id == Trainer.id)
+            .where(and_(DeckTrainer.deck_id == deck_id))
+            .order_by(DeckTrainer.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for tcg_id, name in trainer_rows:
+            yield {"card_type": "trainer", "tcg_id": tcg_id, "name": name}
+
+        energy_rows = db.execute(
+            select(Energy.tcg_id, Energy.name, Energy.energy_type)
+            .join(DeckEnergy, DeckEnergy.energy_id == Energy.id)
+            .where(and_(DeckEnergy.deck_id == deck_id))
+            .order_by(DeckEnergy.id)
+            .execution_options(yield_per=batch_size)
+        )
+        for tcg_id, name, energy_type in energy_rows:
+            yield {"card_type": "energy", "tcg_id": tcg_id, "name": name,
+                   "energy_type": energy_type}
+    finally:
+        db.close()
+
+
+@router.get("/deck", openapi_extra={"security": [{"BearerAuth": []}]})
+def export_user_deck(user: User = Depends(get_current_user),
+                     db: Session = Depends(get_db)):
+    """
+        Streams the current user's deck as NDJSON card references.
+        Args:
+            user (User): The current authenticated user.
+            db (Session): The database session.
+        Returns:
+            StreamingResponse: The NDJSON stream.
+        Raises:
+            HTTPException: If the user has no deck.
+    """
+
+    deck_id = db.execute(
+        select(Deck.id).where(and_(Deck.user_id == user.id))
+    ).scalar()
+    if deck_id is None:
+        raise HTTPException(status_code=404, detail="No deck found")
+
+    return StreamingResponse(
+        iter_ndjson(iter_deck_cards(deck_id)),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="deck.ndjson"'}
+    )
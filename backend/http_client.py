@@ -0,0 +1,261 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+import urllib.parse
+import requests
+from requests.adapters import HTTPAdapter
+from profiling import METRICS, span
+
+"""
+    This module is the single way the backend talks to third-party services.
+    It keeps one pooled requests.Session (so connections to PokéAPI and the
+    TCG API are reused instead of re-opened for every call) and records
+    every call as an "http" span for the profiling middleware.
+
+    Every upstream also has a circuit breaker. After
+    BREAKER_FAILURE_THRESHOLD consecutive failures (connection errors,
+    timeouts or 5xx responses) it opens: calls return a local 503 response
+    at once instead of waiting on the outage. After BREAKER_RESET_SECONDS
+    one probe call is let through (half-open); its result closes or reopens
+    the breaker. Callers already treat a 503 like any failed call and fall
+    back to local data; is_available() lets them skip the call altogether.
+    Calls without an explicit timeout get HTTP_TIMEOUT_SECONDS.
+"""
+
+
+UPSTREAM_NAMES = {
+    "pokeapi.co": "pokeapi",
+    "api.pokemontcg.io": "tcg",
+    "img.pokemondb.net": "pokemondb",
+    "images.pokemontcg.io": "tcg-images",
+}
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "10"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+logger = logging.getLogger(__name__)
+
+METRICS.describe("upstream_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open).")
+METRICS.describe("upstream_short_circuits_total", "Calls answered locally by an open breaker.")
+
+_session = requests.Session()
+_session.mount("http://", HTTPAdapter(pool_connections=8, pool_maxsize=32))
+_session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=32))
+
+
+def upstream_name(url: str) -> str:
+    """
+        Maps a URL to a short upstream label used in metrics.
+        Args:
+            url (str): The request URL.
+        Returns:
+            str: e.g. "pokeapi", or the host name for unknown hosts.
+    """
+
+    host = urllib.parse.urlsplit(url).hostname or "unknown"
+    return UPSTREAM_NAMES.get(host, host)
+
+
+class CircuitBreaker:
+    """
+        Tracks the health of one upstream.
+
+        Args:
+            name (str): The upstream label.
+            failure_threshold (int): Consecutive failures that open it.
+            reset_timeout (float): Seconds it stays open before a probe.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+            Returns True if a call may go out now. In the half-open state
+            only one probe is in flight at a time.
+        """
+
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def available(self) -> bool:
+        """
+            Returns False while the breaker is open and not yet due a probe.
+        """
+
+        with self._lock:
+            return (self.state == CLOSED or (self.state == OPEN and time.monotonic()
+                                             - self.opened_at >= self.reset_timeout)
+                    or (self.state == HALF_OPEN and not self._probing))
+
+    def retry_in(self) -> float:
+        with self._lock:
+            if self.state == CLOSED:
+                return 0.0
+            return max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info("Circuit for %s closed", self.name)
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning("Circuit for %s opened after %s failures",
+                                   self.name, self.failures)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(upstream: str) -> CircuitBreaker:
+    """
+        Returns the circuit breaker of an upstream label, creating it on
+        first use.
+    """
+
+    with _breakers_lock:
+        found = _breakers.get(upstream)
+        if found is None:
+            found = _breakers[upstream] = CircuitBreaker(upstream)
+        return found
+
+
+def is_available(upstream: str) -> bool:
+    """
+        Returns False while the upstream's breaker is open, so callers can
+        go straight to their local fallback.
+    """
+
+    return breaker(upstream).available()
+
+
+def unavailable_upstreams(*upstreams):
+    """
+        Returns the given upstream labels whose breaker is open.
+    """
+
+    return [upstream for upstream in upstreams if not is_available(upstream)]
+
+
+def breaker_states():
+    """
+        Returns:
+            dict: upstream label -> "closed", "half_open" or "open".
+    """
+
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.state for b in breakers}
+
+
+def reset_breakers():
+    """
+        Forgets every breaker (e.g. after pointing the app at other hosts).
+    """
+
+    with _breakers_lock:
+        _breakers.clear()
+
+
+def _collect_metrics():
+    for name, state in breaker_states().items():
+        METRICS.set("upstream_circuit_state", {"upstream": name}, STATE_VALUES[state])
+
+
+METRICS.add_collector(_collect_metrics)
+
+
+def unavailable_response(url: str, upstream: str, retry_after: float):
+    """
+        Builds the 503 response returned instead of calling a failing
+        upstream.
+    """
+
+    response = requests.Response()
+    response.status_code = 503
+    response.url = url
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    response.headers["Content-Type"] = "application/json"
+    response._content = json.dumps({"detail": f"{upstream} is unavailable"}).encode("utf-8")
+    return response
+
+
+def request(method: str, url: str, upstream: str = None, **kwargs):
+    """
+        Sends an HTTP request through the shared session and records its timing.
+        Args:
+            method (str): The HTTP method.
+            url (str): The full URL.
+            upstream (str, optional): Label for metrics; derived from the host
+                when omitted (callers pass it so stubbed hosts are labelled
+                correctly).
+            **kwargs: Passed through to requests (headers, timeout, params, ...).
+        Returns:
+            Response: The requests Response object, or a local 503 response
+            when the upstream's breaker is open or the call failed to
+            connect or timed out.
+    """
+
+    upstream = upstream or upstream_name(url)
+    circuit = breaker(upstream)
+    if not circuit.allow():
+        METRICS.inc("upstream_short_circuits_total", {"upstream": upstream})
+        return unavailable_response(url, upstream, circuit.retry_in())
+    kwargs.setdefault("timeout", HTTP_TIMEOUT_SECONDS)
+    try:
+        with span("http", upstream):
+            response = _session.request(method, url, **kwargs)
+    except requests.RequestException as e:
+        circuit.record_failure()
+        logger.warning("%s %s failed: %s", method, upstream, e.__class__.__name__)
+        return unavailable_response(url, upstream, circuit.retry_in())
+    except Exception:
+        circuit.record_failure()
+        raise
+    if response.status_code >= 500:
+        circuit.record_failure()
+    else:
+        circuit.record_success()
+    return response
+
+
+def get(url: str, upstream: str = None, **kwargs):
+    return request("GET", url, upstream, **kwargs)
+
+
+def head(url: str, upstream: str = None, **kwargs):
+    return request("HEAD", url, upstream, **kwargs)
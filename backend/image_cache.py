@@ -0,0 +1,203 @@
+import hashlib
+import io
+import os
+import threading
+import urllib.parse
+from PIL import Image
+import http_client
+import utils
+from profiling import METRICS, span
+
+"""
+    This module keeps a local copy of the card and Pokémon images the
+    frontend shows, so every image is fetched from its third-party host once
+    and served in small, fixed thumbnail sizes afterwards.
+
+    The cache is content-addressed on disk (IMAGE_CACHE_DIR):
+      - originals/ab/<sha256>.<ext>   the fetched bytes, named by their hash,
+      - thumbs/ab/<sha256>-<width>.webp  one WebP file per thumbnail size,
+      - urls/ab/<sha256 of url>       the hash a URL resolved to.
+    Files are written to a temporary name and renamed, so readers never see
+    a partial file, and several processes can share the directory. Once an
+    image is cached it is served without asking the upstream again, so it
+    survives upstream outages.
+
+    Only hosts the app itself links to are proxied (see allowed_hosts()).
+"""
+
+
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR",
+                            os.path.join(os.path.dirname(__file__), ".image_cache"))
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+IMAGE_PROXY_ALLOWED_HOSTS = os.getenv("IMAGE_PROXY_ALLOWED_HOSTS", "")
+
+# Thumbnail widths; the height follows the image's aspect ratio.
+THUMBNAIL_SIZES = {"thumb": 128, "small": 256, "medium": 512}
+EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/gif": "gif", "image/webp": "webp"}
+MEDIA_TYPES = {ext: media_type for media_type, ext in EXTENSIONS.items()}
+
+METRICS.describe("image_cache_requests_total", "Image proxy requests, by result.")
+METRICS.describe("image_cache_fetched_bytes_total", "Bytes fetched from image hosts.")
+
+
+class ImageUnavailable(Exception):
+    """
+        Raised when an image is not cached and cannot be fetched, or cannot
+        be decoded.
+    """
+
+
+# What Pillow raises for bytes it cannot decode (verify() reports some
+# broken files as SyntaxError).
+UNREADABLE = (OSError, SyntaxError, Image.DecompressionBombError)
+
+
+def allowed_hosts():
+    """
+        Returns the host names (with port, if any) images may be proxied
+        from: the known image hosts, the configured PokémonDB base URL and
+        IMAGE_PROXY_ALLOWED_HOSTS.
+    """
+
+    hosts = {"img.pokemondb.net", "images.pokemontcg.io"}
+    hosts.add(urllib.parse.urlsplit(utils.POKEMON_IMAGE_BASE_URL).netloc)
+    hosts.update(host.strip() for host in IMAGE_PROXY_ALLOWED_HOSTS.split(",") if host.strip())
+    return hosts
+
+
+def is_allowed(url: str) -> bool:
+    parts = urllib.parse.urlsplit(url)
+    return parts.scheme in ("http", "https") and parts.netloc in allowed_hosts()
+
+
+def _sharded(kind: str, name: str) -> str:
+    return os.path.join(IMAGE_CACHE_DIR, kind, name[:2], name)
+
+
+def _write_atomic(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _locks_guard:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.Lock()
+        return lock
+
+
+def _cached_original(url_key: str):
+    try:
+        with open(_sharded("urls", url_key), encoding="ascii") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = _sharded("originals", name)
+    return path if os.path.exists(path) else None
+
+
+def fetch_original(url: str) -> str:
+    """
+        Returns the path of the cached original, fetching it first if
+        needed. Concurrent requests for the same URL fetch it once.
+        Args:
+            url (str): An allowed image URL.
+        Returns:
+            str: Path of the original file.
+        Raises:
+            ImageUnavailable: If the upstream fails or does not return an
+                image within IMAGE_MAX_BYTES.
+    """
+
+    url_key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    path = _cached_original(url_key)
+    if path:
+        return path
+    try:
+        with _lock_for(url_key):
+            return _cached_original(url_key) or _download(url, url_key)
+    finally:
+        with _locks_guard:
+            _locks.pop(url_key, None)
+
+
+def _download(url: str, url_key: str) -> str:
+    response = http_client.get(url, timeout=10, upstream=http_client.upstream_name(url))
+    media_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if response.status_code != 200 or media_type not in EXTENSIONS:
+        raise ImageUnavailable(f"{url} returned {response.status_code} ({media_type})")
+    if len(response.content) > IMAGE_MAX_BYTES:
+        raise ImageUnavailable(f"{url} is larger than {IMAGE_MAX_BYTES} bytes")
+    METRICS.inc("image_cache_fetched_bytes_total", value=len(response.content))
+    try:
+        with Image.open(io.BytesIO(response.content)) as image:
+            image.verify()
+    except UNREADABLE as exc:
+        raise ImageUnavailable(f"{url} is not a readable image: {exc}") from exc
+    name = f"{hashlib.sha256(response.content).hexdigest()}.{EXTENSIONS[media_type]}"
+    path = _sharded("originals", name)
+    if not os.path.exists(path):
+        _write_atomic(path, response.content)
+    _write_atomic(_sharded("urls", url_key), name.encode("ascii"))
+    return path
+
+
+def make_thumbnail(original: str, width: int) -> str:
+    """
+        Returns the path of the WebP thumbnail of an original at the given
+        width (never larger than the original), creating it if needed.
+        Raises:
+            ImageUnavailable: If Pillow cannot decode the original.
+    """
+
+    digest = os.path.basename(original).split(".")[0]
+    path = _sharded("thumbs", f"{digest}-{width}.webp")
+    if os.path.exists(path):
+        return path
+    try:
+        with span("cpu", "thumbnail"), Image.open(original) as image:
+            image.load()
+            has_alpha = image.mode in ("RGBA", "LA", "P") and (
+                image.mode != "P" or "transparency" in image.info)
+            image = image.convert("RGBA" if has_alpha else "RGB")
+            image.thumbnail((width, width * 4), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, "WEBP", quality=80, method=4)
+    except UNREADABLE as exc:
+        raise ImageUnavailable(f"{original} cannot be resized: {exc}") from exc
+    _write_atomic(path, buffer.getvalue())
+    return path
+
+
+def get_image(url: str, size: str = "small"):
+    """
+        Returns a cached image, fetching and resizing it on first use.
+        Args:
+            url (str): An allowed image URL.
+            size (str): A THUMBNAIL_SIZES key, or "original".
+        Returns:
+            tuple: (path, media type, ETag value).
+        Raises:
+            ImageUnavailable: See fetch_original() and make_thumbnail().
+            ValueError: If the size is unknown.
+    """
+
+    if size != "original" and size not in THUMBNAIL_SIZES:
+        raise ValueError(f"Unknown size: {size}")
+    try:
+        original = fetch_original(url)
+        path = original if size == "original" else make_thumbnail(original, THUMBNAIL_SIZES[size])
+    except ImageUnavailable:
+        METRICS.inc("image_cache_requests_total", {"result": "unavailable"})
+        raise
+    METRICS.inc("image_cache_requests_total", {"result": "served"})
+    name = os.path.basename(path)
+    return path, MEDIA_TYPES[name.rsplit(".", 1)[1]], f'"{name.rsplit(".", 1)[0]}"'
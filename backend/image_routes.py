@@ -0,0 +1,58 @@
+import os
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response
+import image_cache
+
+"""
+    This module serves card and Pokémon images from the local image cache
+    (image_cache.py), resized to fixed thumbnail sizes.
+
+    Responses are immutable for a year: an image URL never changes content,
+    and the ETag is the content hash. Files are sent with FileResponse, which
+    streams them straight from disk; behind nginx, set
+    IMAGE_ACCEL_REDIRECT_PREFIX to an internal location aliasing
+    IMAGE_CACHE_DIR and nginx sends the file itself (sendfile).
+
+    Current endpoints:
+      - GET /images?url=...&size=thumb|small|medium|original
+"""
+
+
+router = APIRouter()
+
+IMAGE_ACCEL_REDIRECT_PREFIX = os.getenv("IMAGE_ACCEL_REDIRECT_PREFIX", "")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+@router.get("")
+def get_image(request: Request, url: str = Query(...),
+              size: str = Query("small", pattern="^(thumb|small|medium|original)$")):
+    """
+        Returns an image from the cache, fetching and resizing it on first
+        use. If the image is not cached and its host fails, the client is
+        redirected to the original URL.
+        Args:
+            request (Request): Used for the If-None-Match header.
+            url (str): The image URL, on one of the allowed hosts.
+            size (str): "thumb", "small", "medium" or "original".
+        Returns:
+            Response: The image, 304 if the client has it, or a 307 redirect.
+        Raises:
+            HTTPException: 400 if the host is not allowed.
+    """
+
+    if not image_cache.is_allowed(url):
+        raise HTTPException(status_code=400, detail="Image host not allowed")
+    try:
+        path, media_type, etag = image_cache.get_image(url, size)
+    except image_cache.ImageUnavailable:
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": "no-store"})
+
+    headers = {"Cache-Control": IMMUTABLE, "ETag": etag}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if IMAGE_ACCEL_REDIRECT_PREFIX:
+        relative = os.path.relpath(path, image_cache.IMAGE_CACHE_DIR).replace(os.sep, "/")
+        headers["X-Accel-Redirect"] = f"{IMAGE_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{relative}"
+        return Response(media_type=media_type, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
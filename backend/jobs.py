@@ -0,0 +1,384 @@
+import logging
+import traceback
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+from sqlalchemy import select, update, func, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import Job, Pokemon
+from schemas import PokemonBackfillPayload
+from profiling import METRICS
+
+"""
+    This module is a small job queue kept in the 'jobs' table, so slow
+    maintenance work (catalogue sync, Pokémon backfill, image probes, deck
+    summary rebuilds) runs in worker.py instead of in request handlers,
+    without an external broker. It works the same on SQLite and PostgreSQL.
+
+      - enqueue() adds a job; a dedupe_key makes it a no-op while a job
+        with the same key is still queued or running.
+      - claim() hands a due job to a worker with a conditional UPDATE, so
+        two workers never run the same job. The UPDATE also counts the
+        running jobs of the type, so the type's concurrency limit holds
+        across all workers (on PostgreSQL, claims of one type are serialised
+        with a transaction-level advisory lock; SQLite serialises all writes).
+      - run_job() runs the handler; a failure is retried with exponential
+        backoff until the job's max_attempts. A job whose worker died counts
+        as a failed attempt too.
+
+    Job types are registered with @job_type. Handlers receive a session and
+    the payload and return a JSON-serialisable result. Only types registered
+    with public=True can be enqueued by users through POST /jobs.
+"""
+
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+ACTIVE = (QUEUED, RUNNING)
+LEASE_SECONDS = 300
+
+METRICS.describe("jobs_total", "Background job attempts, by type and outcome.")
+
+
+@dataclass
+class JobType:
+    name: str
+    handler: Callable
+    concurrency: int = 1
+    max_attempts: int = 3
+    backoff_seconds: float = 30.0
+    public: bool = False
+    payload_schema: Optional[type] = None
+
+
+JOB_TYPES = {}
+
+
+def job_type(name: str, concurrency: int = 1, max_attempts: int = 3,
+             backoff_seconds: float = 30.0, public: bool = False, payload_schema: type = None):
+    """
+        Registers a job handler.
+        Args:
+            name (str): The job type.
+            concurrency (int): Jobs of this type that may run at once, over
+                all workers.
+            max_attempts (int): Default attempts before a job fails for good.
+            backoff_seconds (float): Delay before the first retry; doubles
+                with every further attempt.
+            public (bool): Whether users may enqueue it through POST /jobs.
+            payload_schema (type, optional): A pydantic model POST /jobs
+                validates the payload with before enqueueing.
+    """
+
+    def register(handler):
+        JOB_TYPES[name] = JobType(name, handler, concurrency, max_attempts, backoff_seconds,
+                                  public, payload_schema)
+        return handler
+    return register
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def enqueue(db: Session, type_name: str, payload: dict = None, dedupe_key: str = None,
+            delay_seconds: float = 0, max_attempts: int = None, owner_id: int = None) -> Job:
+    """
+        Adds a job to the queue and commits.
+        Args:
+            db (Session): The database session.
+            type_name (str): A registered job type.
+            payload (dict, optional): Arguments for the handler.
+            dedupe_key (str, optional): While a job with this key is queued
+                or running, that job is returned instead of a new one.
+            delay_seconds (float): Do not run before this many seconds.
+            max_attempts (int, optional): Overrides the job type's default.
+            owner_id (int, optional): The user who asked for the job.
+        Returns:
+            Job: The new job, or the active job with the same dedupe_key.
+        Raises:
+            ValueError: If the job type is not registered.
+    """
+
+    spec = JOB_TYPES.get(type_name)
+    if spec is None:
+        raise ValueError(f"Unknown job type: {type_name}")
+    if dedupe_key:
+        existing = _active_with_key(db, dedupe_key)
+        if existing is not None:
+            return existing
+    job = Job(type=type_name, payload=payload or {}, status=QUEUED, dedupe_key=dedupe_key,
+              owner_id=owner_id, attempts=0, max_attempts=max_attempts or spec.max_attempts,
+              run_at=_now() + timedelta(seconds=delay_seconds), created_at=_now())
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request enqueued the same key first.
+        db.rollback()
+        existing = _active_with_key(db, dedupe_key)
+        if existing is None:
+            raise
+        return existing
+    db.refresh(job)
+    return job
+
+
+def _active_with_key(db: Session, dedupe_key: str):
+    return db.execute(select(Job).where(Job.dedupe_key == dedupe_key,
+                                        Job.status.in_(ACTIVE))).scalars().first()
+
+
+def requeue_expired(db: Session) -> int:
+    """
+        Handles the running jobs whose worker stopped renewing its lease (it
+        crashed or was killed): they are queued again, or marked failed once
+        they have used all their attempts, so a job that keeps killing its
+        worker is not retried forever.
+        Returns:
+            int: The number of jobs requeued.
+    """
+
+    now = _now()
+    expired = (Job.status == RUNNING, Job.locked_until < now)
+    failed = db.execute(update(Job).where(*expired, Job.attempts >= Job.max_attempts)
+                        .values(status=FAILED, locked_by=None, locked_until=None,
+                                finished_at=now, error="Worker stopped before the job finished"))
+    result = db.execute(update(Job).where(*expired)
+                        .values(status=QUEUED, locked_by=None, locked_until=None, run_at=now))
+    db.commit()
+    if failed.rowcount:
+        logger.warning("Failed %s jobs whose worker stopped on their last attempt",
+                       failed.rowcount)
+    if result.rowcount:
+        logger.warning("Requeued %s jobs with expired leases", result.rowcount)
+    return result.rowcount
+
+
+def renew_leases(db: Session, worker_id: str):
+    """
+        Extends the lease of every job the worker is running.
+    """
+
+    db.execute(update(Job).where(Job.status == RUNNING, Job.locked_by == worker_id)
+               .values(locked_until=_now() + timedelta(seconds=LEASE_SECONDS)))
+    db.commit()
+
+
+def _lock_type(db: Session, type_name: str):
+    # PostgreSQL checks the running count of concurrent claims against
+    # their own snapshot; the lock makes claims of one type take turns.
+    if db.bind.dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+                   {"key": f"jobs:{type_name}"})
+
+
+def _running_counts(db: Session):
+    return dict(db.execute(select(Job.type, func.count()).where(Job.status == RUNNING)
+                           .group_by(Job.type)).all())
+
+
+def claim(db: Session, worker_id: str, types=None):
+    """
+        Takes the oldest due job whose type is below its concurrency limit.
+        The limit is checked in the claiming UPDATE itself, so it holds when
+        several workers claim at the same time.
+        Args:
+            db (Session): The database session.
+            worker_id (str): Recorded in locked_by.
+            types (iterable, optional): Only claim these job types.
+        Returns:
+            Job: The claimed job (now "running"), or None.
+    """
+
+    types = [name for name in (types or JOB_TYPES) if name in JOB_TYPES]
+    running = _running_counts(db)
+    free = [name for name in types if running.get(name, 0) < JOB_TYPES[name].concurrency]
+    if not free:
+        return None
+
+    candidates = db.execute(select(Job.id, Job.type)
+                            .where(Job.status == QUEUED, Job.run_at <= _now(), Job.type.in_(free))
+                            .order_by(Job.run_at, Job.id).limit(10)).all()
+    others = Job.__table__.alias("running_jobs")
+    for job_id, type_name in candidates:
+        _lock_type(db, type_name)
+        running_count = (select(func.count()).select_from(others)
+                         .where(others.c.type == type_name, others.c.status == RUNNING)
+                         .scalar_subquery())
+        now = _now()
+        claimed = db.execute(update(Job)
+                             .where(Job.id == job_id, Job.status == QUEUED,
+                                    running_count < JOB_TYPES[type_name].concurrency)
+                             .values(status=RUNNING, locked_by=worker_id, started_at=now,
+                                     locked_until=now + timedelta(seconds=LEASE_SECONDS),
+                                     attempts=Job.attempts + 1))
+        db.commit()
+        if claimed.rowcount == 1:
+            return db.get(Job, job_id)
+    return None
+
+
+def run_job(db: Session, job: Job):
+    """
+        Runs a claimed job and records its outcome. A failed attempt is
+        queued again after a backoff until max_attempts is reached.
+        Args:
+            db (Session): The session the job was claimed with.
+            job (Job): The job.
+        Returns:
+            Job: The updated job.
+    """
+
+    spec = JOB_TYPES.get(job.type)
+    try:
+        if spec is None:
+            raise ValueError(f"Unknown job type: {job.type}")
+        result = spec.handler(db, dict(job.payload or {}))
+    except Exception as e:
+        db.rollback()
+        job = db.get(Job, job.id)
+        job.error = "".join(traceback.format_exception_only(type(e), e)).strip()
+        job.locked_by = job.locked_until = None
+        if spec is not None and job.attempts < job.max_attempts:
+            delay = spec.backoff_seconds * 2 ** (job.attempts - 1)
+            job.status = QUEUED
+            job.run_at = _now() + timedelta(seconds=delay)
+            outcome = "retry"
+        else:
+            job.status = FAILED
+            job.finished_at = _now()
+            outcome = "failed"
+        logger.warning("Job %s (%s) failed: %s", job.id, job.type, job.error)
+    else:
+        job = db.get(Job, job.id)
+        job.status = SUCCEEDED
+        job.result = result
+        job.error = None
+        job.finished_at = _now()
+        job.locked_by = job.locked_until = None
+        outcome = "succeeded"
+    db.commit()
+    METRICS.inc("jobs_total", {"type": job.type, "outcome": outcome})
+    return job
+
+
+def job_to_dict(job: Job):
+    return {
+        "id": job.id,
+        "type": job.type,
+        "status": job.status,
+        "payload": job.payload,
+        "dedupe_key": job.dedupe_key,
+        "owner_id": job.owner_id,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "run_at": job.run_at,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "result": job.result,
+        "error": job.error,
+    }
+
+
+@job_type("tcg_sync", concurrency=1, max_attempts=5, backoff_seconds=60)
+def tcg_sync(db: Session, payload: dict):
+    """
+        Refreshes the local Trainer and Energy tables from the TCG API.
+    """
+
+    from tcg_routes import cache_tcg_data
+
+    return cache_tcg_data(db)
+
+
+@job_type("pokemon_backfill", concurrency=2, public=True, payload_schema=PokemonBackfillPayload)
+def pokemon_backfill(db: Session, payload: dict):
+    """
+        Stores the given Pokémon ("ids") that are not in the 'pokemon' table
+        yet, with their move and ability links, then publishes the new
+        catalogue to every process.
+    """
+
+    from move_data import link_pokemon
+    from pokemon_catalogue import refresh_catalogue
+    from pokemon_provider import fetch_pokemon_data, pokemon_columns
+
+    wanted = sorted(set(int(pokemon_id) for pokemon_id in payload.get("ids", [])))
+    stored = set(db.execute(select(Pokemon.id).where(Pokemon.id.in_(wanted))).scalars())
+    added, missing = [], []
+    for pokemon_id in wanted:
+        if pokemon_id in stored:
+            continue
+        data = fetch_pokemon_data(pokemon_id)
+        if data is None:
+            missing.append(pokemon_id)
+            continue
+        db.add(Pokemon(**pokemon_columns(data)))
+        db.flush()
+        link_pokemon(db, pokemon_id, fetch=False)
+        db.commit()
+        added.append(pokemon_id)
+    if added:
+        # The worker's own flush only marks its snapshot stale.
+        refresh_catalogue(db)
+    if missing and not added:
+        raise RuntimeError(f"Could not fetch Pokémon {missing}")
+    return {"added": added, "missing": missing}
+
+
+@job_type("image_probe", concurrency=1)
+def image_probe(db: Session, payload: dict):
+    """
+        Checks PokémonDB artwork for stored Pokémon and records the answer
+        in Pokemon.has_image, so recommendations need no probe per request.
+        Only unchecked Pokémon are probed unless payload["recheck"] is set;
+        payload["limit"] caps the number of probes (default 500).
+    """
+
+    import http_client
+    from recommendations import probe_image
+
+    query = select(Pokemon).order_by(Pokemon.id).limit(int(payload.get("limit", 500)))
+    if not payload.get("recheck"):
+        query = query.where(Pokemon.has_image.is_(None))
+    checked = missing = 0
+    for pokemon in db.execute(query).scalars().all():
+        if not http_client.is_available("pokemondb"):
+            db.commit()
+            raise RuntimeError("PokémonDB is unavailable")
+        found = probe_image(pokemon.name.capitalize())
+        if found is None:
+            continue
+        pokemon.has_image = found
+        checked += 1
+        missing += not found
+    db.commit()
+    return {"checked": checked, "missing": missing}
+
+
+@job_type("deck_summary_rebuild", concurrency=1)
+def deck_summary_rebuild(db: Session, payload: dict):
+    """
+        Recomputes deck summaries (all, or payload["deck_ids"]).
+    """
+
+    from deck_summary import rebuild_summaries
+
+    return {"rebuilt": rebuild_summaries(db, payload.get("deck_ids"))}
+
+
+@job_type("move_details", concurrency=1)
+def move_details(db: Session, payload: dict):
+    """
+        Fetches the move or ability details that are still missing
+        (payload["kind"]: "moves" or "abilities").
+    """
+
+    from move_data import fetch_missing_details
+
+    kind = payload.get("kind", "moves")
+    return {"filled": fetch_missing_details(db, kind, int(payload.get("limit", 1000)))}
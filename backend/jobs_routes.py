@@ -0,0 +1,102 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from models import User, Job
+from schemas import JobCreate
+from deck_routes import get_current_user, get_db
+import jobs
+
+"""
+    This module exposes the background job queue (jobs.py) over HTTP. Jobs
+    are run by worker.py, never by the web process.
+
+    Users may only enqueue the job types registered as public, and only see
+    their own jobs (plus, by id, the system jobs other endpoints return,
+    such as POST /tcg/external/cache?background=true). Their dedupe keys are
+    scoped to them, so they cannot hold back other users' jobs.
+
+    Current endpoints:
+      - POST /jobs
+      - GET /jobs
+      - GET /jobs/{job_id}
+"""
+
+
+router = APIRouter()
+
+
+@router.post("", status_code=202, openapi_extra={"security": [{"BearerAuth": []}]})
+def create_job(request: JobCreate, user: User = Depends(get_current_user),
+               db: Session = Depends(get_db)):
+    """
+        Enqueues a background job.
+        Args:
+            request (JobCreate): Job type, payload and optional dedupe key.
+            user (User): The current authenticated user.
+            db (Session): The database session.
+        Returns:
+            dict: The job (an existing one if the dedupe key is active).
+        Raises:
+            HTTPException: 400 if the job type is unknown or the payload
+            does not fit its schema, 403 if users may not enqueue it.
+    """
+
+    spec = jobs.JOB_TYPES.get(request.type)
+    if spec is None:
+        raise HTTPException(status_code=400, detail=f"Unknown job type: {request.type}")
+    if not spec.public:
+        raise HTTPException(status_code=403, detail=f"Job type not allowed: {request.type}")
+    payload = request.payload
+    if spec.payload_schema is not None:
+        try:
+            payload = spec.payload_schema.model_validate(payload).model_dump()
+        except ValidationError as exc:
+            raise HTTPException(status_code=400, detail=jsonable_encoder(
+                exc.errors(include_url=False, include_context=False)))
+    dedupe_key = f"user:{user.id}:{request.dedupe_key}" if request.dedupe_key else None
+    job = jobs.enqueue(db, request.type, payload, dedupe_key,
+                       request.delay_seconds, owner_id=user.id)
+    return jobs.job_to_dict(job)
+
+
+@router.get("", openapi_extra={"security": [{"BearerAuth": []}]})
+def list_jobs(status: Optional[str] = None, type: Optional[str] = None,
+              limit: int = Query(50, ge=1, le=500),
+              user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """
+        Lists the user's most recent jobs, optionally filtered by status and
+        type.
+        Returns:
+            dict: "jobs" (newest first) and "types" (the job types users may
+            enqueue, with their concurrency limits).
+    """
+
+    query = select(Job).where(Job.owner_id == user.id).order_by(Job.id.desc()).limit(limit)
+    if status:
+        query = query.where(Job.status == status)
+    if type:
+        query = query.where(Job.type == type)
+    return {
+        "jobs": [jobs.job_to_dict(job) for job in db.execute(query).scalars()],
+        "types": {name: {"concurrency": spec.concurrency, "max_attempts": spec.max_attempts}
+                  for name, spec in jobs.JOB_TYPES.items() if spec.public},
+    }
+
+
+@router.get("/{job_id}", openapi_extra={"security": [{"BearerAuth": []}]})
+def get_job(job_id: int, user: User = Depends(get_current_user),
+            db: Session = Depends(get_db)):
+    """
+        Returns one job's status, attempts, result and last error.
+        Raises:
+            HTTPException: 404 if the job does not exist or belongs to
+            another user.
+    """
+
+    job = db.get(Job, job_id)
+    if job is None or job.owner_id not in (None, user.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.job_to_dict(job)
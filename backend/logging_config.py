@@ -0,0 +1,151 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+"""
+    This module configures logging for the whole backend.
+
+    Modules log through the standard library ('logger = logging.getLogger(__name__)').
+    configure_logging() then installs:
+      - a QueueHandler on the root logger, so request threads only put the
+        record on an in-memory queue and never block on stdout/stderr,
+      - a QueueListener thread that formats and writes records (JSON lines
+        by default, or plain text with LOG_FORMAT=text),
+      - a SamplingFilter, so high-volume events can be logged at a fraction,
+        e.g. logger.debug("...", extra={"sample_rate": 0.01}),
+      - payload truncation: long messages and fields are cut to LOG_MAX_CHARS.
+
+    Settings (environment variables):
+        LOG_LEVEL      DEBUG, INFO (default), WARNING, ...
+        LOG_FORMAT     json (default) or text
+        LOG_MAX_CHARS  maximum characters per message or field (default 2000)
+"""
+
+
+LOG_MAX_CHARS = int(os.getenv("LOG_MAX_CHARS", "2000"))
+
+_RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "sample_rate"}
+
+_listener = None
+_queue_handler = None
+
+
+def truncate(value, limit: int = None) -> str:
+    """
+        Shortens a value's string form for logging.
+        Args:
+            value: Anything; it is converted with str().
+            limit (int, optional): Maximum characters. Defaults to LOG_MAX_CHARS.
+        Returns:
+            str: The text, cut with a note of how much was dropped.
+    """
+
+    limit = LOG_MAX_CHARS if limit is None else limit
+    text = str(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more chars]"
+
+
+class SamplingFilter(logging.Filter):
+    """
+        Drops a share of records that carry a 'sample_rate' below 1.0.
+        Records without one are always kept, as are warnings and errors.
+    """
+
+    def __init__(self, rng=None):
+        super().__init__()
+        self._random = rng or random.Random()
+
+    def filter(self, record):
+        rate = getattr(record, "sample_rate", 1.0)
+        if rate >= 1.0 or record.levelno >= logging.WARNING:
+            return True
+        return self._random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """
+        Formats a record as one JSON object per line. Any 'extra' fields
+        passed to the logging call are included as top-level keys.
+    """
+
+    def format(self, record):
+        doc = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": truncate(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                doc[key] = value if isinstance(value, (int, float, bool)) else truncate(value)
+        if record.exc_info:
+            doc["exc"] = self.formatException(record.exc_info)
+        return json.dumps(doc, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """
+        Plain text format with truncated messages, for local development.
+    """
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-5s [%(name)s] %(message)s")
+
+    def formatMessage(self, record):
+        record.message = truncate(record.message)
+        return super().formatMessage(record)
+
+
+def configure_logging(level: str = None, fmt: str = None, stream=None):
+    """
+        Installs the queue-based handler on the root logger. Calling it more
+        than once has no further effect.
+        Args:
+            level (str, optional): Log level; defaults to LOG_LEVEL or INFO.
+            fmt (str, optional): "json" or "text"; defaults to LOG_FORMAT or json.
+            stream (optional): Output stream; defaults to stderr.
+    """
+
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(TextFormatter() if fmt == "text" else JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    _queue_handler = queue_handler
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """
+        Flushes queued records and stops the listener thread.
+    """
+
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = None
+        _queue_handler = None
@@ -1,14 +1,55 @@
+import logging
 import sys
+from contextlib import asynccontextmanager
+from database import load_environment, on_engine_created, dispose_engine, ReadYourWritesMiddleware
+from logging_config import configure_logging
+
+load_environment()
+configure_logging()
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.utils import get_openapi
-from database import Base, engine
 from auth import router as auth_router
 from deck_routes import router as deck_router
 from tcg_routes import router as tcg_router
 from pokemon_routes import router as pokemon_router
+from export_routes import router as export_router
+from jobs_routes import router as jobs_router
+from image_routes import router as image_router
+from profiling import (ProfilingMiddleware, instrument_engine, sampling_profiler,
+                       PROFILER_SAMPLING, router as metrics_router)
+from warmup import warmup, WARMUP_ENABLED, router as ready_router
+from what_if import start_pool as start_what_if_pool, shutdown_pool as shutdown_what_if_pool
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+        Starts the background cache warm-up (see GET /ready), the what-if
+        and simulation worker processes and optional helpers when the
+        server starts, and releases them and pooled database connections
+        when it stops. The schema is not touched here: run 'alembic upgrade
+        head' once per deploy, before the workers start, so workers never
+        race each other on DDL.
+    """
 
-app = FastAPI()
+    if PROFILER_SAMPLING:
+        sampling_profiler.start()
+    if WARMUP_ENABLED:
+        warmup.start()
+    start_what_if_pool()
+    yield
+    warmup.stop()
+    shutdown_what_if_pool()
+    if PROFILER_SAMPLING:
+        sampling_profiler.stop()
+    dispose_engine()
+
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000"
@@ -22,10 +63,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+on_engine_created(instrument_engine)
+
 app.include_router(auth_router, prefix="/auth", tags=["Authentication"])
 app.include_router(deck_router, prefix="/deck", tags=["Deck Management"])
 app.include_router(tcg_router, prefix="/tcg", tags=["TCG"])
 app.include_router(pokemon_router, tags=["Pokemon"])
+app.include_router(export_router, prefix="/export", tags=["Export"])
+app.include_router(jobs_router, prefix="/jobs", tags=["Jobs"])
+app.include_router(image_router, prefix="/images", tags=["Images"])
+app.include_router(metrics_router, prefix="/metrics", tags=["Metrics"])
+app.include_router(ready_router, prefix="/ready", tags=["Metrics"])
 
 
 def custom_openapi():
@@ -61,14 +111,6 @@ def custom_openapi():
 app.openapi = custom_openapi
 
 
-def setup_database():
-    Base.metadata.create_all(bind=engine)
-    print("Tables created successfully!")
-
-
-setup_database()
-
-
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Pokémon Deck Builder!"}
@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, JSON
+from sqlalchemy import (Column, Integer, String, Float, Boolean, DateTime, ForeignKey,
+                        JSON, Index, Text, event, func, text)
 from sqlalchemy.orm import relationship
 from database import Base
+import type_matchups
 
 
 class User(Base):
@@ -21,9 +23,19 @@ class Pokemon(Base):
     """
         Represents a Pokémon with detailed attributes including name, image URL,
         types, strengths, weaknesses, moves, abilities, and stats.
+
+        types_mask, strengths_mask and weaknesses_mask hold the same type
+        lists as 18-bit masks (see type_matchups.TYPE_BITS). They are set
+        from the JSON columns whenever a row is written, so type filters run
+        as integer operations in SQL (see type_filters.py).
     """
 
     __tablename__ = "pokemon"
+    __table_args__ = (
+        # Covering index: type filters scan these integers instead of the rows.
+        Index("ix_pokemon_type_masks", "types_mask", "strengths_mask",
+              "weaknesses_mask", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False)
     image_url = Column(String)
@@ -38,6 +50,84 @@ class Pokemon(Base):
     special_attack = Column(Integer, default=0)
     special_defense = Column(Integer, default=0)
     speed = Column(Integer, default=0)
+    types_mask = Column(Integer, nullable=False, default=0, server_default="0")
+    strengths_mask = Column(Integer, nullable=False, default=0, server_default="0")
+    weaknesses_mask = Column(Integer, nullable=False, default=0, server_default="0")
+    # Whether PokémonDB has artwork for this name; None until the
+    # 'image_probe' job (jobs.py) has checked it.
+    has_image = Column(Boolean, nullable=True)
+
+    def set_type_masks(self):
+        """
+            Recomputes the mask columns from types, strengths and weaknesses.
+            Missing strengths/weaknesses are derived from the types.
+        """
+
+        self.types_mask, self.strengths_mask, self.weaknesses_mask = (
+            type_matchups.type_profile_masks(self.types, self.strengths, self.weaknesses))
+
+
+@event.listens_for(Pokemon, "before_insert")
+@event.listens_for(Pokemon, "before_update")
+def _set_pokemon_type_masks(mapper, connection, target):
+    target.set_type_masks()
+
+
+class Move(Base):
+    """
+        A move from PokéAPI. Rows are created as soon as a Pokémon's move list
+        references them (id and name only) and get their details from the
+        bulk importer in move_data.py (has_details says which is which).
+    """
+
+    __tablename__ = "moves"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    type = Column(String, nullable=True)
+    power = Column(Integer, nullable=True)
+    accuracy = Column(Integer, nullable=True)
+    pp = Column(Integer, nullable=True)
+    damage_class = Column(String, nullable=True)
+    effect = Column(String, nullable=True)
+    has_details = Column(Boolean, nullable=False, default=False, server_default="0")
+
+
+class Ability(Base):
+    """
+        An ability from PokéAPI, filled in the same way as Move.
+    """
+
+    __tablename__ = "abilities"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    effect = Column(String, nullable=True)
+    has_details = Column(Boolean, nullable=False, default=False, server_default="0")
+
+
+class PokemonMove(Base):
+    """
+        Association table listing every move a Pokémon can learn.
+    """
+
+    __tablename__ = "pokemon_moves"
+
+    pokemon_id = Column(Integer, ForeignKey("pokemon.id", ondelete="CASCADE"), primary_key=True)
+    move_id = Column(Integer, ForeignKey("moves.id"), primary_key=True)
+
+
+class PokemonAbility(Base):
+    """
+        Association table linking a Pokémon to its abilities.
+    """
+
+    __tablename__ = "pokemon_abilities"
+
+    pokemon_id = Column(Integer, ForeignKey("pokemon.id", ondelete="CASCADE"), primary_key=True)
+    ability_id = Column(Integer, ForeignKey("abilities.id"), primary_key=True)
+    is_hidden = Column(Boolean, nullable=False, default=False)
+    slot = Column(Integer, nullable=True)
 
 
 class Deck(Base):
@@ -58,6 +148,33 @@ class Deck(Base):
                                 cascade="all, delete")
     deck_energy = relationship("DeckEnergy", back_populates="deck",
                                cascade="all, delete")
+    summary = relationship("DeckSummary", back_populates="deck", uselist=False,
+                           cascade="all, delete")
+
+
+class DeckSummary(Base):
+    """
+        Materialised header of a deck: card counts, score and aggregated type
+        strengths/weaknesses. Kept up to date in the same transaction as every
+        deck change (see deck_summary.py).
+    """
+
+    __tablename__ = "deck_summary"
+
+    deck_id = Column(Integer, ForeignKey("decks.id", ondelete="CASCADE"), primary_key=True)
+    pokemon_count = Column(Integer, nullable=False, default=0)
+    trainer_count = Column(Integer, nullable=False, default=0)
+    energy_count = Column(Integer, nullable=False, default=0)
+    score = Column(Integer, nullable=False, default=0)
+    coverage = Column(Float, nullable=False, default=0.0)
+    weakness = Column(Float, nullable=False, default=0.0)
+    stats = Column(Float, nullable=False, default=0.0)
+    energy = Column(Float, nullable=False, default=0.0)
+    strengths = Column(JSON)
+    weaknesses = Column(JSON)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
+
+    deck = relationship("Deck", back_populates="summary")
 
 
 class DeckPokemon(Base):
@@ -143,3 +260,43 @@ class DeckEnergy(Base):
     deck = relationship("Deck", back_populates="deck_energy")
 
     energy = relationship("Energy", back_populates="deck_energy")
+
+
+class Job(Base):
+    """
+        A unit of background work (see jobs.py and worker.py).
+
+        status moves from "queued" to "running" and ends as "succeeded" or
+        "failed"; a failed attempt goes back to "queued" with a later run_at
+        until max_attempts is reached. While a job is queued or running no
+        other job with the same dedupe_key can be enqueued (partial unique
+        index). A running job whose locked_until has passed belonged to a
+        worker that died and is queued again.
+    """
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_claim", "status", "run_at", "id"),
+        Index("uq_jobs_active_dedupe_key", "dedupe_key", unique=True,
+              sqlite_where=text("status IN ('queued', 'running')"),
+              postgresql_where=text("status IN ('queued', 'running')")),
+    )
+
+    id = Column(Integer, primary_key=True)
+    type = Column(String(64), nullable=False, index=True)
+    payload = Column(JSON)
+    status = Column(String(16), nullable=False, default="queued")
+    dedupe_key = Column(String(255), nullable=True)
+    # The user who enqueued it through POST /jobs; None for system jobs.
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True,
+                      index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_at = Column(DateTime, nullable=False, server_default=func.now())
+    created_at = Column(DateTime, nullable=False, server_default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    locked_by = Column(String(255), nullable=True)
+    locked_until = Column(DateTime, nullable=True)
+    result = Column(JSON)
+    error = Column(Text)
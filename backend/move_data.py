@@ -0,0 +1,292 @@
+import argparse
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, insert, update, bindparam
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+import http_client
+import utils
+from pokemon_provider import fetch_pokemon_refs
+from database import insert_ignore
+from models import Move, Ability, PokemonMove, PokemonAbility
+
+"""
+    This module stores the full move and ability lists of Pokémon.
+
+    PokéAPI's /pokemon/ document already names every move and ability, so
+    the Pokémon provider (pokemon_provider.py) keeps those references and link_pokemon() turns them
+    into 'pokemon_moves' / 'pokemon_abilities' rows, creating bare 'moves' /
+    'abilities' rows (id and name) as needed. This never costs an extra
+    upstream call per move.
+
+    The details (type, power, accuracy, PP, effect text) come in bulk:
+      - import_details() loads NDJSON files of PokéAPI /move/ or /ability/
+        documents (or rows with the table's column names),
+      - fetch_missing_details() fetches the documents of the rows that still
+        lack details, with a bounded thread pool, as an offline job.
+    Request handlers only read the database: get_pokemon_moves() returns the
+    moves and abilities of many Pokémon with one query per table.
+
+    Usage (from the 'backend' folder):
+        python move_data.py import moves moves.ndjson
+        python move_data.py fetch abilities --limit 500 --concurrency 4
+"""
+
+
+logger = logging.getLogger(__name__)
+
+MODELS = {"moves": Move, "abilities": Ability}
+DETAIL_FIELDS = {
+    "moves": ("type", "power", "accuracy", "pp", "damage_class", "effect"),
+    "abilities": ("effect",),
+}
+
+
+def _english_effect(doc: dict):
+    for entry in doc.get("effect_entries") or ():
+        if entry.get("language", {}).get("name") == "en":
+            effect = entry.get("short_effect") or entry.get("effect")
+            if effect and doc.get("effect_chance") is not None:
+                effect = effect.replace("$effect_chance", str(doc["effect_chance"]))
+            return effect
+    return None
+
+
+def normalize_detail(kind: str, doc: dict):
+    """
+        Converts a PokéAPI /move/ or /ability/ document (or an already flat
+        row) into a row for the 'moves' or 'abilities' table.
+        Args:
+            kind (str): "moves" or "abilities".
+            doc (dict): The document or row.
+        Returns:
+            dict: id, name, the detail columns and has_details=True.
+    """
+
+    if "effect_entries" not in doc:
+        row = {field: doc.get(field) for field in ("id", "name", *DETAIL_FIELDS[kind])}
+    elif kind == "moves":
+        row = {
+            "id": doc["id"],
+            "name": doc["name"],
+            "type": (doc.get("type") or {}).get("name", "").capitalize() or None,
+            "power": doc.get("power"),
+            "accuracy": doc.get("accuracy"),
+            "pp": doc.get("pp"),
+            "damage_class": (doc.get("damage_class") or {}).get("name"),
+            "effect": _english_effect(doc),
+        }
+    else:
+        row = {"id": doc["id"], "name": doc["name"], "effect": _english_effect(doc)}
+    row["has_details"] = True
+    return row
+
+
+def _ensure_rows(db: Session, model, pairs):
+    """
+        Creates the missing bare rows of (id, name) pairs and returns the ids
+        that are stored afterwards.
+    """
+
+    ids = [resource_id for resource_id, _ in pairs]
+    insert_ignore(db, model, [{"id": resource_id, "name": name} for resource_id, name in pairs])
+    return set(db.execute(select(model.id).where(model.id.in_(ids))).scalars())
+
+
+def link_pokemon(db: Session, pokemon_id: int, fetch: bool = True) -> bool:
+    """
+        Stores a Pokémon's move and ability links unless they are already
+        stored. The rows are written in a savepoint, so a failure here never
+        rolls back the caller's transaction. The caller commits.
+        Args:
+            db (Session): The database session.
+            pokemon_id (int): A Pokémon that exists in the 'pokemon' table.
+            fetch (bool): Whether PokéAPI may be called if the references are
+                no longer cached (False on write paths that just fetched it).
+        Returns:
+            bool: True if the links are stored, False if the references are
+            unavailable or could not be written.
+    """
+
+    if db.execute(select(PokemonAbility.pokemon_id)
+                  .where(PokemonAbility.pokemon_id == pokemon_id).limit(1)).first():
+        return True
+    refs = fetch_pokemon_refs(pokemon_id, fetch=fetch)
+    if refs is None:
+        return False
+
+    moves = list(dict(refs["moves"]).items())
+    abilities = {ref[0]: ref for ref in refs["abilities"]}
+    try:
+        with db.begin_nested():
+            if moves:
+                stored = _ensure_rows(db, Move, moves)
+                insert_ignore(db, PokemonMove, [{"pokemon_id": pokemon_id, "move_id": move_id}
+                                                 for move_id, _ in moves if move_id in stored])
+            if abilities:
+                stored = _ensure_rows(db, Ability, [(ref[0], ref[1]) for ref in abilities.values()])
+                insert_ignore(db, PokemonAbility, [
+                    {"pokemon_id": pokemon_id, "ability_id": ability_id,
+                     "is_hidden": is_hidden, "slot": slot}
+                    for ability_id, _, is_hidden, slot in abilities.values()
+                    if ability_id in stored])
+    except SQLAlchemyError:
+        logger.warning("Could not store the moves of Pokémon %s", pokemon_id, exc_info=True)
+        return False
+    return True
+
+
+def move_to_dict(move):
+    return {"id": move.id, "name": move.name, "type": move.type, "power": move.power,
+            "accuracy": move.accuracy, "pp": move.pp, "damage_class": move.damage_class,
+            "effect": move.effect}
+
+
+def get_pokemon_moves(db: Session, pokemon_ids):
+    """
+        Returns the stored moves and abilities of many Pokémon at once.
+        Args:
+            db (Session): The database session.
+            pokemon_ids (list): Pokémon ids.
+        Returns:
+            dict: pokemon_id -> {"moves": [...], "abilities": [...]}, for the
+            Pokémon whose links are stored. Moves are sorted by name;
+            details are None until imported.
+    """
+
+    result = {}
+    ability_rows = db.execute(
+        select(PokemonAbility.pokemon_id, PokemonAbility.is_hidden, PokemonAbility.slot, Ability)
+        .join(Ability, Ability.id == PokemonAbility.ability_id)
+        .where(PokemonAbility.pokemon_id.in_(pokemon_ids))
+        .order_by(PokemonAbility.pokemon_id, PokemonAbility.slot))
+    for pokemon_id, is_hidden, slot, ability in ability_rows:
+        entry = result.setdefault(pokemon_id, {"moves": [], "abilities": []})
+        entry["abilities"].append({"id": ability.id, "name": ability.name,
+                                   "effect": ability.effect, "is_hidden": is_hidden,
+                                   "slot": slot})
+
+    move_rows = db.execute(
+        select(PokemonMove.pokemon_id, Move)
+        .join(Move, Move.id == PokemonMove.move_id)
+        .where(PokemonMove.pokemon_id.in_(pokemon_ids))
+        .order_by(PokemonMove.pokemon_id, Move.name))
+    for pokemon_id, move in move_rows:
+        entry = result.setdefault(pokemon_id, {"moves": [], "abilities": []})
+        entry["moves"].append(move_to_dict(move))
+    return result
+
+
+def import_details(db: Session, kind: str, docs, batch_size: int = 500):
+    """
+        Inserts or updates move/ability details in batches, one commit per
+        batch.
+        Args:
+            db (Session): The database session.
+            kind (str): "moves" or "abilities".
+            docs (iterable): PokéAPI documents or flat rows.
+            batch_size (int): Rows per batch.
+        Returns:
+            int: The number of rows written.
+    """
+
+    model = MODELS[kind]
+    columns = ("name", *DETAIL_FIELDS[kind], "has_details")
+    table = model.__table__
+    statement = (update(table).where(table.c.id == bindparam("row_id"))
+                 .values({column: bindparam(f"new_{column}") for column in columns}))
+
+    def flush(batch):
+        existing = set(db.execute(select(model.id).where(
+            model.id.in_([row["id"] for row in batch]))).scalars())
+        new = [row for row in batch if row["id"] not in existing]
+        updates = [{"row_id": row["id"], **{f"new_{c}": row[c] for c in columns}}
+                   for row in batch if row["id"] in existing]
+        if new:
+            db.execute(insert(model), new)
+        if updates:
+            db.execute(statement, updates)
+        db.commit()
+
+    count = 0
+    batch = {}
+    for doc in docs:
+        row = normalize_detail(kind, doc)
+        batch[row["id"]] = row
+        if len(batch) >= batch_size:
+            flush(list(batch.values()))
+            count += len(batch)
+            batch = {}
+    if batch:
+        flush(list(batch.values()))
+        count += len(batch)
+    return count
+
+
+def _fetch_detail(kind: str, resource_id: int):
+    path = "move" if kind == "moves" else "ability"
+    response = http_client.get(f"{utils.POKEAPI_BASE_URL}/{path}/{resource_id}/",
+                               timeout=10, upstream="pokeapi")
+    if response.status_code != 200:
+        logger.info("PokéAPI returned %s for %s %s", response.status_code, path, resource_id)
+        return None
+    return response.json()
+
+
+def fetch_missing_details(db: Session, kind: str, limit: int = 1000,
+                          concurrency: int = 4):
+    """
+        Fetches the PokéAPI documents of rows that have no details yet and
+        imports them. Meant for an offline job, never for a request.
+        Args:
+            db (Session): The database session.
+            kind (str): "moves" or "abilities".
+            limit (int): Maximum number of rows to fetch.
+            concurrency (int): Parallel requests.
+        Returns:
+            int: The number of rows filled in.
+    """
+
+    model = MODELS[kind]
+    ids = db.execute(select(model.id).where(model.has_details.is_(False))
+                     .order_by(model.id).limit(limit)).scalars().all()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        docs = [doc for doc in pool.map(lambda i: _fetch_detail(kind, i), ids) if doc]
+    return import_details(db, kind, docs)
+
+
+def main(argv=None):
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Load move and ability details.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    load = sub.add_parser("import", help="Import PokéAPI documents from NDJSON.")
+    load.add_argument("kind", choices=sorted(MODELS))
+    load.add_argument("input", help="NDJSON file, or '-' for stdin.")
+    fetch = sub.add_parser("fetch", help="Fetch details that are still missing.")
+    fetch.add_argument("kind", choices=sorted(MODELS))
+    fetch.add_argument("--limit", type=int, default=1000)
+    fetch.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.command == "import":
+            source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+            try:
+                docs = (json.loads(line) for line in source if line.strip())
+                count = import_details(db, args.kind, docs)
+            finally:
+                if source is not sys.stdin:
+                    source.close()
+        else:
+            count = fetch_missing_details(db, args.kind, args.limit, args.concurrency)
+    finally:
+        db.close()
+    print(f"Wrote {count} {args.kind}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,391 @@
+import argparse
+import io
+import json
+import sys
+from sqlalchemy import select, insert, text
+from database import SessionLocal, get_engine
+from deck_summary import refresh_deck_summary, rebuild_summaries
+from type_matchups import type_profile_masks
+from models import (User, Pokemon, Trainer, Energy, Deck,
+                    DeckPokemon, DeckTrainer, DeckEnergy)
+
+"""
+    This module moves whole tables in and out of the database as NDJSON
+    (one JSON object per line). Exports are generators that read rows through
+    a server-side cursor (``yield_per``), so memory stays flat no matter how big
+    the table is. Imports stream the file straight into PostgreSQL with COPY,
+    and fall back to batched INSERTs on other databases (e.g. SQLite in tests).
+
+    Usage:
+        python ndjson_io.py export trainers > trainers.ndjson
+        python ndjson_io.py import trainers trainers.ndjson
+        python ndjson_io.py import-deck ash@example.com deck.ndjson
+"""
+
+
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 1000
+
+EXPORTABLE_TABLES = {
+    "users": User,
+    "pokemon": Pokemon,
+    "trainers": Trainer,
+    "energy": Energy,
+    "decks": Deck,
+    "deck_pokemon": DeckPokemon,
+    "deck_trainers": DeckTrainer,
+    "deck_energy": DeckEnergy,
+}
+
+
+def get_table(table_name: str):
+    """
+        Looks up an exportable table by name.
+        Args:
+            table_name (str): The table name, e.g. "trainers".
+        Returns:
+            Table: The SQLAlchemy Table object.
+        Raises:
+            ValueError: If the table is not exportable.
+    """
+
+    model = EXPORTABLE_TABLES.get(table_name)
+    if model is None:
+        raise ValueError(f"Unknown table '{table_name}'. "
+                         f"Choose from: {', '.join(EXPORTABLE_TABLES)}")
+    return model.__table__
+
+
+def iter_table_rows(db, table, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+        Yields every row of a table as a dict, reading it in batches through a
+        server-side cursor so the full result set is never held in memory.
+        Args:
+            db (Session): The database session.
+            table (Table): The table to read.
+            batch_size (int): Rows fetched per round trip.
+        Yields:
+            dict: One row, keyed by column name.
+    """
+
+    stmt = (select(table).order_by(*table.primary_key.columns)
+            .execution_options(yield_per=batch_size))
+    for row in db.execute(stmt).mappings():
+        yield dict(row)
+
+
+def iter_ndjson(rows):
+    """
+        Encodes dict rows as NDJSON lines.
+        Args:
+            rows (iterable): Dicts to encode.
+        Yields:
+            str: One JSON document followed by a newline.
+    """
+
+    for row in rows:
+        yield json.dumps(row, default=str, ensure_ascii=False) + "\n"
+
+
+def stream_table_ndjson(table_name: str, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+        Streams a whole table as NDJSON. The generator owns its own session,
+        so it can outlive the request handler that created it.
+        Args:
+            table_name (str): The table to export.
+            batch_size (int): Rows fetched per round trip.
+        Yields:
+            str: NDJSON lines.
+    """
+
+    table = get_table(table_name)
+    db = SessionLocal()
+    try:
+        yield from iter_ndjson(iter_table_rows(db, table, batch_size))
+    finally:
+        db.close()
+
+
+def read_ndjson(lines):
+    """
+        Parses NDJSON lines, skipping blank ones.
+        Args:
+            lines (iterable): Lines of text.
+        Yields:
+            dict: One decoded row per line.
+    """
+
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+class _CsvStream(io.RawIOBase):
+    """
+        A read-only file-like object that converts dict rows to CSV on demand.
+        psycopg2's copy_expert() pulls from it, so rows are encoded as COPY
+        consumes them instead of being buffered up front.
+    """
+
+    def __init__(self, rows, columns, json_columns):
+        self._rows = iter(rows)
+        self._columns = columns
+        self._json_columns = json_columns
+        self._buffer = bytearray()
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def _encode(self, row):
+        # COPY's CSV format reads an unquoted empty field as NULL and a quoted
+        # one as a value, so every value is quoted and None is left empty.
+        fields = []
+        for column in self._columns:
+            value = row.get(column)
+            if value is None:
+                fields.append("")
+                continue
+            if column in self._json_columns:
+                value = json.dumps(value)
+            fields.append('"' + str(value).replace('"', '""') + '"')
+        return (",".join(fields) + "\n").encode("utf-8")
+
+    def readinto(self, buffer):
+        while len(self._buffer) < len(buffer):
+            row = next(self._rows, None)
+            if row is None:
+                break
+            self._buffer += self._encode(row)
+            self.count += 1
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        del self._buffer[:size]
+        return size
+
+
+def _json_columns(table):
+    return {c.name for c in table.columns if c.type.__class__.__name__ == "JSON"}
+
+
+def copy_rows_postgres(connection, table, rows):
+    """
+        Bulk loads rows into a PostgreSQL table with COPY FROM STDIN and
+        moves the id sequence past the highest imported id.
+        Args:
+            connection (Connection): A SQLAlchemy connection to PostgreSQL.
+            table (Table): The target table.
+            rows (iterable): Dict rows to load.
+        Returns:
+            int: The number of rows loaded.
+    """
+
+    columns = [c.name for c in table.columns]
+    stream = _CsvStream(rows, columns, _json_columns(table))
+    sql = (f"COPY {table.name} ({', '.join(columns)}) "
+           "FROM STDIN WITH (FORMAT csv)")
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(sql, io.BufferedReader(stream, 1 << 16))
+    finally:
+        cursor.close()
+    if "id" in columns:
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {table.name}), 1))"
+        ))
+    return stream.count
+
+
+def insert_rows_batched(connection, table, rows, batch_size: int = IMPORT_BATCH_SIZE):
+    """
+        Loads rows with batched multi-row INSERTs. Used for databases that
+        do not support COPY.
+        Args:
+            connection (Connection): A SQLAlchemy connection.
+            table (Table): The target table.
+            rows (iterable): Dict rows to load.
+            batch_size (int): Rows per INSERT batch.
+        Returns:
+            int: The number of rows loaded.
+    """
+
+    columns = {c.name for c in table.columns}
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append({k: v for k, v in row.items() if k in columns})
+        if len(batch) >= batch_size:
+            connection.execute(insert(table), batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        connection.execute(insert(table), batch)
+        count += len(batch)
+    return count
+
+
+def with_type_masks(rows):
+    """
+        Fills in the Pokémon type mask columns, which bulk loads would
+        otherwise skip (the model's listener only runs for ORM writes).
+    """
+
+    for row in rows:
+        masks = type_profile_masks(row.get("types"), row.get("strengths"), row.get("weaknesses"))
+        yield {**row, **dict(zip(("types_mask", "strengths_mask", "weaknesses_mask"), masks))}
+
+
+def import_ndjson(table_name: str, lines, truncate: bool = False):
+    """
+        Imports NDJSON rows into a table inside one transaction.
+        Args:
+            table_name (str): The table to load.
+            lines (iterable): NDJSON lines.
+            truncate (bool): Delete existing rows first.
+        Returns:
+            int: The number of rows loaded.
+    """
+
+    table = get_table(table_name)
+    rows = read_ndjson(lines)
+    if table is Pokemon.__table__:
+        rows = with_type_masks(rows)
+    with get_engine().begin() as connection:
+        if truncate:
+            connection.execute(table.delete())
+        if connection.dialect.name == "postgresql":
+            count = copy_rows_postgres(connection, table, rows)
+        else:
+            count = insert_rows_batched(connection, table, rows)
+    if table_name in ("pokemon", "trainers", "energy"):
+        from pokemon_catalogue import refresh_catalogue
+        refresh_catalogue()
+    return count
+
+
+def import_deck_cards(email: str, lines):
+    """
+        Adds the cards from a deck export (see GET /export/deck) to a user's
+        deck. Card references are resolved against the local catalogue; cards
+        that are missing locally or already in the deck are skipped.
+        Args:
+            email (str): The email of the user who owns the target deck.
+            lines (iterable): NDJSON card reference lines.
+        Returns:
+            int: The number of cards added.
+        Raises:
+            ValueError: If the user does not exist.
+    """
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == email).first()
+        if not user:
+            raise ValueError(f"No user with email '{email}'.")
+        deck = db.query(Deck).filter(Deck.user_id == user.id).first()
+        if not deck:
+            deck = Deck(user_id=user.id)
+            db.add(deck)
+            db.flush()
+
+        cards = list(read_ndjson(lines))
+        pokemon_ids = {c["pokemon_id"] for c in cards if c.get("card_type") == "pokemon"}
+        tcg_ids = {c["tcg_id"] for c in cards if c.get("card_type") in ("trainer", "energy")}
+
+        known_pokemon = {row[0] for row in db.query(Pokemon.id)
+                         .filter(Pokemon.id.in_(pokemon_ids))}
+        trainers = {t.tcg_id: t.id for t in db.query(Trainer.id, Trainer.tcg_id)
+                    .filter(Trainer.tcg_id.in_(tcg_ids))}
+        energies = {e.tcg_id: e.id for e in db.query(Energy.id, Energy.tcg_id)
+                    .filter(Energy.tcg_id.in_(tcg_ids))}
+
+        have_pokemon = {row[0] for row in db.query(DeckPokemon.pokemon_id)
+                        .filter(DeckPokemon.deck_id == deck.id)}
+        have_trainers = {row[0] for row in db.query(DeckTrainer.trainer_id)
+                         .filter(DeckTrainer.deck_id == deck.id)}
+        have_energy = {row[0] for row in db.query(DeckEnergy.energy_id)
+                       .filter(DeckEnergy.deck_id == deck.id)}
+
+        added = 0
+        for card in cards:
+            card_type = card.get("card_type")
+            if card_type == "pokemon":
+                pokemon_id = card["pokemon_id"]
+                if pokemon_id in known_pokemon and pokemon_id not in have_pokemon:
+                    db.add(DeckPokemon(deck_id=deck.id, pokemon_id=pokemon_id))
+                    have_pokemon.add(pokemon_id)
+                    added += 1
+            elif card_type == "trainer":
+                trainer_id = trainers.get(card.get("tcg_id"))
+                if trainer_id and trainer_id not in have_trainers:
+                    db.add(DeckTrainer(deck_id=deck.id, trainer_id=trainer_id))
+                    have_trainers.add(trainer_id)
+                    added += 1
+            elif card_type == "energy":
+                energy_id = energies.get(card.get("tcg_id"))
+                if energy_id and energy_id not in have_energy:
+                    db.add(DeckEnergy(deck_id=deck.id, energy_id=energy_id))
+                    have_energy.add(energy_id)
+                    added += 1
+        refresh_deck_summary(db, deck.id)
+        db.commit()
+        return added
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="NDJSON export/import of tables.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write a table as NDJSON.")
+    export_parser.add_argument("table", choices=sorted(EXPORTABLE_TABLES))
+    export_parser.add_argument("-o", "--output", help="Output file (default: stdout).")
+
+    import_parser = subparsers.add_parser("import", help="Load NDJSON into a table.")
+    import_parser.add_argument("table", choices=sorted(EXPORTABLE_TABLES))
+    import_parser.add_argument("input", help="NDJSON file, or '-' for stdin.")
+    import_parser.add_argument("--truncate", action="store_true",
+                               help="Delete existing rows before loading.")
+
+    deck_parser = subparsers.add_parser("import-deck",
+                                        help="Add a deck export to a user's deck.")
+    deck_parser.add_argument("email", help="Email of the deck owner.")
+    deck_parser.add_argument("input", help="NDJSON file, or '-' for stdin.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            for line in stream_table_ndjson(args.table):
+                out.write(line)
+        finally:
+            if args.output:
+                out.close()
+        return
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    try:
+        if args.command == "import-deck":
+            count = import_deck_cards(args.email, source)
+            print(f"Added {count} cards to {args.email}'s deck.", file=sys.stderr)
+        else:
+            count = import_ndjson(args.table, source, truncate=args.truncate)
+            print(f"Imported {count} rows into {args.table}.", file=sys.stderr)
+            if args.table in ("decks", "deck_pokemon", "deck_trainers", "deck_energy"):
+                db = SessionLocal()
+                try:
+                    rebuilt = rebuild_summaries(db)
+                finally:
+                    db.close()
+                print(f"Rebuilt {rebuilt} deck summaries.", file=sys.stderr)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+if __name__ == "__main__":
+    main()
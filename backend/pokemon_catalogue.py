@@ -0,0 +1,516 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Pokemon, Trainer, Energy
+from profiling import METRICS
+from type_matchups import type_chart
+
+"""
+    This module keeps a read-only, columnar copy of the catalogue - the
+    'pokemon' table, the Trainer and Energy cards and the type chart - for
+    the code that needs all of it at once (the what-if analysis, the deck
+    optimizer, recommendations).
+
+    The Pokémon are one NumPy structured array - one fixed-size record per
+    Pokémon, sorted by id - instead of one ORM object per Pokémon with its
+    JSON lists, instance state and identity-map entry. Names are stored as
+    UTF-8 bytes, the two type slots as small integers and the type profiles
+    as the 18-bit masks of the Pokemon model. An id is found with a binary
+    search over the sorted id column, so no per-record dict is needed.
+
+    The arrays are shared by every worker process through files: a build
+    writes them as .npy files into a new numbered directory under
+    CATALOGUE_DIR (v1, v2, ...) and then atomically replaces the CURRENT
+    file naming the live version. Each process memory-maps the live version
+    read-only, so the operating system keeps one copy in the page cache for
+    all of them, and nothing is built twice: a build whose content equals
+    the live version publishes nothing.
+
+    A catalogue is never modified. get_catalogue() returns the current one,
+    checks CURRENT at most every CATALOGUE_CHECK_SECONDS and maps a newer
+    version when another process published one. It builds and publishes a
+    new version itself when it is stale (this process wrote Pokémon,
+    Trainers or Energy, or the live version is older than
+    CATALOGUE_TTL_SECONDS); concurrent readers keep using the previous
+    object meanwhile.
+
+    Usage (from the 'backend' folder):
+        python -m benchmarks.catalogue_memory
+"""
+
+
+logger = logging.getLogger(__name__)
+
+CATALOGUE_TTL_SECONDS = 300
+CATALOGUE_DIR = os.getenv("CATALOGUE_DIR", os.path.join(os.path.dirname(__file__), ".catalogue"))
+CATALOGUE_CHECK_SECONDS = float(os.getenv("CATALOGUE_CHECK_SECONDS", "1"))
+CATALOGUE_KEEP_VERSIONS = 3
+
+TYPES = list(type_chart)
+STAT_COLUMNS = ("hp", "attack", "defense", "special_attack", "special_defense", "speed")
+
+METRICS.describe("pokemon_catalogue_builds_total", "Pokémon catalogue (re)builds.")
+METRICS.describe("pokemon_catalogue_records", "Pokémon in the in-memory catalogue.")
+METRICS.describe("pokemon_catalogue_version", "Catalogue version mapped by this process.")
+
+# Trainer and Energy columns kept in the catalogue (all stored as bytes).
+CARD_COLUMNS = ("name", "tcg_id", "tcg_image_url", "tcg_set", "tcg_rarity")
+ENERGY_COLUMNS = CARD_COLUMNS + ("energy_type",)
+ARRAYS = ("pokemon", "trainers", "energy", "type_chart")
+
+
+def _record_dtype(name_length: int):
+    return np.dtype([
+        ("id", np.int32),
+        ("name", f"S{max(1, name_length)}"),
+        ("type1", np.int8),
+        ("type2", np.int8),
+        ("types_mask", np.int32),
+        ("strengths_mask", np.int32),
+        ("weaknesses_mask", np.int32),
+        *[(column, np.int16) for column in STAT_COLUMNS],
+        ("stat_total", np.int16),
+    ])
+
+
+def _card_array(rows, columns) -> np.ndarray:
+    values = [tuple((getattr(row, column) or "").encode("utf-8") for column in columns)
+              for row in rows]
+    widths = [max((len(value[i]) for value in values), default=1) for i in range(len(columns))]
+    dtype = np.dtype([("id", np.int32)] + [(column, f"S{max(1, width)}")
+                                           for column, width in zip(columns, widths)])
+    return np.array([(row.id, *value) for row, value in zip(rows, values)], dtype=dtype)
+
+
+def _type_chart_array() -> np.ndarray:
+    """
+        Returns the type chart as a (2, 18, 18) boolean array over TYPES:
+        [0, a, b] means type a is strong against type b, [1, a, b] that type
+        a is weak to type b.
+    """
+
+    chart = np.zeros((2, len(TYPES), len(TYPES)), dtype=bool)
+    for row, name in enumerate(TYPES):
+        for column, other in enumerate(TYPES):
+            chart[0, row, column] = other in type_chart[name]["strong_against"]
+            chart[1, row, column] = other in type_chart[name]["weak_to"]
+    return chart
+
+
+def _type_index(types, slot: int) -> int:
+    if types and len(types) > slot:
+        name = str(types[slot]).capitalize()
+        if name in type_chart:
+            return TYPES.index(name)
+    return -1
+
+
+class PokemonRecord:
+    """
+        A read-only view of one catalogue record.
+    """
+
+    __slots__ = ("_record",)
+
+    def __init__(self, record):
+        self._record = record
+
+    @property
+    def id(self) -> int:
+        return int(self._record["id"])
+
+    @property
+    def name(self) -> str:
+        return self._record["name"].decode("utf-8")
+
+    @property
+    def types(self):
+        return [TYPES[t] for t in (self._record["type1"], self._record["type2"]) if t >= 0]
+
+    @property
+    def stat_total(self) -> int:
+        return int(self._record["stat_total"])
+
+    def __getattr__(self, column):
+        if column in STAT_COLUMNS or column.endswith("_mask"):
+            return int(self._record[column])
+        raise AttributeError(column)
+
+
+class PokemonCatalogue:
+    """
+        An immutable, columnar snapshot of the catalogue.
+
+        Attributes:
+            records (np.ndarray): Structured array, one record per Pokémon,
+                sorted by id.
+            trainers (np.ndarray): Trainer cards (id and CARD_COLUMNS).
+            energy (np.ndarray): Energy cards (id and ENERGY_COLUMNS).
+            type_chart (np.ndarray): See _type_chart_array().
+            version (int): The published version (0 if not published).
+            built_at (float): time.monotonic() of the build or mapping.
+    """
+
+    __slots__ = ("records", "trainers", "energy", "type_chart", "version", "built_at",
+                 "__weakref__")
+
+    def __init__(self, records: np.ndarray, version: int = 0, trainers: np.ndarray = None,
+                 energy: np.ndarray = None, type_chart: np.ndarray = None):
+        self.records = records
+        self.trainers = trainers if trainers is not None else _card_array([], CARD_COLUMNS)
+        self.energy = energy if energy is not None else _card_array([], ENERGY_COLUMNS)
+        self.type_chart = type_chart if type_chart is not None else _type_chart_array()
+        for array in (self.records, self.trainers, self.energy, self.type_chart):
+            array.flags.writeable = False
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def arrays(self):
+        return dict(zip(ARRAYS, (self.records, self.trainers, self.energy, self.type_chart)))
+
+    def digest(self) -> str:
+        """
+            Returns a hash of the catalogue's content (not its version).
+        """
+
+        digest = hashlib.sha256()
+        for name, array in self.arrays().items():
+            digest.update(f"{name}{array.dtype.descr}{array.shape}".encode("utf-8"))
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def cards(self, kind: str):
+        """
+            Returns the Trainer ("trainers") or Energy ("energy") cards as
+            (name, tcg_image_url) pairs.
+        """
+
+        array = self.trainers if kind == "trainers" else self.energy
+        return [(name.decode("utf-8"), url.decode("utf-8") or None)
+                for name, url in zip(array["name"], array["tcg_image_url"])]
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.records["id"]
+
+    def rows(self, pokemon_ids) -> np.ndarray:
+        """
+            Returns the record positions of the given ids (-1 for unknown ids).
+        """
+
+        pokemon_ids = np.asarray(pokemon_ids, dtype=np.int64)
+        ids = self.records["id"]
+        if not len(ids):
+            return np.full(len(pokemon_ids), -1, dtype=np.intp)
+        rows = np.minimum(np.searchsorted(ids, pokemon_ids), len(ids) - 1)
+        return np.where(ids[rows] == pokemon_ids, rows, -1)
+
+    def get(self, pokemon_id: int):
+        """
+            Returns a PokemonRecord, or None if the id is not in the catalogue.
+        """
+
+        row = int(self.rows([pokemon_id])[0])
+        return PokemonRecord(self.records[row]) if row >= 0 else None
+
+    def name(self, row: int) -> str:
+        return self.records["name"][row].decode("utf-8")
+
+    def types(self, row: int):
+        record = self.records[row]
+        return [TYPES[t] for t in (record["type1"], record["type2"]) if t >= 0]
+
+    def type_matrix(self, rows=None) -> np.ndarray:
+        """
+            Returns the types of the given records (all by default) as a
+            boolean matrix over TYPES, the layout deck_analytics scores.
+        """
+
+        masks = self.records["types_mask"] if rows is None else self.records["types_mask"][rows]
+        return ((masks[:, None] >> np.arange(len(TYPES))) & 1).astype(bool)
+
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays().values())
+
+
+def build_catalogue(db, version: int = 0) -> PokemonCatalogue:
+    """
+        Reads the Pokémon, Trainer and Energy tables into a new in-memory
+        catalogue without creating ORM objects.
+        Args:
+            db (Session): The database session.
+            version (int): Version number to give the catalogue.
+        Returns:
+            PokemonCatalogue: The snapshot.
+    """
+
+    query = select(Pokemon.id, Pokemon.name, Pokemon.types, Pokemon.types_mask,
+                   Pokemon.strengths_mask, Pokemon.weaknesses_mask,
+                   *[getattr(Pokemon, column) for column in STAT_COLUMNS]).order_by(Pokemon.id)
+    rows = db.execute(query).all()
+    names = [row.name.encode("utf-8") for row in rows]
+    values = []
+    for name, row in zip(names, rows):
+        stats = [min(value or 0, 32767) for value in row[6:]]
+        values.append((row.id, name, _type_index(row.types, 0), _type_index(row.types, 1),
+                       row.types_mask, row.strengths_mask, row.weaknesses_mask,
+                       *stats, min(sum(stats), 32767)))
+    records = np.array(values, dtype=_record_dtype(max(map(len, names), default=1)))
+    trainers = db.execute(select(Trainer.id, *[getattr(Trainer, column) for column in CARD_COLUMNS])
+                          .order_by(Trainer.id)).all()
+    energy = db.execute(select(Energy.id, *[getattr(Energy, column) for column in ENERGY_COLUMNS])
+                        .order_by(Energy.id)).all()
+    return PokemonCatalogue(records, version, _card_array(trainers, CARD_COLUMNS),
+                            _card_array(energy, ENERGY_COLUMNS), _type_chart_array())
+
+
+def _current_path() -> str:
+    return os.path.join(CATALOGUE_DIR, "CURRENT")
+
+
+def _version_dir(version: int) -> str:
+    return os.path.join(CATALOGUE_DIR, f"v{version}")
+
+
+def read_current_version():
+    """
+        Returns the live published version, or None if there is none.
+    """
+
+    try:
+        with open(_current_path(), encoding="ascii") as f:
+            return int(f.read().strip())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _published_digest(version: int):
+    try:
+        with open(os.path.join(_version_dir(version), "meta.json"), encoding="utf-8") as f:
+            return json.load(f)["digest"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return None
+
+
+def _load_array(path: str) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode="r", allow_pickle=False)
+    except ValueError:
+        # An empty array cannot be memory-mapped.
+        return np.load(path, allow_pickle=False)
+
+
+def load_version(version: int) -> PokemonCatalogue:
+    """
+        Memory-maps a published version (read-only, zero-copy).
+    """
+
+    directory = _version_dir(version)
+    arrays = [_load_array(os.path.join(directory, f"{name}.npy")) for name in ARRAYS]
+    records, trainers, energy, chart = arrays
+    return PokemonCatalogue(records, version, trainers, energy, chart)
+
+
+def publish_catalogue(catalogue: PokemonCatalogue) -> int:
+    """
+        Publishes a catalogue for every process, unless the live version
+        already has the same content.
+        Args:
+            catalogue (PokemonCatalogue): A freshly built catalogue.
+        Returns:
+            int: The live version after publishing.
+    """
+
+    current = read_current_version()
+    digest = catalogue.digest()
+    if current is not None and _published_digest(current) == digest:
+        # Same content: only mark the live version as fresh.
+        os.utime(_current_path())
+        return current
+
+    os.makedirs(CATALOGUE_DIR, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".build-", dir=CATALOGUE_DIR)
+    try:
+        for name, array in catalogue.arrays().items():
+            np.save(os.path.join(staging, f"{name}.npy"), np.ascontiguousarray(array),
+                    allow_pickle=False)
+        with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"digest": digest, "created": time.time()}, f)
+        version = (current or 0) + 1
+        while True:
+            try:
+                # Renaming onto an existing version fails: another process
+                # published it first, so take the next number.
+                os.rename(staging, _version_dir(version))
+                break
+            except OSError:
+                if not os.path.isdir(_version_dir(version)):
+                    raise
+                version += 1
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    live = read_current_version()
+    if live is None or live < version:
+        pointer = f"{_current_path()}.{os.getpid()}.tmp"
+        with open(pointer, "w", encoding="ascii") as f:
+            f.write(str(version))
+        os.replace(pointer, _current_path())
+    _remove_old_versions(max(version, live or 0))
+    return max(version, live or 0)
+
+
+def _remove_old_versions(live: int):
+    # Processes that still map a removed version keep reading it: the files
+    # stay alive until they are unmapped.
+    for name in os.listdir(CATALOGUE_DIR):
+        if name.startswith("v") and name[1:].isdigit():
+            if int(name[1:]) <= live - CATALOGUE_KEEP_VERSIONS:
+                shutil.rmtree(os.path.join(CATALOGUE_DIR, name), ignore_errors=True)
+
+
+_current = None
+_stale = threading.Event()
+_build_lock = threading.Lock()
+_last_check = 0.0
+
+
+def mark_stale():
+    """
+        Makes the next get_catalogue() call build and publish a fresh
+        catalogue.
+    """
+
+    _stale.set()
+
+
+def _published_age() -> float:
+    try:
+        return time.time() - os.path.getmtime(_current_path())
+    except OSError:
+        return float("inf")
+
+
+def _needs_refresh(catalogue) -> bool:
+    return catalogue is None or _stale.is_set()
+
+
+def _swap(catalogue: PokemonCatalogue) -> PokemonCatalogue:
+    global _current
+    _current = catalogue
+    METRICS.set("pokemon_catalogue_records", value=len(catalogue))
+    METRICS.set("pokemon_catalogue_version", value=catalogue.version)
+    return catalogue
+
+
+def refresh_catalogue(db=None, only_if_stale: bool = False) -> PokemonCatalogue:
+    """
+        Builds a new catalogue from the database, publishes it to the other
+        processes and swaps it in.
+        Args:
+            db (Session, optional): Session to read with; a new one is
+                opened when omitted.
+            only_if_stale (bool): Keep the current catalogue if another
+                thread refreshed it while this one waited.
+        Returns:
+            PokemonCatalogue: The current catalogue.
+    """
+
+    with _build_lock:
+        if only_if_stale and not _needs_refresh(_current):
+            return _current
+        _stale.clear()
+        own_session = db is None
+        db = SessionLocal() if own_session else db
+        try:
+            catalogue = build_catalogue(db)
+        except Exception:
+            _stale.set()
+            raise
+        finally:
+            if own_session:
+                db.close()
+        METRICS.inc("pokemon_catalogue_builds_total")
+        try:
+            version = publish_catalogue(catalogue)
+            if _current is None or _current.version != version:
+                catalogue = load_version(version)
+            else:
+                catalogue = _current
+        except OSError:
+            logger.warning("Could not publish the catalogue to %s; using a private copy",
+                           CATALOGUE_DIR, exc_info=True)
+            catalogue.version = (_current.version if _current is not None else 0) + 1
+        return _swap(catalogue)
+
+
+def get_catalogue() -> PokemonCatalogue:
+    """
+        Returns the current catalogue. Maps a version published by another
+        process when there is one, and rebuilds first when the catalogue is
+        stale. While one thread rebuilds, the others keep getting the
+        previous catalogue (they only wait when there is none yet).
+    """
+
+    global _last_check
+    catalogue = _current
+    now = time.monotonic()
+    if catalogue is not None and not _stale.is_set() and now - _last_check < CATALOGUE_CHECK_SECONDS:
+        return catalogue
+    if catalogue is not None and _build_lock.locked():
+        return catalogue
+    _last_check = now
+
+    if not _stale.is_set():
+        version = read_current_version()
+        if version is None:
+            # Nothing published (or CATALOGUE_DIR is not writable): rebuild
+            # the private copy when it is too old.
+            if catalogue is None or now - catalogue.built_at > CATALOGUE_TTL_SECONDS:
+                mark_stale()
+        elif _published_age() > CATALOGUE_TTL_SECONDS:
+            mark_stale()
+        elif catalogue is None or catalogue.version != version:
+            with _build_lock:
+                try:
+                    if _current is None or _current.version != version:
+                        _swap(load_version(version))
+                except (OSError, ValueError):
+                    # Removed or unreadable: build a fresh version instead.
+                    mark_stale()
+    if not _needs_refresh(_current):
+        return _current
+    return refresh_catalogue(only_if_stale=True)
+
+
+@event.listens_for(Session, "after_flush")
+def _note_pokemon_writes(session, flush_context):
+    if any(isinstance(obj, (Pokemon, Trainer, Energy))
+           for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info["pokemon_written"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _pokemon_committed(session):
+    # Only after the commit: a rebuild that ran between the flush and the
+    # commit would not have seen the new rows.
+    if session.info.pop("pokemon_written", False):
+        mark_stale()
+
+
+@event.listens_for(Session, "after_rollback")
+def _pokemon_rolled_back(session):
+    session.info.pop("pokemon_written", None)
@@ -0,0 +1,437 @@
+import argparse
+import copy
+import json
+import logging
+import os
+import sys
+import threading
+from sqlalchemy import select, func
+from sqlalchemy.exc import SQLAlchemyError
+import http_client
+import utils
+from cache import CountingCache
+from database import SessionLocal
+from models import Pokemon
+from profiling import METRICS
+from type_matchups import get_strengths_and_weaknesses
+
+"""
+    This module is the one place Pokémon data comes from. It replaces the
+    separate fetchers that lived in utils.py and services/pokeapi_service.py.
+
+    A PokemonProvider asks its backends in order until one knows the Pokémon:
+      - DatabaseBackend: the local 'pokemon' table,
+      - SnapshotBackend: an NDJSON file of PokéAPI /pokemon/ documents
+        (POKEMON_SNAPSHOT_PATH; write one with the 'snapshot' command),
+      - HttpBackend:     PokéAPI itself.
+    Every backend returns the same normalised record: the fields of the
+    Pokemon model plus "base_experience" and the raw "stats" by PokéAPI name.
+    Documents from the snapshot or PokéAPI also yield the full move and
+    ability references used by move_data.py.
+
+    Records are cached by id and by name in the "pokemon_data" cache (hits
+    and misses show up in GET /ready and GET /metrics), and concurrent
+    lookups of the same key share one backend call, so a Pokémon is fetched
+    at most once per POKEMON_CACHE_SECONDS (default one day) in each process.
+
+    The backends are chosen with POKEMON_PROVIDER_BACKENDS (comma-separated,
+    default "snapshot,http"; "snapshot" is skipped when no snapshot path is
+    set). The API routes read the 'pokemon' table themselves before asking
+    the provider, as they need the ORM rows, so "db" is mostly useful for
+    scripts.
+
+    Usage (from the 'backend' folder):
+        python pokemon_provider.py snapshot pokemon.ndjson 1 4 25
+"""
+
+
+logger = logging.getLogger(__name__)
+
+POKEMON_PROVIDER_BACKENDS = os.getenv("POKEMON_PROVIDER_BACKENDS", "snapshot,http")
+POKEMON_SNAPSHOT_PATH = os.getenv("POKEMON_SNAPSHOT_PATH")
+POKEMON_CACHE_SECONDS = float(os.getenv("POKEMON_CACHE_SECONDS", "86400"))
+
+COLUMNS = ("name", "image_url", "types", "strengths", "weaknesses", "moves", "abilities",
+           "hp", "attack", "defense", "special_attack", "special_defense", "speed")
+STAT_NAMES = {"hp": "hp", "attack": "attack", "defense": "defense",
+              "special_attack": "special-attack", "special_defense": "special-defense",
+              "speed": "speed"}
+
+METRICS.describe("pokemon_provider_lookups_total",
+                 "Pokémon provider backend lookups, by backend and result.")
+
+
+def _resource_id(url: str) -> int:
+    return int(url.rstrip("/").rsplit("/", 1)[-1])
+
+
+def pokemon_refs(data: dict):
+    """
+        Extracts every move and ability a PokéAPI Pokémon document references.
+        Args:
+            data (dict): A PokéAPI /pokemon/ document.
+        Returns:
+            dict: "moves" as (id, name) pairs and "abilities" as
+            (id, name, is_hidden, slot) tuples.
+    """
+
+    return {
+        "moves": [(_resource_id(m["move"]["url"]), m["move"]["name"])
+                  for m in data.get("moves", [])],
+        "abilities": [(_resource_id(a["ability"]["url"]), a["ability"]["name"],
+                       bool(a.get("is_hidden")), a.get("slot"))
+                      for a in data.get("abilities", [])],
+    }
+
+
+def normalize_document(data: dict):
+    """
+        Converts a PokéAPI /pokemon/ document into a provider record and
+        calculates its strengths and weaknesses from the type chart.
+        Args:
+            data (dict): A PokéAPI /pokemon/ document.
+        Returns:
+            dict: The record, with a PokémonDB image URL.
+    """
+
+    name = data["name"]
+    types = [t["type"]["name"].capitalize() for t in data["types"]]
+    strengths, weaknesses = get_strengths_and_weaknesses(types)
+    stats = {stat["stat"]["name"]: stat["base_stat"] for stat in data["stats"]}
+    logger.debug("Fetched Pokémon %s", name, extra={
+        "types": types, "strengths": strengths, "weaknesses": weaknesses,
+        "sample_rate": 0.01})
+
+    return {
+        "id": data["id"],
+        "name": name,
+        "types": types,
+        "strengths": strengths,
+        "weaknesses": weaknesses,
+        "moves": [move["move"]["name"].capitalize() for move in data["moves"][:4]],
+        "abilities": [ability["ability"]["name"].capitalize() for ability in data["abilities"]],
+        **{column: stats.get(stat_name, 0) for column, stat_name in STAT_NAMES.items()},
+        "image_url": utils.pokemon_image_url(name),
+        "base_experience": data.get("base_experience"),
+        "stats": stats,
+    }
+
+
+def pokemon_columns(record: dict):
+    """
+        Returns the keyword arguments to store a record as a Pokemon row,
+        e.g. Pokemon(**pokemon_columns(record)).
+    """
+
+    return {"id": record["id"], **{column: record[column] for column in COLUMNS}}
+
+
+class DatabaseBackend:
+    """
+        Reads Pokémon stored in the local 'pokemon' table.
+    """
+
+    name = "db"
+
+    def lookup(self, key: str):
+        column = Pokemon.id if key.isdigit() else func.lower(Pokemon.name)
+        value = int(key) if key.isdigit() else key
+        db = SessionLocal()
+        try:
+            pokemon = db.execute(select(Pokemon).where(column == value)).scalars().first()
+        finally:
+            db.close()
+        if pokemon is None:
+            return None
+        record = {"id": pokemon.id, **{column: getattr(pokemon, column) for column in COLUMNS}}
+        record["base_experience"] = None
+        record["stats"] = {stat_name: getattr(pokemon, column) or 0
+                           for column, stat_name in STAT_NAMES.items()}
+        return record, None
+
+
+class SnapshotBackend:
+    """
+        Reads PokéAPI /pokemon/ documents from an NDJSON file. The file is
+        scanned once for the byte offset of every id and name; a lookup then
+        reads and parses a single line.
+    """
+
+    name = "snapshot"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._offsets = None
+        self._lock = threading.Lock()
+
+    def _index(self):
+        with self._lock:
+            if self._offsets is None:
+                offsets = {}
+                with open(self.path, "rb") as f:
+                    offset = f.tell()
+                    for line in iter(f.readline, b""):
+                        if line.strip():
+                            doc = json.loads(line)
+                            offsets[str(doc["id"])] = offset
+                            offsets[doc["name"].lower()] = offset
+                        offset = f.tell()
+                self._offsets = offsets
+        return self._offsets
+
+    def lookup(self, key: str):
+        offset = self._index().get(key)
+        if offset is None:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = json.loads(f.readline())
+        return normalize_document(data), pokemon_refs(data)
+
+
+class HttpBackend:
+    """
+        Fetches Pokémon from PokéAPI.
+    """
+
+    name = "http"
+
+    def fetch_document(self, key: str):
+        response = http_client.get(f"{utils.POKEAPI_URL}{key}", upstream="pokeapi")
+        if response.status_code != 200:
+            logger.info("PokéAPI returned %s for %s", response.status_code, key)
+            return None
+        return response.json()
+
+    def lookup(self, key: str):
+        data = self.fetch_document(key)
+        if data is None:
+            return None
+        return normalize_document(data), pokemon_refs(data)
+
+
+class PokemonProvider:
+    """
+        Looks Pokémon up through a cache and a list of backends.
+
+        Args:
+            backends (list): Backends to ask, in order.
+            cache (CountingCache, optional): Records by id and lower-case name.
+            refs_cache (CountingCache, optional): Move and ability references
+                by Pokémon id.
+    """
+
+    def __init__(self, backends, cache: CountingCache = None, refs_cache: CountingCache = None):
+        self.backends = list(backends)
+        self.cache = cache or CountingCache("pokemon_data", maxsize=4096, ttl=POKEMON_CACHE_SECONDS)
+        self.refs_cache = refs_cache or CountingCache("pokemon_refs", maxsize=4096,
+                                                      ttl=POKEMON_CACHE_SECONDS)
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: str):
+        for backend in self.backends:
+            try:
+                found = backend.lookup(key)
+            except (OSError, ValueError, SQLAlchemyError):
+                logger.warning("Pokémon backend %s failed for %s", backend.name, key,
+                               exc_info=True)
+                METRICS.inc("pokemon_provider_lookups_total",
+                            {"backend": backend.name, "result": "error"})
+                continue
+            METRICS.inc("pokemon_provider_lookups_total",
+                        {"backend": backend.name, "result": "hit" if found else "miss"})
+            if found is not None:
+                return found
+        return None
+
+    def get(self, pokemon_id_or_name):
+        """
+            Returns the record of a Pokémon, looked up by id or name.
+            Args:
+                pokemon_id_or_name (int or str): The Pokémon's id or name.
+            Returns:
+                dict: A copy of the record, or None if no backend knows it.
+        """
+
+        key = str(pokemon_id_or_name).lower()
+        record = self.cache.get(key)
+        if record is not None:
+            return copy.deepcopy(record)
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._inflight[key] = threading.Event()
+        if not owner:
+            pending.wait()
+            record = self.cache.get(key)
+            return copy.deepcopy(record) if record is not None else None
+
+        try:
+            found = self._lookup(key)
+            if found is None:
+                return None
+            record, refs = found
+            self.cache.set(str(record["id"]), record)
+            self.cache.set(record["name"].lower(), record)
+            if refs is not None:
+                self.refs_cache.set(record["id"], refs)
+            return copy.deepcopy(record)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            pending.set()
+
+    def refs(self, pokemon_id: int, fetch: bool = True):
+        """
+            Returns a Pokémon's move and ability references (see
+            pokemon_refs()), kept from the document its record came from.
+            Args:
+                pokemon_id (int): The Pokémon's id.
+                fetch (bool): Whether a cache miss may ask the backends that
+                    read documents.
+            Returns:
+                dict: The references, or None.
+        """
+
+        refs = self.refs_cache.get(pokemon_id)
+        if refs is not None or not fetch:
+            return refs
+        for backend in self.backends:
+            if isinstance(backend, DatabaseBackend):
+                continue
+            try:
+                found = backend.lookup(str(pokemon_id))
+            except (OSError, ValueError):
+                continue
+            if found is not None:
+                record, refs = found
+                self.cache.set(str(record["id"]), record)
+                self.cache.set(record["name"].lower(), record)
+                self.refs_cache.set(pokemon_id, refs)
+                return refs
+        return None
+
+
+def build_provider(backend_names: str = None, snapshot_path: str = None) -> PokemonProvider:
+    """
+        Builds a provider from a comma-separated list of backend names.
+        Args:
+            backend_names (str, optional): e.g. "db,snapshot,http"; defaults
+                to POKEMON_PROVIDER_BACKENDS.
+            snapshot_path (str, optional): Defaults to POKEMON_SNAPSHOT_PATH.
+        Returns:
+            PokemonProvider: The provider.
+        Raises:
+            ValueError: If a backend name is unknown.
+    """
+
+    snapshot_path = snapshot_path or POKEMON_SNAPSHOT_PATH
+    backends = []
+    for name in (backend_names or POKEMON_PROVIDER_BACKENDS).split(","):
+        name = name.strip()
+        if name == "db":
+            backends.append(DatabaseBackend())
+        elif name == "snapshot":
+            if snapshot_path:
+                backends.append(SnapshotBackend(snapshot_path))
+        elif name == "http":
+            backends.append(HttpBackend())
+        elif name:
+            raise ValueError(f"Unknown Pokémon backend: {name}")
+    return PokemonProvider(backends)
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> PokemonProvider:
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                _provider = build_provider()
+    return _provider
+
+
+def set_provider(provider: PokemonProvider):
+    """
+        Replaces the process-wide provider (e.g. in scripts and tests).
+    """
+
+    global _provider
+    _provider = provider
+
+
+def fetch_pokemon_data(pokemon_id_or_name):
+    """
+        Returns a Pokémon's record from the process-wide provider.
+        Args:
+            pokemon_id_or_name (int or str): The Pokémon's ID or name to fetch.
+        Returns:
+            dict: The record (the caller's own copy), or None if not found.
+    """
+
+    return get_provider().get(pokemon_id_or_name)
+
+
+def fetch_pokemon_refs(pokemon_id: int, fetch: bool = True):
+    """
+        Returns a Pokémon's move and ability references from the process-wide
+        provider, or None.
+    """
+
+    return get_provider().refs(pokemon_id, fetch=fetch)
+
+
+def write_snapshot(pokemon_ids, output):
+    """
+        Writes the PokéAPI documents of the given Pokémon as NDJSON, for
+        SnapshotBackend.
+        Args:
+            pokemon_ids (iterable): Pokémon ids.
+            output (file): A text file open for writing.
+        Returns:
+            int: The number of documents written.
+    """
+
+    backend = HttpBackend()
+    count = 0
+    for pokemon_id in pokemon_ids:
+        data = backend.fetch_document(str(pokemon_id))
+        if data is not None:
+            output.write(json.dumps(data, separators=(",", ":")) + "\n")
+            count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pokémon data provider tools.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    snapshot = sub.add_parser("snapshot", help="Write PokéAPI documents to an NDJSON file.")
+    snapshot.add_argument("output", help="NDJSON file, or '-' for stdout.")
+    snapshot.add_argument("ids", nargs="*", type=int,
+                          help="Pokémon ids (default: every Pokémon in the database).")
+    args = parser.parse_args(argv)
+
+    pokemon_ids = args.ids
+    if not pokemon_ids:
+        db = SessionLocal()
+        try:
+            pokemon_ids = db.execute(select(Pokemon.id).order_by(Pokemon.id)).scalars().all()
+        finally:
+            db.close()
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        count = write_snapshot(pokemon_ids, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"Wrote {count} Pokémon.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
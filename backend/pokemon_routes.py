@@ -1,13 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Query
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
 from database import SessionLocal
 from models import Pokemon
-from utils import fetch_pokemon_data
+from schemas import PokemonBatchRequest, POKEMON_BATCH_POST_MAX
+from type_filters import find_pokemon
+from move_data import link_pokemon, get_pokemon_moves
+from pokemon_provider import fetch_pokemon_data, pokemon_columns
 from fastapi.security import OAuth2PasswordBearer
 from auth import oauth2_scheme, decode_token
+from deck_routes import get_read_db
 
 router = APIRouter()
 
+POKEMON_BATCH_GET_MAX = 100
+POKEMON_FILL_CONCURRENCY = int(os.getenv("POKEMON_FILL_CONCURRENCY", "8"))
+
 
 def get_db():
     db = SessionLocal()
@@ -17,8 +29,246 @@ def get_db():
         db.close()
 
 
+@router.get("/pokemon/search")
+def search_pokemon(types: Optional[List[str]] = Query(None),
+                   strong_against: Optional[List[str]] = Query(None),
+                   weak_to: Optional[List[str]] = Query(None),
+                   not_weak_to: Optional[List[str]] = Query(None),
+                   limit: int = Query(50, ge=1, le=500),
+                   offset: int = Query(0, ge=0),
+                   token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)):
+    """
+       Searches the Pokémon stored in the local database by type, e.g.
+       /pokemon/search?strong_against=Fire&not_weak_to=Water. Each parameter
+       can be repeated; all given constraints must hold. The filters run in
+       SQL on the integer type mask columns.
+
+       Args:
+           types (list): Types the Pokémon must have.
+           strong_against (list): Types the Pokémon must be strong against.
+           weak_to (list): Types the Pokémon must be weak to.
+           not_weak_to (list): Types the Pokémon must not be weak to.
+           limit (int): Maximum number of results (1-500).
+           offset (int): Results to skip, for paging.
+           token (str): An OAuth2 Bearer token for user authentication.
+           db (Session): A SQLAlchemy database session, injected via dependency.
+
+       Returns:
+           list: The matching Pokémon (id, name, image URL, types,
+           strengths and weaknesses), ordered by id.
+
+       Raises:
+           HTTPException:
+               - 401 if the user token is invalid or missing.
+               - 400 if a type name is unknown.
+    """
+
+    user = decode_token(token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    try:
+        matches = find_pokemon(db, limit=limit, offset=offset, types=types,
+                               strong_against=strong_against, weak_to=weak_to,
+                               not_weak_to=not_weak_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return [
+        {
+            "id": pokemon.id,
+            "name": pokemon.name,
+            "image_url": pokemon.image_url,
+            "types": pokemon.types,
+            "strengths": pokemon.strengths,
+            "weaknesses": pokemon.weaknesses,
+        }
+        for pokemon in matches
+    ]
+
+
+@router.get("/pokemon/moves")
+def get_many_pokemon_moves(ids: str = Query(..., description="Comma-separated Pokémon ids"),
+                           token: str = Depends(oauth2_scheme),
+                           db: Session = Depends(get_read_db)):
+    """
+       Returns the stored moves and abilities of up to 100 Pokémon in one
+       call, e.g. /pokemon/moves?ids=1,4,25, with one query per table and no
+       PokéAPI calls.
+
+       Args:
+           ids (str): Comma-separated Pokémon ids.
+           token (str): An OAuth2 Bearer token for user authentication.
+           db (Session): A SQLAlchemy database session, injected via dependency.
+
+       Returns:
+           dict: {"pokemon": {id: {"moves", "abilities"}}, "pending": [ids]},
+           where "pending" lists the ids whose moves are not stored yet
+           (GET /pokemon/{id}/moves stores them).
+
+       Raises:
+           HTTPException:
+               - 401 if the user token is invalid or missing.
+               - 400 if the ids are not integers or more than 100 are given.
+    """
+
+    user = decode_token(token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    try:
+        pokemon_ids = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if not pokemon_ids or len(pokemon_ids) > 100:
+        raise HTTPException(status_code=400, detail="Give between 1 and 100 ids")
+    stored = get_pokemon_moves(db, pokemon_ids)
+    return {
+        "pokemon": stored,
+        "pending": [pokemon_id for pokemon_id in pokemon_ids if pokemon_id not in stored],
+    }
+
+
+def pokemon_to_dict(pokemon: Pokemon):
+    return {
+        "id": pokemon.id,
+        "name": pokemon.name,
+        "image_url": pokemon.image_url,
+        "types": pokemon.types,
+        "strengths": pokemon.strengths,
+        "weaknesses": pokemon.weaknesses,
+        "moves": pokemon.moves,
+        "abilities": pokemon.abilities,
+        "hp": pokemon.hp,
+        "attack": pokemon.attack,
+        "defense": pokemon.defense,
+        "special_attack": pokemon.special_attack,
+        "special_defense": pokemon.special_defense,
+        "speed": pokemon.speed
+    }
+
+
+def load_pokemon(db: Session, pokemon_ids: List[int]):
+    """
+        Returns the details of many Pokémon, storing the ones that are not
+        in the local database yet. Stored Pokémon are read with one IN
+        query; the others are fetched in parallel (POKEMON_FILL_CONCURRENCY
+        at a time) and stored, with their move links, in one transaction.
+        Args:
+            db (Session): The database session.
+            pokemon_ids (list): Pokémon ids; duplicates are allowed.
+        Returns:
+            list: One dict per requested id, in request order, or None for
+            ids that PokéAPI does not know.
+    """
+
+    unique = list(dict.fromkeys(pokemon_ids))
+    found = _read_pokemon(db, unique)
+    misses = [pokemon_id for pokemon_id in unique if pokemon_id not in found]
+    if misses and getattr(db, "read_only", False):
+        # The replica may lag behind: look for the misses on the primary.
+        db.use_primary()
+        found.update(_read_pokemon(db, misses))
+        misses = [pokemon_id for pokemon_id in misses if pokemon_id not in found]
+    if misses:
+        workers = max(1, min(POKEMON_FILL_CONCURRENCY, len(misses)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pokemon-fill") as pool:
+            fetched = [data for data in pool.map(fetch_pokemon_data, misses) if data]
+        found.update(_store_pokemon(db, fetched))
+    return [found.get(pokemon_id) for pokemon_id in pokemon_ids]
+
+
+def _read_pokemon(db: Session, pokemon_ids: List[int]):
+    return {pokemon.id: pokemon_to_dict(pokemon) for pokemon in
+            db.execute(select(Pokemon).where(Pokemon.id.in_(pokemon_ids))).scalars()}
+
+
+def _store_pokemon(db: Session, fetched: list):
+    for attempt in range(2):
+        stored = set(db.execute(select(Pokemon.id).where(
+            Pokemon.id.in_([data["id"] for data in fetched]))).scalars())
+        new = [Pokemon(**pokemon_columns(data)) for data in fetched if data["id"] not in stored]
+        db.add_all(new)
+        try:
+            db.flush()
+            for pokemon in new:
+                link_pokemon(db, pokemon.id, fetch=False)
+            # Serialised before the commit expires the objects.
+            result = {pokemon.id: pokemon_to_dict(pokemon) for pokemon in new}
+            db.commit()
+        except IntegrityError:
+            # Another request stored some of them first; keep its rows.
+            db.rollback()
+            if attempt:
+                raise
+            continue
+        if stored:
+            result.update(_read_pokemon(db, list(stored)))
+        return result
+
+
+def _check_count(ids: List[int], limit: int):
+    if not ids or len(ids) > limit:
+        raise HTTPException(status_code=400, detail=f"Give between 1 and {limit} ids")
+    return ids
+
+
+def _batch_response(db: Session, pokemon_ids: List[int]):
+    pokemon = load_pokemon(db, pokemon_ids)
+    missing = [pokemon_id for pokemon_id, entry in zip(pokemon_ids, pokemon) if entry is None]
+    return {"pokemon": pokemon, "missing": list(dict.fromkeys(missing))}
+
+
+@router.get("/pokemon")
+def get_many_pokemon(ids: str = Query(..., description="Comma-separated Pokémon ids"),
+                     token: str = Depends(oauth2_scheme), db: Session = Depends(get_read_db)):
+    """
+       Returns the details of up to 100 Pokémon in one call, e.g.
+       /pokemon?ids=1,4,25, in request order. Pokémon that are not stored yet
+       are fetched in parallel and stored (see load_pokemon()).
+
+       Args:
+           ids (str): Comma-separated Pokémon ids.
+           token (str): An OAuth2 Bearer token for user authentication.
+           db (Session): A SQLAlchemy database session, injected via dependency.
+
+       Returns:
+           dict: {"pokemon": [details or null, ...], "missing": [ids]}.
+
+       Raises:
+           HTTPException:
+               - 401 if the user token is invalid or missing.
+               - 400 if the ids are not integers or more than 100 are given.
+    """
+
+    user = decode_token(token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    try:
+        pokemon_ids = [int(part) for part in ids.split(",") if part.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    return _batch_response(db, _check_count(pokemon_ids, POKEMON_BATCH_GET_MAX))
+
+
+@router.post("/pokemon")
+def post_many_pokemon(request: PokemonBatchRequest, token: str = Depends(oauth2_scheme),
+                      db: Session = Depends(get_read_db)):
+    """
+       Same as GET /pokemon, for up to 1000 ids sent as {"ids": [...]}.
+
+       Raises:
+           HTTPException:
+               - 401 if the user token is invalid or missing.
+               - 400 if no ids or more than 1000 are given.
+    """
+
+    user = decode_token(token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    return _batch_response(db, _check_count(request.ids, POKEMON_BATCH_POST_MAX))
+
+
 @router.get("/pokemon/{pokemon_id}")
-def get_pokemon_details(pokemon_id: int, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_pokemon_details(pokemon_id: int, token: str = Depends(oauth2_scheme),
+                        db: Session = Depends(get_read_db)):
     """
        Retrieves detailed Pokémon info by ID from the local database if it exists.
        Otherwise, it fetches the data from the external PokéAPI, stores it in the
@@ -44,44 +294,60 @@ def get_pokemon_details(pokemon_id: int, token: str = Depends(oauth2_scheme), db
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     pokemon = db.query(Pokemon).filter(Pokemon.id == pokemon_id).first()
     if pokemon:
-        return {
-            "id": pokemon.id,
-            "name": pokemon.name,
-            "image_url": pokemon.image_url,
-            "types": pokemon.types,
-            "strengths": pokemon.strengths,
-            "weaknesses": pokemon.weaknesses,
-            "moves": pokemon.moves,
-            "abilities": pokemon.abilities,
-            "hp": pokemon.hp,
-            "attack": pokemon.attack,
-            "defense": pokemon.defense,
-            "special_attack": pokemon.special_attack,
-            "special_defense": pokemon.special_defense,
-            "speed": pokemon.speed
-        }
+        return pokemon_to_dict(pokemon)
+    # A replica may lag behind: check the primary before fetching.
+    db.use_primary()
+    pokemon = db.query(Pokemon).filter(Pokemon.id == pokemon_id).first()
+    if pokemon:
+        return pokemon_to_dict(pokemon)
 
     data = fetch_pokemon_data(pokemon_id)
     if not data:
         raise HTTPException(status_code=404, detail="Pokemon not found")
 
-    new_pokemon = Pokemon(
-        id=data["id"],
-        name=data["name"],
-        image_url=data["image_url"],
-        types=data["types"],
-        strengths=data["strengths"],
-        weaknesses=data["weaknesses"],
-        moves=data["moves"],
-        abilities=data["abilities"],
-        hp=data["hp"],
-        attack=data["attack"],
-        defense=data["defense"],
-        special_attack=data["special_attack"],
-        special_defense=data["special_defense"],
-        speed=data["speed"]
-    )
+    new_pokemon = Pokemon(**pokemon_columns(data))
     db.add(new_pokemon)
+    db.flush()
+    link_pokemon(db, new_pokemon.id, fetch=False)
     db.commit()
     db.refresh(new_pokemon)
     return data
+
+
+@router.get("/pokemon/{pokemon_id}/moves")
+def get_pokemon_move_details(pokemon_id: int, token: str = Depends(oauth2_scheme),
+                             db: Session = Depends(get_db)):
+    """
+       Returns every move and ability of a stored Pokémon, with their type,
+       power, accuracy, PP and effect text where those details have been
+       imported (see move_data.py). The lists are stored the first time they
+       are asked for; this costs at most one PokéAPI call, and none when the
+       Pokémon was fetched recently.
+
+       Args:
+           pokemon_id (int): The integer ID of the Pokémon.
+           token (str): An OAuth2 Bearer token for user authentication.
+           db (Session): A SQLAlchemy database session, injected via dependency.
+
+       Returns:
+           dict: {"id", "linked", "moves": [...], "abilities": [...]};
+           "linked" is false if the lists could not be stored this time.
+
+       Raises:
+           HTTPException:
+               - 401 if the user token is invalid or missing.
+               - 404 if the Pokémon is not stored locally or its move list
+                 cannot be retrieved.
+    """
+
+    user = decode_token(token)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+    if not db.query(Pokemon.id).filter(Pokemon.id == pokemon_id).first():
+        raise HTTPException(status_code=404, detail="Pokemon not found")
+    linked = link_pokemon(db, pokemon_id, fetch=True)
+    db.commit()
+    entry = get_pokemon_moves(db, [pokemon_id]).get(pokemon_id)
+    if entry is None and not linked:
+        raise HTTPException(status_code=404, detail="Moves not available")
+    return {"id": pokemon_id, "linked": linked, **(entry or {"moves": [], "abilities": []})}
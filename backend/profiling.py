@@ -0,0 +1,369 @@
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+"""
+    This module records where the time goes inside each request.
+
+    Every HTTP request gets a RequestProfile that collects spans in three
+    categories:
+      - "db":   SQL statements, captured with SQLAlchemy engine events,
+      - "http": outbound calls to PokéAPI / the TCG API / image hosts
+                (recorded by http_client.py),
+      - "cpu":  named code sections such as bcrypt or deck scoring.
+
+    The spans are summed per category and returned in a 'Server-Timing'
+    header, so browser dev tools show the breakdown directly. They are also
+    added to process-wide counters exposed in Prometheus text format at
+    GET /metrics.
+
+    Setting PROFILER_SAMPLING=1 additionally starts a sampling profiler that
+    snapshots every thread's stack every PROFILER_INTERVAL_MS milliseconds.
+    GET /metrics/profile returns the samples in "folded" format, ready for
+    flamegraph.pl or speedscope.
+"""
+
+
+_current_profile = contextvars.ContextVar("request_profile", default=None)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestProfile:
+    """
+        Collects the spans recorded while one request is being handled.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, category: str, name: str, duration: float):
+        with self._lock:
+            self.spans.append((category, name, duration))
+
+    def totals(self):
+        """
+            Sums the spans per category.
+            Returns:
+                dict: category -> (total seconds, number of spans)
+        """
+
+        totals = {}
+        with self._lock:
+            for category, _, duration in self.spans:
+                total, count = totals.get(category, (0.0, 0))
+                totals[category] = (total + duration, count + 1)
+        return totals
+
+    def server_timing(self):
+        """
+            Formats the profile as a Server-Timing header value.
+        """
+
+        parts = []
+        for category, (total, count) in sorted(self.totals().items()):
+            if category == "cpu":
+                continue
+            unit = "queries" if category == "db" else "calls"
+            parts.append(f'{category};dur={total * 1000:.1f};desc="{count} {unit}"')
+        with self._lock:
+            sections = Counter()
+            for category, name, duration in self.spans:
+                if category == "cpu":
+                    sections[name] += duration
+        for name, duration in sorted(sections.items()):
+            parts.append(f"cpu-{name};dur={duration * 1000:.1f}")
+        total = time.perf_counter() - self.started
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+
+class MetricsRegistry:
+    """
+        Process-wide counters and histograms, rendered in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._help = {}
+        self._collectors = []
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def add_collector(self, collector):
+        """
+            Registers a callable that refreshes gauges just before rendering,
+            for values that are cheaper to read on demand than to track.
+        """
+
+        self._collectors.append(collector)
+
+    def inc(self, name: str, labels: dict = None, value: float = 1.0):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def set(self, name: str, labels: dict = None, value: float = 0.0):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._counters[key] = value
+
+    def observe(self, name: str, value: float, labels: dict = None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(DURATION_BUCKETS), 0.0, 0]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def render(self):
+        for collector in self._collectors:
+            collector()
+        lines = []
+        seen = set()
+
+        def header(name, kind):
+            if name not in seen:
+                seen.add(name)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        def fmt(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                header(name, "counter" if name.endswith("_total") else "gauge")
+                lines.append(f"{name}{fmt(labels)} {value:g}")
+            for (name, labels), (buckets, total, count) in sorted(self._histograms.items()):
+                header(name, "histogram")
+                for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', bound)])} {bucket_count}")
+                lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{name}_sum{fmt(labels)} {total:g}")
+                lines.append(f"{name}_count{fmt(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+METRICS.describe("http_requests_total", "Requests handled, by route and status.")
+METRICS.describe("http_request_duration_seconds", "Request latency, by route.")
+METRICS.describe("db_queries_total", "SQL statements executed, by route.")
+METRICS.describe("db_query_seconds_total", "Time spent in SQL statements, by route.")
+METRICS.describe("outbound_requests_total", "Calls to upstream services, by upstream.")
+METRICS.describe("outbound_request_duration_seconds", "Upstream call latency, by upstream.")
+METRICS.describe("cpu_section_seconds_total", "Time spent in named code sections.")
+
+
+def record_span(category: str, name: str, duration: float):
+    """
+        Adds a finished span to the current request's profile (if there is one)
+        and to the process-wide metrics.
+        Args:
+            category (str): "db", "http" or "cpu".
+            name (str): The span name, e.g. an upstream or a section name.
+            duration (float): Duration in seconds.
+    """
+
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.add(category, name, duration)
+    if category == "http":
+        METRICS.inc("outbound_requests_total", {"upstream": name})
+        METRICS.observe("outbound_request_duration_seconds", duration, {"upstream": name})
+    elif category == "cpu":
+        METRICS.inc("cpu_section_seconds_total", {"section": name}, duration)
+
+
+@contextmanager
+def span(category: str, name: str):
+    """
+        Times the wrapped block and records it as a span.
+
+        Example:
+            with span("cpu", "bcrypt"):
+                pwd_context.hash(password)
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(category, name, time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the statement's own execution context: a statement that
+    # raises never reaches after_cursor_execute and its start goes with it.
+    context.profiling_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, "profiling_query_start", None)
+    if start is not None:
+        record_span("db", "query", time.perf_counter() - start)
+
+
+def instrument_engine(engine):
+    """
+        Hooks SQLAlchemy events on an engine so every statement becomes a "db" span.
+        Args:
+            engine (Engine): The engine to instrument.
+    """
+
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class ProfilingMiddleware:
+    """
+        ASGI middleware that profiles each HTTP request, adds a Server-Timing
+        header to the response and updates the request metrics.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = _current_profile.set(profile)
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", profile.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_profile.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            labels = {"method": scope["method"], "route": route}
+            METRICS.inc("http_requests_total", {**labels, "status": status[0]})
+            METRICS.observe("http_request_duration_seconds",
+                            time.perf_counter() - profile.started, labels)
+            db_time, db_count = profile.totals().get("db", (0.0, 0))
+            if db_count:
+                METRICS.inc("db_queries_total", labels, db_count)
+                METRICS.inc("db_query_seconds_total", labels, db_time)
+
+
+class SamplingProfiler:
+    """
+        A low-overhead statistical profiler. A background thread snapshots the
+        stacks of all other threads at a fixed interval and counts each distinct
+        stack. Idle threads (waiting on locks, queues or sockets) are skipped.
+
+        Args:
+            interval (float): Seconds between samples.
+    """
+
+    IDLE_FILES = ("threading.py", "selectors.py", "queue.py", "socket.py")
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if os.path.basename(frame.f_code.co_filename) in self.IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                with self._lock:
+                    self.samples[";".join(reversed(stack))] += 1
+
+    def folded(self):
+        """
+            Returns the samples in folded-stack format ("a;b;c <count>" per line).
+        """
+
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+
+
+PROFILER_SAMPLING = os.getenv("PROFILER_SAMPLING", "0") == "1"
+sampling_profiler = SamplingProfiler(int(os.getenv("PROFILER_INTERVAL_MS", "5")) / 1000)
+
+router = APIRouter()
+
+
+@router.get("", response_class=PlainTextResponse)
+def get_metrics():
+    """
+        Returns the process metrics in Prometheus text exposition format.
+    """
+
+    return PlainTextResponse(METRICS.render(),
+                             media_type="text/plain; version=0.0.4")
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+def get_profile(reset: bool = False):
+    """
+        Returns the sampling profiler's stacks in folded format, e.g.
+        'curl /metrics/profile > out.folded && flamegraph.pl out.folded > out.svg'.
+        Args:
+            reset (bool): Clear the samples after returning them.
+    """
+
+    folded = sampling_profiler.folded()
+    if reset:
+        sampling_profiler.reset()
+    return folded
@@ -1,13 +1,19 @@
-from synergy import calculate_deck_score
-from utils import fetch_pokemon_data, fetch_trainer_data, fetch_energy_data
+import deck_analytics
+from utils import (fetch_trainer_data, fetch_energy_data,
+                   pokemon_image_url, POKEAPI_TYPE_URL)
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import (DeckPokemon, DeckTrainer, DeckEnergy,
                     Pokemon, Trainer, Energy)
-from type_matchups import type_chart, get_strengths_and_weaknesses
-from sqlalchemy import and_
+from type_filters import type_filter
+from pokemon_catalogue import get_catalogue
+from type_matchups import counter_types, mask_to_types, TYPE_BITS
+from sqlalchemy import and_, select
+import logging
 import random
-import requests
+import http_client
+from cache import CountingCache
+from profiling import span
 
 """
     This file returns recommendations in a structured format (list of dicts).
@@ -30,21 +36,55 @@ import requests
 """
 
 
+logger = logging.getLogger(__name__)
+
+CATALOGUE_TTL_SECONDS = 300
+
+type_listing_cache = CountingCache("type_listings", maxsize=64)
+pokemon_image_cache = CountingCache("pokemon_images", maxsize=8192)
+catalogue_cache = CountingCache("catalogue", ttl=CATALOGUE_TTL_SECONDS)
+# The last Pokémon recommended against each type, served while PokéAPI or
+# PokémonDB is unreachable.
+strength_picks_cache = CountingCache("strength_picks", maxsize=64)
+
+UPSTREAMS = ("pokeapi", "pokemondb", "tcg")
+
+
+def degraded_upstreams():
+    """
+        Returns the upstreams whose circuit breaker is open; while any is,
+        deck views are built from local data only and marked as degraded.
+    """
+
+    return http_client.unavailable_upstreams(*UPSTREAMS)
+
+
 def generate_recommendations(user_deck, db: Session):
     """
         Generates a list of recommendation objects to improve the deck, using:
           - PokemonDB images for recommended Pokémon
           - Basic logic for trainers, energy, synergy score
     """
+
+    return list(iter_recommendations(user_deck, db))
+
+
+def iter_recommendations(user_deck, db: Session):
+    """
+        Yields the recommendations of generate_recommendations() one at a
+        time, as soon as each is known: the Trainer, Energy and deck score
+        items come from local data and are yielded first, the Pokémon picks
+        (which may call PokéAPI and PokémonDB) last.
+    """
+
     if not user_deck:
-        return [{
+        yield {
             "type": "info",
             "name": "No Deck",
             "image_url": "",
             "message": "Your deck is empty! Start adding Pokémon."
-        }]
-
-    recommendations = []
+        }
+        return
 
     pokemon_entries = (db.query(DeckPokemon)
                        .filter(and_(DeckPokemon.deck_id == user_deck.id)).all())
@@ -60,138 +100,199 @@ def generate_recommendations(user_deck, db: Session):
     energy_list = (db.query(Energy)
                    .filter(Energy.id.in_([entry.energy_id for entry in energy_entries])).all())
 
-    deck_score = calculate_deck_score(pokemon_list, trainer_list, energy_list)
+    with span("cpu", "deck_score"):
+        deck_score = deck_analytics.deck_score(pokemon_list, energy_list)
 
-    deck_types = [fetch_pokemon_data(p.id).get("types", []) for p in pokemon_list]
-    flat_types = [t for sublist in deck_types for t in sublist]
-    strengths, weaknesses = get_strengths_and_weaknesses(flat_types)
-    weaknesses_count = {w: weaknesses.count(w) for w in set(weaknesses)}
+    with span("cpu", "type_matchups"):
+        deck_weaknesses = 0
+        for p in pokemon_list:
+            deck_weaknesses |= p.weaknesses_mask
+        weaknesses_count = {w: sum(1 for p in pokemon_list if p.weaknesses_mask & TYPE_BITS[w])
+                            for w in mask_to_types(deck_weaknesses)}
 
-    for weak_type, count in weaknesses_count.items():
-        strong_pokemon = fetch_pokemon_by_strength(weak_type)
-        if strong_pokemon and strong_pokemon["name"] != "No strong Pokémon found":
-            weak_pokemon = next(
-                (p for p in pokemon_list if weak_type in
-                 fetch_pokemon_data(p.id).get("weaknesses", [])),
-                None
-            )
-            if weak_pokemon:
-                message = (f"You have {weak_pokemon.name.capitalize()} in your"
-                           f" deck who is weak to {weak_type}. Consider adding {strong_pokemon['name']}!")
-            else:
-                message = (f"Your deck has {count} Pokémon weak to {weak_type}."
-                           f" Consider adding {strong_pokemon['name']}!")
-
-            rec_obj = {
-                "id": strong_pokemon["id"],
-                "type": "pokemon",
-                "name": strong_pokemon["name"],
-                "tcg_image_url": f"https://img.pokemondb.net/artwork/large/"
-                                 f"{strong_pokemon['name'].lower()}.jpg",
-                "message": message
-            }
-            recommendations.append(rec_obj)
-
-    cached_trainers = db.query(Trainer).all()
+    catalogue = load_catalogue(db)
     deck_trainer_names = {t.name.lower() for t in trainer_list}
-    for trainer in cached_trainers:
-        if trainer.name.lower() not in deck_trainer_names:
-            recommendations.append({
+    for name, tcg_image_url in catalogue["trainers"]:
+        if name.lower() not in deck_trainer_names:
+            yield {
                 "type": "trainer",
-                "name": trainer.name,
-                "tcg_image_url": trainer.tcg_image_url,
-                "message": f"Consider adding {trainer.name} to improve your deck!"
-            })
+                "name": name,
+                "tcg_image_url": tcg_image_url,
+                "message": f"Consider adding {name} to improve your deck!"
+            }
 
-    cached_energy = db.query(Energy).all()
     deck_energy_names = {e.name.lower() for e in energy_list}
-    for energy in cached_energy:
-        if energy.name.lower() not in deck_energy_names:
-            recommendations.append({
+    for name, tcg_image_url in catalogue["energy"]:
+        if name.lower() not in deck_energy_names:
+            yield {
                 "type": "energy",
-                "name": energy.name,
-                "tcg_image_url": energy.tcg_image_url,
-                "message": f"Consider adding more {energy.name} for better balance!"
-            })
+                "name": name,
+                "tcg_image_url": tcg_image_url,
+                "message": f"Consider adding more {name} for better balance!"
+            }
 
     if deck_score < 50:
-        recommendations.append({
+        yield {
             "type": "info",
             "name": "Low Synergy",
             "tcg_image_url": "",
             "message": f"Your deck score is {deck_score}."
                        f" Try balancing your Pokémon, Trainers, and Energy."
-        })
+        }
     else:
-        recommendations.append({
+        yield {
             "type": "info",
             "name": "Deck Score",
             "tcg_image_url": "",
             "message": f"Your deck score is {deck_score}. Nice job!"
-        })
+        }
 
-    if not recommendations:
-        recommendations.append({
-            "type": "info",
-            "name": "No Suggestions",
-            "tcg_image_url": "",
-            "message": "Your deck seems balanced already!"
-        })
+    for weak_type, count in weaknesses_count.items():
+        strong_pokemon = fetch_pokemon_by_strength(weak_type, db)
+        if strong_pokemon and strong_pokemon["name"] != "No strong Pokémon found":
+            weak_pokemon = next(
+                (p for p in pokemon_list if p.weaknesses_mask & TYPE_BITS[weak_type]),
+                None
+            )
+            if weak_pokemon:
+                message = (f"You have {weak_pokemon.name.capitalize()} in your"
+                           f" deck who is weak to {weak_type}. Consider adding {strong_pokemon['name']}!")
+            else:
+                message = (f"Your deck has {count} Pokémon weak to {weak_type}."
+                           f" Consider adding {strong_pokemon['name']}!")
+
+            yield {
+                "id": strong_pokemon["id"],
+                "type": "pokemon",
+                "name": strong_pokemon["name"],
+                "tcg_image_url": pokemon_image_url(strong_pokemon["name"]),
+                "message": message
+            }
 
-    return recommendations
 
+def load_catalogue(db: Session):
+    """
+        Returns the Trainer and Energy cards used for recommendations, from
+        the shared catalogue snapshot (pokemon_catalogue.py), so no worker
+        process queries them. The lists are kept per catalogue version.
+        Args:
+            db (Session): The database session (unused; kept for callers).
+        Returns:
+            dict: "trainers" and "energy", each a list of (name, tcg_image_url).
+    """
 
-pokemon_with_images_cache = set()
+    snapshot = get_catalogue()
+    cached = catalogue_cache.get("cards")
+    if cached is None or cached[0] != snapshot.version:
+        cached = (snapshot.version, {"trainers": snapshot.cards("trainers"),
+                                     "energy": snapshot.cards("energy")})
+        catalogue_cache.set("cards", cached)
+    return cached[1]
 
 
 def has_valid_image(pokemon_name):
     """
         Check if a Pokémon has an image in PokémonDB.
-        Uses caching to prevent repeated slow requests.
+        Uses caching to prevent repeated slow requests; definite answers
+        (200 or 404) are cached, other statuses are retried next time.
     """
 
-    image_url = (f"https://img.pokemondb.net/artwork/large/"
-                 f"{pokemon_name.lower()}.jpg")
-
-    if pokemon_name in pokemon_with_images_cache:
-        return True
+    cached = pokemon_image_cache.get(pokemon_name)
+    if cached is not None:
+        return cached
 
-    response = requests.head(image_url, timeout=3)
-    if response.status_code == 200:
-        pokemon_with_images_cache.add(pokemon_name)
-        return True
-    return False
+    valid = probe_image(pokemon_name)
+    if valid is not None:
+        pokemon_image_cache.set(pokemon_name, valid)
+    return bool(valid)
 
 
-def fetch_pokemon_by_strength(weak_type: str):
+def probe_image(pokemon_name):
     """
-        Fetch a random Pokémon that is strong against the given 'weak_type'.
-        Ensures that only Pokémon with a valid image in PokémonDB are selected.
+        Asks PokémonDB whether it has artwork for a Pokémon.
+        Returns:
+            bool: True (200) or False (404); None for any other answer.
     """
-    strong_types = [
-        p_type for p_type, matchups in type_chart.items()
-        if weak_type in matchups["weak_to"]
-    ]
 
-    if not strong_types:
-        return {"name": "No strong Pokémon found", "id": None}
+    response = http_client.head(pokemon_image_url(pokemon_name), timeout=3,
+                                upstream="pokemondb")
+    if response.status_code in (200, 404):
+        return response.status_code == 200
+    return None
 
-    chosen_type = random.choice(strong_types)
 
-    pokeapi_url = f"https://pokeapi.co/api/v2/type/{chosen_type.lower()}/"
-    response = requests.get(pokeapi_url, timeout=5)
+def fetch_type_listing(type_name: str):
+    """
+        Fetches the Pokémon of one type from PokéAPI (cached per type).
+        Args:
+            type_name (str): A type name such as "Fire".
+        Returns:
+            list: Dicts with "name" and "id", or None if PokéAPI failed.
+    """
+
+    key = type_name.lower()
+    listing = type_listing_cache.get(key)
+    if listing is not None:
+        return listing
+
+    pokeapi_url = f"{POKEAPI_TYPE_URL}{key}/"
+    response = http_client.get(pokeapi_url, timeout=5, upstream="pokeapi")
 
     if response.status_code != 200:
-        return {"name": "No strong Pokémon found", "id": None}
+        logger.info("PokéAPI type listing returned %s for %s",
+                    response.status_code, type_name)
+        return None
 
     data = response.json()
-    all_pokemon = [
+    listing = [
         {
             "name": p["pokemon"]["name"].capitalize(),
             "id": int(p["pokemon"]["url"].split("/")[-2])
         }
         for p in data["pokemon"]
     ]
+    type_listing_cache.set(key, listing)
+    return listing
+
+
+def fetch_pokemon_by_strength(weak_type: str, db: Session = None):
+    """
+        Fetch a random Pokémon that is strong against the given 'weak_type',
+        i.e. with a type whose "strong_against" list has it (counter_types()).
+        Ensures that only Pokémon with a valid image in PokémonDB are selected.
+        With a database session, Pokémon already stored locally are looked up
+        first with a type mask query (skipping the image probe when the
+        'image_probe' job has already checked them); PokéAPI's type listing
+        of one of those types is the fallback.
+        While PokémonDB's breaker is open the image check is skipped for
+        local Pokémon; while PokéAPI's is open the last pick for the type is
+        reused instead of calling it.
+    """
+    images_available = http_client.is_available("pokemondb")
+    if db is not None:
+        local = db.execute(select(Pokemon.id, Pokemon.name, Pokemon.has_image)
+                           .where(type_filter(strong_against=weak_type),
+                                  Pokemon.has_image.isnot(False))).all()
+        for pokemon_id, name, has_image in random.sample(local, len(local)):
+            name = name.capitalize()
+            if has_image or not images_available or has_valid_image(name):
+                return _remember_pick(weak_type, {"name": name, "id": pokemon_id})
+
+    if not images_available or not http_client.is_available("pokeapi"):
+        cached = strength_picks_cache.get(weak_type)
+        return dict(cached) if cached else {"name": "No strong Pokémon found", "id": None}
+
+    strong_types = counter_types(weak_type)
+
+    if not strong_types:
+        return {"name": "No strong Pokémon found", "id": None}
+
+    chosen_type = random.choice(strong_types)
+
+    all_pokemon = fetch_type_listing(chosen_type)
+    if all_pokemon is None:
+        cached = strength_picks_cache.get(weak_type)
+        return dict(cached) if cached else {"name": "No strong Pokémon found", "id": None}
 
     valid_pokemon = [p for p in all_pokemon if has_valid_image(p["name"])]
 
@@ -199,4 +300,9 @@ def fetch_pokemon_by_strength(weak_type: str):
         return {"name": "Garchomp", "id": 445}
 
     selected_pokemon = random.choice(valid_pokemon)
-    return selected_pokemon
+    return _remember_pick(weak_type, dict(selected_pokemon))
+
+
+def _remember_pick(weak_type: str, pick: dict):
+    strength_picks_cache.set(weak_type, dict(pick))
+    return pick
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr, constr
-from typing import List, Optional
+from pydantic import BaseModel, EmailStr, constr, conint, conlist
+from typing import Any, Dict, List, Optional
 
 """
     This module defines Pydantic models (schemas) for user registration, login,
@@ -8,6 +8,9 @@ from typing import List, Optional
 """
 
 
+POKEMON_BATCH_POST_MAX = 1000
+
+
 class UserCreate(BaseModel):
     """
         Schema for creating a new user account.
@@ -164,3 +167,71 @@ class EnergyOut(EnergyBase):
 
     class Config:
         from_attributes = True
+
+
+class OptimizeRequest(BaseModel):
+    """
+        Schema for the deck optimizer's constraints.
+
+        Attributes:
+            size (int): Number of Pokémon in the suggested deck.
+            required_pokemon_ids (List[int]): Pokémon that must be in the deck.
+            allowed_types (List[str]): If given, only Pokémon whose types are
+                all in this list are considered.
+            max_energy_types (int): Maximum number of different Energy types
+                the deck may need.
+            exclude_pokemon_ids (List[int]): Pokémon that must not be used.
+            results (int): Number of alternative decks to return.
+            beam_width (int): Partial decks kept per search step.
+            time_budget_ms (int): Search time budget in milliseconds.
+    """
+
+    size: conint(ge=1, le=60) = 6
+    required_pokemon_ids: List[int] = []
+    allowed_types: Optional[List[str]] = None
+    max_energy_types: Optional[conint(ge=1, le=11)] = None
+    exclude_pokemon_ids: List[int] = []
+    results: conint(ge=1, le=10) = 3
+    beam_width: conint(ge=1, le=1024) = 64
+    time_budget_ms: conint(ge=10, le=10000) = 500
+
+
+class JobCreate(BaseModel):
+    """
+        Schema for enqueueing a background job.
+
+        Attributes:
+            type (str): A registered job type (see jobs.JOB_TYPES).
+            payload (dict): Arguments for the job handler.
+            dedupe_key (str): If given (up to 200 characters), an active job
+                with the same key is returned instead of enqueueing a new one.
+            delay_seconds (int): Do not run before this many seconds.
+    """
+
+    type: constr(min_length=1, max_length=64)
+    payload: Dict[str, Any] = {}
+    # Stored with a "user:<id>:" prefix in a 255-character column.
+    dedupe_key: Optional[constr(max_length=200)] = None
+    delay_seconds: conint(ge=0, le=86400) = 0
+
+
+class PokemonBackfillPayload(BaseModel):
+    """
+        Schema for the payload of a "pokemon_backfill" job.
+
+        Attributes:
+            ids (List[int]): Pokémon ids to store (1 to POKEMON_BATCH_POST_MAX).
+    """
+
+    ids: conlist(conint(ge=1), min_length=1, max_length=POKEMON_BATCH_POST_MAX)
+
+
+class PokemonBatchRequest(BaseModel):
+    """
+        Schema for fetching many Pokémon at once (POST /pokemon).
+
+        Attributes:
+            ids (List[int]): Pokémon ids; the response keeps their order.
+    """
+
+    ids: List[int]
@@ -1,23 +1,18 @@
-import requests
-
-POKEAPI_BASE_URL = "https://pokeapi.co/api/v2/pokemon"
+from pokemon_provider import fetch_pokemon_data as fetch_pokemon_record
 
 
 def fetch_pokemon_data(pokemon_name: str):
-    """Fetch Pokémon data from PokéAPI."""
-    url = f"{POKEAPI_BASE_URL}/{pokemon_name.lower()}"
-    response = requests.get(url)
+    """Fetch Pokémon data (raw stats and base experience) through the Pokémon provider."""
+    record = fetch_pokemon_record(pokemon_name)
 
-    if response.status_code != 200:
+    if record is None:
         return None
 
-    data = response.json()
-
     return {
-        "id": data["id"],
-        "name": data["name"],
-        "types": [t["type"]["name"] for t in data["types"]],
-        "abilities": [a["ability"]["name"] for a in data["abilities"]],
-        "base_experience": data["base_experience"],
-        "stats": {stat["stat"]["name"]: stat["base_stat"] for stat in data["stats"]},
+        "id": record["id"],
+        "name": record["name"],
+        "types": [t.lower() for t in record["types"]],
+        "abilities": [a.lower() for a in record["abilities"]],
+        "base_experience": record["base_experience"],
+        "stats": record["stats"],
     }
@@ -0,0 +1,378 @@
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+"""
+    This module is a local stand-in for the third-party services the backend
+    talks to: PokéAPI, the Pokémon TCG API, and the PokémonDB / TCG image hosts.
+    It replays the recorded corpus in 'fixtures/' so tests, CI and load tests
+    can run without network access and without spending anyone's API quota.
+
+    Latency (with jitter) and error injection are configurable, so slow or
+    flaky upstreams can be reproduced on demand. Point the backend at it with:
+
+        POKEAPI_BASE_URL=http://127.0.0.1:8765/api/v2
+        TCG_API_BASE_URL=http://127.0.0.1:8765/v2
+        POKEMON_IMAGE_BASE_URL=http://127.0.0.1:8765/artwork/large
+
+    Usage:
+        python stub_server.py serve --port 8765 --latency-ms 40 --error-rate 0.01
+        python stub_server.py record --pokemon 1 4 7 25
+"""
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+POKEAPI_LIVE_URL = "https://pokeapi.co/api/v2"
+TCG_LIVE_URL = "https://api.pokemontcg.io/v2"
+TCG_IMAGES_LIVE_URL = "https://images.pokemontcg.io"
+
+
+class FixtureCorpus:
+    """
+        Loads the recorded fixtures from disk and answers lookups against them.
+    """
+
+    def __init__(self, fixtures_dir: str = FIXTURES_DIR):
+        self.fixtures_dir = fixtures_dir
+        self.pokemon = {}
+        self.pokemon_by_name = {}
+        self.types = {}
+        self.types_by_id = {}
+        self.tcg_pages = {}
+
+        pokemon_dir = os.path.join(fixtures_dir, "pokeapi", "pokemon")
+        for file_name in os.listdir(pokemon_dir):
+            with open(os.path.join(pokemon_dir, file_name), encoding="utf-8") as f:
+                doc = json.load(f)
+            self.pokemon[doc["id"]] = doc
+            self.pokemon_by_name[doc["name"]] = doc
+
+        type_dir = os.path.join(fixtures_dir, "pokeapi", "type")
+        for file_name in os.listdir(type_dir):
+            with open(os.path.join(type_dir, file_name), encoding="utf-8") as f:
+                doc = json.load(f)
+            self.types[doc["name"]] = doc
+            self.types_by_id[doc["id"]] = doc
+
+        for supertype in ("trainer", "energy"):
+            with open(os.path.join(fixtures_dir, "tcg", f"{supertype}.json"),
+                      encoding="utf-8") as f:
+                self.tcg_pages[supertype] = json.load(f)["data"]
+
+        with open(os.path.join(fixtures_dir, "images", "placeholder.jpg"), "rb") as f:
+            self.placeholder_image = f.read()
+
+    def find_pokemon(self, key: str):
+        key = key.lower()
+        if key.isdigit():
+            return self.pokemon.get(int(key))
+        return self.pokemon_by_name.get(key)
+
+    def find_type(self, key: str):
+        key = key.lower()
+        if key.isdigit():
+            return self.types_by_id.get(int(key))
+        return self.types.get(key)
+
+    def search_cards(self, query: str):
+        """
+            Applies a (small) subset of the TCG API query syntax:
+            "supertype:Trainer", "supertype:Energy" and "name:<text>", where
+            "*" in a name acts as a wildcard.
+        """
+
+        cards = self.tcg_pages["trainer"] + self.tcg_pages["energy"]
+        for clause in query.split():
+            field, _, value = clause.partition(":")
+            value = value.strip('"').lower()
+            if field == "supertype":
+                cards = [c for c in cards if c["supertype"].lower() == value]
+            elif field == "name":
+                needle = value.replace("*", "")
+                if value.startswith("*") or value.endswith("*"):
+                    cards = [c for c in cards if needle in c["name"].lower()]
+                else:
+                    cards = [c for c in cards if c["name"].lower() == needle]
+        return cards
+
+
+class StubUpstreamServer:
+    """
+        A threaded HTTP server that replays the fixture corpus.
+
+        Args:
+            host (str): Interface to bind.
+            port (int): Port to bind; 0 picks a free port.
+            latency_ms (float): Delay added to every response.
+            jitter_ms (float): Random +/- spread around latency_ms.
+            error_rate (float): Fraction of requests answered with error_status.
+            error_status (int): Status code used for injected errors.
+            retry_after (int, optional): Retry-After seconds sent with injected errors.
+            seed (int, optional): Seed for reproducible latency and errors.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, jitter_ms=0.0,
+                 error_rate=0.0, error_status=503, retry_after=None, seed=None,
+                 fixtures_dir=FIXTURES_DIR):
+        self.corpus = FixtureCorpus(fixtures_dir)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._thread = None
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self):
+        """
+            Returns the environment variables that point the backend at this server.
+        """
+
+        return {
+            "POKEAPI_BASE_URL": f"{self.url}/api/v2",
+            "TCG_API_BASE_URL": f"{self.url}/v2",
+            "POKEMON_IMAGE_BASE_URL": f"{self.url}/artwork/large",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def reset_stats(self):
+        with self._lock:
+            self._counts.clear()
+
+    def _count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def _delay_and_maybe_fail(self):
+        with self._lock:
+            delay = self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)
+            fail = self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay / 1000)
+        return fail
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                self._dispatch(send_body=False)
+
+            def do_GET(self):
+                self._dispatch(send_body=True)
+
+            def _send(self, status, body=b"", content_type="application/json",
+                      headers=None, send_body=True):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(body)
+
+            def _send_json(self, doc, send_body):
+                base = f"http://{self.headers.get('Host', 'localhost')}"
+                body = json.dumps(doc)
+                body = body.replace(POKEAPI_LIVE_URL, f"{base}/api/v2")
+                body = body.replace(TCG_IMAGES_LIVE_URL, f"{base}/tcg-images")
+                self._send(200, body.encode("utf-8"), send_body=send_body)
+
+            def _not_found(self, send_body):
+                self._send(404, b'{"detail": "Not found"}', send_body=send_body)
+
+            def _dispatch(self, send_body):
+                parsed = urllib.parse.urlsplit(self.path)
+                parts = [p for p in parsed.path.split("/") if p]
+                params = urllib.parse.parse_qs(parsed.query)
+
+                if parts == ["__stats"]:
+                    return self._send_json(server.stats(), send_body)
+                if parts == ["__reset"]:
+                    server.reset_stats()
+                    return self._send_json({"reset": True}, send_body)
+
+                kind = _route_kind(parts)
+                server._count(kind)
+                if server._delay_and_maybe_fail():
+                    server._count("errors")
+                    headers = {}
+                    if server.retry_after is not None:
+                        headers["Retry-After"] = str(server.retry_after)
+                    return self._send(server.error_status, b'{"detail": "Injected error"}',
+                                      headers=headers, send_body=send_body)
+
+                corpus = server.corpus
+                if kind == "pokeapi.pokemon" and len(parts) == 4:
+                    doc = corpus.find_pokemon(parts[3])
+                    return (self._send_json(doc, send_body) if doc
+                            else self._not_found(send_body))
+                if kind == "pokeapi.type" and len(parts) == 4:
+                    doc = corpus.find_type(parts[3])
+                    return (self._send_json(doc, send_body) if doc
+                            else self._not_found(send_body))
+                if kind == "tcg.cards":
+                    cards = corpus.search_cards(params.get("q", [""])[0])
+                    page_size = int(params.get("pageSize", ["250"])[0])
+                    page = int(params.get("page", ["1"])[0])
+                    chunk = cards[(page - 1) * page_size:page * page_size]
+                    return self._send_json({"data": chunk, "page": page,
+                                            "pageSize": page_size, "count": len(chunk),
+                                            "totalCount": len(cards)}, send_body)
+                if kind == "images.pokemondb":
+                    name = parts[-1].rsplit(".", 1)[0]
+                    if corpus.find_pokemon(name):
+                        return self._send(200, corpus.placeholder_image, "image/jpeg",
+                                          send_body=send_body)
+                    return self._not_found(send_body)
+                if kind == "images.tcg":
+                    return self._send(200, corpus.placeholder_image, "image/png",
+                                      send_body=send_body)
+                return self._not_found(send_body)
+
+        return Handler
+
+
+def _route_kind(parts):
+    if parts[:3] == ["api", "v2", "pokemon"]:
+        return "pokeapi.pokemon"
+    if parts[:3] == ["api", "v2", "type"]:
+        return "pokeapi.type"
+    if parts[:2] == ["v2", "cards"]:
+        return "tcg.cards"
+    if parts[:2] == ["artwork", "large"]:
+        return "images.pokemondb"
+    if parts[:1] == ["tcg-images"]:
+        return "images.tcg"
+    return "other"
+
+
+def record_fixtures(pokemon_ids, fixtures_dir: str = FIXTURES_DIR, api_key: str = None):
+    """
+        Refreshes the fixture corpus from the live APIs. Type listings are
+        trimmed to the recorded Pokémon so every reference in the corpus
+        resolves offline.
+        Args:
+            pokemon_ids (list): PokéAPI ids to record.
+            fixtures_dir (str): Where to write the corpus.
+            api_key (str, optional): Pokémon TCG API key.
+    """
+
+    import requests
+
+    pokemon_dir = os.path.join(fixtures_dir, "pokeapi", "pokemon")
+    type_dir = os.path.join(fixtures_dir, "pokeapi", "type")
+    tcg_dir = os.path.join(fixtures_dir, "tcg")
+    for directory in (pokemon_dir, type_dir, tcg_dir):
+        os.makedirs(directory, exist_ok=True)
+
+    recorded = {}
+    for pokemon_id in pokemon_ids:
+        response = requests.get(f"{POKEAPI_LIVE_URL}/pokemon/{pokemon_id}", timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        doc = {key: data[key] for key in ("id", "name", "base_experience", "order",
+                                          "types", "abilities", "moves", "stats")}
+        doc["sprites"] = {"front_default": data["sprites"]["front_default"]}
+        recorded[doc["name"]] = doc
+        with open(os.path.join(pokemon_dir, f"{doc['id']}.json"), "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=1)
+
+    response = requests.get(f"{POKEAPI_LIVE_URL}/type?limit=100", timeout=10)
+    response.raise_for_status()
+    for entry in response.json()["results"]:
+        type_response = requests.get(entry["url"], timeout=10)
+        type_response.raise_for_status()
+        data = type_response.json()
+        if data["name"] in ("unknown", "shadow", "stellar"):
+            continue
+        doc = {"id": data["id"], "name": data["name"],
+               "pokemon": [p for p in data["pokemon"] if p["pokemon"]["name"] in recorded]}
+        with open(os.path.join(type_dir, f"{doc['name']}.json"), "w", encoding="utf-8") as f:
+            json.dump(doc, f, indent=1)
+
+    headers = {"X-Api-Key": api_key} if api_key else {}
+    for supertype in ("Trainer", "Energy"):
+        response = requests.get(f"{TCG_LIVE_URL}/cards",
+                                params={"q": f"supertype:{supertype}", "pageSize": 250},
+                                headers=headers, timeout=30)
+        response.raise_for_status()
+        with open(os.path.join(tcg_dir, f"{supertype.lower()}.json"), "w",
+                  encoding="utf-8") as f:
+            json.dump(response.json(), f, indent=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline stand-in for PokéAPI and the TCG API.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = subparsers.add_parser("serve", help="Replay the fixture corpus over HTTP.")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8765)
+    serve_parser.add_argument("--latency-ms", type=float, default=0.0)
+    serve_parser.add_argument("--jitter-ms", type=float, default=0.0)
+    serve_parser.add_argument("--error-rate", type=float, default=0.0)
+    serve_parser.add_argument("--error-status", type=int, default=503)
+    serve_parser.add_argument("--retry-after", type=int, default=None)
+    serve_parser.add_argument("--seed", type=int, default=None)
+
+    record_parser = subparsers.add_parser("record", help="Refresh fixtures from the live APIs.")
+    record_parser.add_argument("--pokemon", type=int, nargs="+", required=True)
+    record_parser.add_argument("--api-key", default=os.getenv("TCG_API_KEY"))
+
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record_fixtures(args.pokemon, api_key=args.api_key)
+        return
+
+    server = StubUpstreamServer(args.host, args.port, args.latency_ms, args.jitter_ms,
+                                args.error_rate, args.error_status, args.retry_after,
+                                args.seed)
+    print(f"Stub upstreams listening on {server.url}")
+    for name, value in server.env().items():
+        print(f"  {name}={value}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -9,10 +9,16 @@ from schemas import (
     TrainerBase, EnergyBase
 )
 from auth import oauth2_scheme, decode_token
+from deck_routes import get_read_db
 from utils import fetch_trainer_data, fetch_energy_data
 from utils import TCG_API_URL, TCG_API_HEADERS
+from recommendations import catalogue_cache
+from pokemon_catalogue import refresh_catalogue
 from typing import List
-import requests
+import tcg_scheduler
+import jobs
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 
 
 """
@@ -43,6 +49,17 @@ def get_db():
         db.close()
 
 
+def _upstream_error(response, detail: str) -> HTTPException:
+    """
+        Turns a failed TCG API response into an HTTPException with the same
+        status, passing Retry-After on so clients know when to come back.
+    """
+
+    retry_after = response.headers.get("Retry-After")
+    headers = {"Retry-After": retry_after} if retry_after else None
+    return HTTPException(status_code=response.status_code, detail=detail, headers=headers)
+
+
 @router.get("/external/trainers", response_model=List[TrainerBase])
 def get_external_trainers(trainer_name: str = ""):
     """
@@ -60,10 +77,9 @@ def get_external_trainers(trainer_name: str = ""):
 
     query = "supertype:Trainer"
     url = f"{TCG_API_URL}?q={query}&pageSize=250"
-    response = requests.get(url, headers=TCG_API_HEADERS)
+    response = tcg_scheduler.get(url, headers=TCG_API_HEADERS)
     if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code,
-                            detail="Error fetching trainer data.")
+        raise _upstream_error(response, "Error fetching trainer data.")
     data = response.json()
     if "data" not in data or not data["data"]:
         raise HTTPException(status_code=404, detail="No trainer cards found.")
@@ -106,10 +122,9 @@ def get_external_energy(energy_type: str = ""):
 
     query = "supertype:Energy"
     url = f"{TCG_API_URL}?q={query}&pageSize=250"
-    response = requests.get(url, headers=TCG_API_HEADERS)
+    response = tcg_scheduler.get(url, headers=TCG_API_HEADERS)
     if response.status_code != 200:
-        raise HTTPException(status_code=response.status_code,
-                            detail="Error fetching energy data.")
+        raise _upstream_error(response, "Error fetching energy data.")
     data = response.json()
     if "data" not in data or not data["data"]:
         raise HTTPException(status_code=404, detail="No energy cards found.")
@@ -136,19 +151,25 @@ def get_external_energy(energy_type: str = ""):
 
 
 @router.post("/external/cache")
-def cache_tcg_data(db: Session = Depends(get_db)):
+def cache_tcg_data(db: Session = Depends(get_db), background: bool = False):
     """
     Fetches Trainer and Energy data from the TCG API and upserts them into
      the database.
     This endpoint can be called periodically to refresh your local cache.
+    With ?background=true the sync is queued as a 'tcg_sync' job for
+    worker.py instead (202, at most one queued or running at a time).
     """
+    if background:
+        job = jobs.enqueue(db, "tcg_sync", dedupe_key="tcg_sync")
+        return JSONResponse(status_code=202, content=jsonable_encoder(jobs.job_to_dict(job)))
+
     # --- Cache Trainers ---
     query = "supertype:Trainer"
     url = f"{TCG_API_URL}?q={query}&pageSize=250"
-    trainer_response = requests.get(url, headers=TCG_API_HEADERS)
+    trainer_response = tcg_scheduler.get(url, priority=tcg_scheduler.BACKGROUND,
+                                         headers=TCG_API_HEADERS)
     if trainer_response.status_code != 200:
-        raise HTTPException(status_code=trainer_response.status_code,
-                            detail="Error fetching trainer data.")
+        raise _upstream_error(trainer_response, "Error fetching trainer data.")
     trainer_data = trainer_response.json()
     trainers = []
     if "data" in trainer_data:
@@ -181,10 +202,10 @@ def cache_tcg_data(db: Session = Depends(get_db)):
     # --- Cache Energy Cards ---
     query = "supertype:Energy"
     url = f"{TCG_API_URL}?q={query}&pageSize=250"
-    energy_response = requests.get(url, headers=TCG_API_HEADERS)
+    energy_response = tcg_scheduler.get(url, priority=tcg_scheduler.BACKGROUND,
+                                        headers=TCG_API_HEADERS)
     if energy_response.status_code != 200:
-        raise HTTPException(status_code=energy_response.status_code,
-                            detail="Error fetching energy data.")
+        raise _upstream_error(energy_response, "Error fetching energy data.")
     energy_data = energy_response.json()
     energies = []
     if "data" in energy_data:
@@ -214,6 +235,9 @@ def cache_tcg_data(db: Session = Depends(get_db)):
             new_energy = Energy(**energy)
             db.add(new_energy)
     db.commit()
+    catalogue_cache.clear()
+    # Publish the new cards to every worker process at once.
+    refresh_catalogue(db)
 
     return {
         "message": "TCG data cached successfully",
@@ -223,7 +247,7 @@ def cache_tcg_data(db: Session = Depends(get_db)):
 
 
 @router.get("/cached/energy", response_model=List[EnergyBase])
-def get_cached_energy(db: Session = Depends(get_db)):
+def get_cached_energy(db: Session = Depends(get_read_db)):
     """
     Retrieves energy cards from the local database cache.
     This endpoint returns the energy cards that have been previously cached
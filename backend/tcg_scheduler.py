@@ -0,0 +1,262 @@
+import email.utils
+import heapq
+import itertools
+import json
+import math
+import os
+import threading
+import time
+import requests
+import http_client
+from profiling import METRICS
+
+"""
+    This module schedules every call to the Pokémon TCG API, so all users
+    share the API key's quota instead of racing for it.
+
+      - A token bucket sized to the key's quota (TCG_REQUESTS_PER_MINUTE,
+        bursts of up to TCG_BURST) decides when the next call may start.
+      - Waiting calls are served by priority: INTERACTIVE (a user is waiting
+        for the response) always goes before BACKGROUND (catalogue syncs).
+        A call that cannot start within its wait budget gets a synthesised
+        429 response with a Retry-After header, which the callers already
+        handle like any other upstream error.
+      - Identical GETs of the same priority that are in flight at the same
+        time are coalesced into one upstream call.
+      - A 429/503 with Retry-After pauses the whole bucket for that long, and
+        the call is retried once if the pause fits its wait budget.
+
+    Queue depth, throttled and rejected calls show up in GET /metrics.
+"""
+
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+TCG_REQUESTS_PER_MINUTE = float(os.getenv("TCG_REQUESTS_PER_MINUTE", "30"))
+TCG_BURST = int(os.getenv("TCG_BURST", "30"))
+TCG_MAX_WAIT_SECONDS = float(os.getenv("TCG_MAX_WAIT_SECONDS", "5"))
+TCG_BACKGROUND_MAX_WAIT_SECONDS = float(os.getenv("TCG_BACKGROUND_MAX_WAIT_SECONDS", "120"))
+
+METRICS.describe("tcg_scheduler_queue_depth", "TCG API calls waiting for a token, by priority.")
+METRICS.describe("tcg_scheduler_throttled_total", "TCG API calls that had to wait, by priority.")
+METRICS.describe("tcg_scheduler_rejected_total",
+                 "TCG API calls answered with 429 locally, by priority.")
+METRICS.describe("tcg_scheduler_coalesced_total", "TCG API calls served by an identical call.")
+METRICS.describe("tcg_scheduler_retry_after_total", "Retry-After pauses from the TCG API.")
+METRICS.describe("tcg_scheduler_wait_seconds", "Time TCG API calls waited for a token.")
+
+
+def parse_retry_after(value):
+    """
+        Returns the seconds a Retry-After header asks for (delta-seconds or
+        an HTTP date), or None if it is missing or malformed.
+    """
+
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def throttled_response(url: str, retry_after: float):
+    """
+        Builds the 429 response returned when a call cannot be scheduled in
+        time.
+    """
+
+    response = requests.Response()
+    response.status_code = 429
+    response.url = url
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    response.headers["Content-Type"] = "application/json"
+    response._content = json.dumps({"detail": "TCG API quota exhausted"}).encode("utf-8")
+    return response
+
+
+class _Call:
+    __slots__ = ("done", "response", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class TCGScheduler:
+    """
+        Token bucket plus priority queue in front of the TCG API.
+
+        Args:
+            requests_per_minute (float): Sustained rate of the key's quota.
+            burst (int): Bucket capacity (calls that may start back to back).
+            max_wait (float): Wait budget of INTERACTIVE calls, in seconds.
+            background_max_wait (float): Wait budget of BACKGROUND calls.
+    """
+
+    def __init__(self, requests_per_minute: float = TCG_REQUESTS_PER_MINUTE,
+                 burst: int = TCG_BURST, max_wait: float = TCG_MAX_WAIT_SECONDS,
+                 background_max_wait: float = TCG_BACKGROUND_MAX_WAIT_SECONDS):
+        self.rate = requests_per_minute / 60.0
+        self.burst = max(1, burst)
+        self.max_wait = {INTERACTIVE: max_wait, BACKGROUND: background_max_wait}
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._queue = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _report_depth(self):
+        for priority, name in PRIORITY_NAMES.items():
+            METRICS.set("tcg_scheduler_queue_depth", {"priority": name},
+                        sum(1 for entry in self._queue if entry[0] == priority))
+
+    def _next_start(self, now: float) -> float:
+        wait = (1 - self._tokens) / self.rate if self.rate > 0 else math.inf
+        return max(self._blocked_until - now, wait, 0.0)
+
+    def acquire(self, priority: int = INTERACTIVE, deadline: float = None) -> bool:
+        """
+            Waits for a token, behind every waiting call of a higher (lower
+            numbered) priority and every earlier call of the same priority.
+            Args:
+                priority (int): INTERACTIVE or BACKGROUND.
+                deadline (float, optional): time.monotonic() by which the call
+                    must start; defaults to now plus the priority's budget.
+            Returns:
+                bool: True if a token was taken, False if the deadline passed.
+        """
+
+        start = time.monotonic()
+        if deadline is None:
+            deadline = start + self.max_wait[priority]
+        entry = (priority, next(self._sequence))
+        labels = {"priority": PRIORITY_NAMES[priority]}
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            self._report_depth()
+            waited = False
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    is_next = self._queue[0] == entry
+                    if is_next and now >= self._blocked_until and self._tokens >= 1:
+                        self._tokens -= 1
+                        return True
+                    if now >= deadline:
+                        METRICS.inc("tcg_scheduler_rejected_total", labels)
+                        return False
+                    if not waited:
+                        waited = True
+                        METRICS.inc("tcg_scheduler_throttled_total", labels)
+                    timeout = deadline - now
+                    if is_next:
+                        timeout = min(timeout, self._next_start(now))
+                    self._cond.wait(max(timeout, 0.001))
+            finally:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._report_depth()
+                self._cond.notify_all()
+                METRICS.observe("tcg_scheduler_wait_seconds", time.monotonic() - start, labels)
+
+    def pause(self, seconds: float):
+        """
+            Stops every call from starting for the given number of seconds
+            (the upstream asked for it with Retry-After).
+        """
+
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = min(self._tokens, 0.0)
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._cond.notify_all()
+        METRICS.inc("tcg_scheduler_retry_after_total")
+
+    def retry_in(self) -> float:
+        """
+            Returns the seconds until the next call could start.
+        """
+
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return self._next_start(now)
+
+    def _send(self, url: str, priority: int, kwargs):
+        deadline = time.monotonic() + self.max_wait[priority]
+        for attempt in range(2):
+            if not self.acquire(priority, deadline):
+                return throttled_response(url, self.retry_in())
+            response = http_client.get(url, upstream="tcg", **kwargs)
+            if response.status_code not in (429, 503) or attempt:
+                return response
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is None:
+                return response
+            self.pause(retry_after)
+            if time.monotonic() + retry_after > deadline:
+                return response
+        return response
+
+    def get(self, url: str, priority: int = INTERACTIVE, **kwargs):
+        """
+            Sends a GET to the TCG API once the quota allows it.
+            Args:
+                url (str): The full URL.
+                priority (int): INTERACTIVE or BACKGROUND.
+                **kwargs: Passed through to http_client.get (headers,
+                    params, timeout, ...).
+            Returns:
+                Response: The upstream response, or a local 429 response
+                when the call could not start within its wait budget.
+                Coalesced callers share the same Response object.
+        """
+
+        key = (priority, url, repr(sorted((kwargs.get("params") or {}).items())))
+        with self._inflight_lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+        if not leader:
+            METRICS.inc("tcg_scheduler_coalesced_total")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.response
+
+        try:
+            call.response = self._send(url, priority, kwargs)
+            return call.response
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+            call.done.set()
+
+
+scheduler = TCGScheduler()
+
+
+def get(url: str, priority: int = INTERACTIVE, **kwargs):
+    return scheduler.get(url, priority, **kwargs)
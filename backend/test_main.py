@@ -1,10 +1,941 @@
+import os
+import tempfile
+
+# A fresh database per run, so schema changes never meet a stale test file.
+os.environ.setdefault("DATABASE_URL",
+                      f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'deck_builder_test.db')}")
+os.environ.setdefault("CATALOGUE_DIR", os.path.join(tempfile.mkdtemp(), "catalogue"))
+
+import pytest
+from benchmarks.startup import measure_once
 from fastapi.testclient import TestClient
 from main import app  # Import your FastAPI app
+from stub_server import StubUpstreamServer
+import cache
+import http_client
+import recommendations
+import tcg_routes
+import utils
+import pokemon_provider
 
 client = TestClient(app)
 
 
+@pytest.fixture
+def stub_upstreams(monkeypatch):
+    server = StubUpstreamServer(seed=1).start()
+    env = server.env()
+    monkeypatch.setattr(utils, "POKEAPI_URL", f"{env['POKEAPI_BASE_URL']}/pokemon/")
+    monkeypatch.setattr(utils, "TCG_API_URL", f"{env['TCG_API_BASE_URL']}/cards")
+    monkeypatch.setattr(tcg_routes, "TCG_API_URL", f"{env['TCG_API_BASE_URL']}/cards")
+    monkeypatch.setattr(utils, "POKEMON_IMAGE_BASE_URL", env["POKEMON_IMAGE_BASE_URL"])
+    monkeypatch.setattr(recommendations, "POKEAPI_TYPE_URL", f"{env['POKEAPI_BASE_URL']}/type/")
+    cache.clear_all()
+    http_client.reset_breakers()
+    yield server
+    server.stop()
+    cache.clear_all()
+    http_client.reset_breakers()
+
+
 def test_root():
     response = client.get("/")
     assert response.status_code == 200
     assert response.json() == {"message": "Welcome to the Pokémon Deck Builder!"}
+
+
+def test_fetch_pokemon_data_offline(stub_upstreams):
+    data = pokemon_provider.fetch_pokemon_data("Pikachu")
+    assert data["id"] == 25
+    assert data["types"] == ["Electric"]
+    assert "Ground" in data["weaknesses"]
+    assert data["image_url"].startswith(stub_upstreams.url)
+    assert {t["name"] for t in utils.fetch_trainer_data("potion")} == {"Potion", "Super Potion"}
+    assert stub_upstreams.stats() == {"pokeapi.pokemon": 1, "tcg.cards": 1}
+
+
+def test_card_bodies_are_only_logged_at_debug(stub_upstreams, monkeypatch, caplog):
+    import logging
+
+    bodies = []
+    monkeypatch.setattr(utils, "truncate", lambda value, limit: bodies.append(limit) or "body")
+    caplog.set_level(logging.INFO, logger="utils")
+    assert utils.fetch_trainer_data("potion")
+    assert bodies == []
+
+    with caplog.at_level(logging.DEBUG, logger="utils"):
+        assert utils.fetch_trainer_data("potion")
+    assert bodies == [500]
+    assert [record.body for record in caplog.records if record.name == "utils"] == ["body"]
+
+
+def test_stub_error_injection(stub_upstreams):
+    stub_upstreams.error_rate = 1.0
+    assert pokemon_provider.fetch_pokemon_data(25) is None
+    assert stub_upstreams.stats()["errors"] == 1
+
+
+def test_import_has_no_database_side_effects():
+    run = measure_once(dict(os.environ, LOG_LEVEL="WARNING", WARMUP_ENABLED="0"))
+    assert run["status"] == 200
+    assert run["engine_at_import"] is False
+
+
+def test_warmup_fills_caches(stub_upstreams):
+    from warmup import Warmup
+
+    warm = Warmup(concurrency=4, top_pokemon=5, max_image_probes=20)
+    warm.run()
+    result = warm.report()
+    assert result["ready"]
+    assert result["stages"]["type_listings"] == {"ok": 18, "failed": 0, "skipped": 0}
+    assert result["stages"]["images"]["ok"] == 20
+    calls = stub_upstreams.stats()["pokeapi.type"]
+    recommendations.fetch_pokemon_by_strength("Water")
+    assert stub_upstreams.stats()["pokeapi.type"] == calls
+    assert cache.cache_stats()["type_listings"]["hits"] >= 1
+
+
+def test_ndjson_export_import_round_trip(stub_upstreams, deck_user, monkeypatch):
+    import json
+    import ndjson_io
+    from sqlalchemy.exc import IntegrityError
+
+    assert client.post("/tcg/external/cache").status_code == 200
+    exported = client.get("/export/catalogue/trainers")
+    assert exported.headers["content-type"].startswith("application/x-ndjson")
+    lines = exported.text.splitlines()
+    assert len(lines) >= 3
+    assert client.get("/export/catalogue/users").status_code == 404
+
+    batches = []
+    insert_rows_batched = ndjson_io.insert_rows_batched
+
+    def small_batches(connection, table, rows):
+        count = insert_rows_batched(connection, table, rows, batch_size=2)
+        batches.append(count)
+        return count
+
+    monkeypatch.setattr(ndjson_io, "insert_rows_batched", small_batches)
+    # Without truncate the existing ids clash; the transaction rolls back.
+    with pytest.raises(IntegrityError):
+        ndjson_io.import_ndjson("trainers", lines)
+    assert client.get("/export/catalogue/trainers").text == exported.text
+
+    assert ndjson_io.import_ndjson("trainers", lines, truncate=True) == len(lines)
+    assert batches == [len(lines)]
+    assert client.get("/export/catalogue/trainers").text == exported.text
+
+    trainer = json.loads(lines[0])
+    client.post("/deck/", headers=deck_user, json={
+        "pokemon_ids": [4], "trainer_names": [trainer["name"]], "energy_types": []})
+    deck = [json.loads(line) for line in
+            client.get("/export/deck", headers=deck_user).text.splitlines()]
+    assert {"card_type": "trainer", "tcg_id": trainer["tcg_id"], "name": trainer["name"]} in deck
+    assert {"card_type": "pokemon", "pokemon_id": 4} in deck
+
+    # COPY reads only an unquoted empty field as NULL.
+    stream = ndjson_io._CsvStream(
+        [{"id": 1, "name": "\\N", "set": "", "rules": None, "data": ["a \"b\""]}],
+        ["id", "name", "set", "rules", "data"], {"data"})
+    assert stream.read() == b'"1","\\N","",,"[""a \\""b\\""""]"\n'
+
+
+def test_server_timing_header_and_metrics(stub_upstreams, deck_user):
+    import re
+
+    def counter(text, name, status=',status="200"'):
+        pattern = rf'^{name}{{method="GET",route="/deck/summary"{status}}} (\S+)$'
+        found = re.search(pattern, text, re.M)
+        return float(found.group(1)) if found else 0.0
+
+    client.post("/deck/", headers=deck_user,
+                json={"pokemon_ids": [25], "trainer_names": [], "energy_types": []})
+    before = client.get("/metrics").text
+    response = client.get("/deck/summary", headers=deck_user)
+    assert response.status_code == 200
+
+    parts = response.headers["Server-Timing"].split(", ")
+    assert all(re.fullmatch(r'[\w-]+;dur=\d+\.\d(;desc="\d+ \w+")?', part) for part in parts)
+    assert re.fullmatch(r'db;dur=\d+\.\d;desc="[1-9]\d* queries"', parts[0])
+    assert parts[-1].startswith("total;dur=")
+
+    after = client.get("/metrics")
+    assert after.headers["content-type"].startswith("text/plain")
+    assert "# TYPE http_requests_total counter" in after.text
+    assert counter(after.text, "http_requests_total") == counter(before, "http_requests_total") + 1
+    assert (counter(after.text, "http_request_duration_seconds_count", "")
+            == counter(before, "http_request_duration_seconds_count", "") + 1)
+    assert counter(after.text, "db_queries_total", "") > counter(before, "db_queries_total", "")
+
+
+def test_failed_queries_leave_no_stale_timings():
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from database import get_engine
+    import profiling
+
+    profile = profiling.RequestProfile()
+    token = profiling._current_profile.set(profile)
+    try:
+        with get_engine().connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            conn.execute(text("SELECT 1"))
+            assert "profiling_query_start" not in conn.info
+    finally:
+        profiling._current_profile.reset(token)
+    assert [name for category, name, _ in profile.spans if category == "db"] == ["query"]
+
+
+def test_deck_analytics_batch_matches_single_deck():
+    from types import SimpleNamespace
+    import numpy as np
+    import deck_analytics
+
+    def pokemon(types, total):
+        return SimpleNamespace(types=types, hp=total, attack=0, defense=0,
+                               special_attack=0, special_defense=0, speed=0)
+
+    fire_deck = [pokemon(["Fire"], 500), pokemon(["Fire", "Flying"], 530)]
+    mixed_deck = [pokemon(["Water"], 400), pokemon(["Electric"], 320), pokemon(["Grass"], 318)]
+    energy = [SimpleNamespace(energy_type="Fire", name="Fire Energy")]
+
+    single = deck_analytics.analyse_deck(fire_deck, energy)
+    assert single["energy"] == 1.0
+    assert single["weakness"] == 0.0
+    assert 0 < single["score"] <= 100
+    assert deck_analytics.analyse_deck([], [])["score"] == 0
+
+    decks = [fire_deck, mixed_deck]
+    batch = deck_analytics.score_arrays(
+        2,
+        np.array([i for i, deck in enumerate(decks) for _ in deck]),
+        np.array([deck_analytics.type_mask(p.types) for deck in decks for p in deck]),
+        np.array([deck_analytics.stat_total(p) for deck in decks for p in deck], dtype=float),
+        np.array([0]),
+        np.array([deck_analytics.energy_mask("Fire", "Fire Energy")]),
+    )
+    assert batch["score"][0] == single["score"]
+    assert batch["score"][1] == deck_analytics.analyse_deck(mixed_deck, [])["score"]
+
+
+@pytest.fixture
+def deck_user():
+    import uuid
+    from auth import create_access_token
+    from database import SessionLocal, create_tables
+    from models import User
+
+    create_tables()
+    email = f"test-{uuid.uuid4().hex}@example.com"
+    db = SessionLocal()
+    try:
+        db.add(User(email=email, password="not-a-real-hash"))
+        db.commit()
+    finally:
+        db.close()
+    return {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+
+
+def test_deck_summary_follows_writes(stub_upstreams, deck_user):
+    from database import SessionLocal
+    from deck_summary import check_summaries, refresh_deck_summary
+    from models import DeckSummary
+
+    response = client.post("/deck/", headers=deck_user,
+                           json={"pokemon_ids": [4, 25], "trainer_names": [], "energy_types": []})
+    assert response.status_code == 200
+    summary = client.get("/deck/summary", headers=deck_user).json()
+    assert summary["pokemon_count"] == 2
+    assert summary["score"] == response.json()["deck_score"]
+    assert summary["weaknesses"] == {"Water": 1, "Rock": 1, "Ground": 2}
+
+    client.delete("/deck/pokemon/25", headers=deck_user)
+    summary = client.get("/deck/summary", headers=deck_user).json()
+    assert summary["pokemon_count"] == 1
+    assert summary["weaknesses"] == {"Water": 1, "Rock": 1, "Ground": 1}
+
+    db = SessionLocal()
+    try:
+        report = check_summaries(db)
+        assert summary["deck_id"] not in report["missing"] + report["stale"]
+
+        # A missing summary is computed on read but only stored by writes.
+        db.query(DeckSummary).filter(DeckSummary.deck_id == summary["deck_id"]).delete()
+        db.commit()
+        rebuilt = client.get("/deck/summary", headers=deck_user).json()
+        assert rebuilt["weaknesses"] == summary["weaknesses"]
+        assert db.get(DeckSummary, summary["deck_id"]) is None
+
+        # A save that also found it missing does not conflict with this one.
+        refresh_deck_summary(db, summary["deck_id"])
+        db.commit()
+        other = SessionLocal()
+        try:
+            # The first lookup runs before the other save committed.
+            get, missed = other.get, []
+            other.get = lambda *args, **kw: (missed.append(1) if not missed
+                                             else get(*args, **kw))
+            assert refresh_deck_summary(other, summary["deck_id"]).score == summary["score"]
+            other.commit()
+        finally:
+            other.close()
+    finally:
+        db.close()
+
+
+def test_what_if_ranks_single_card_changes(stub_upstreams, deck_user, monkeypatch):
+    import what_if
+
+    client.post("/deck/", headers=deck_user,
+                json={"pokemon_ids": [4, 6], "trainer_names": [], "energy_types": []})
+    deck_id = client.get("/deck/summary", headers=deck_user).json()["deck_id"]
+
+    result = client.get(f"/deck/{deck_id}/what-if?limit=5", headers=deck_user).json()
+    assert result["evaluated"] == result["candidates"] > 0
+    assert not result["partial"]
+    deltas = [change["delta"] for change in result["changes"]]
+    assert deltas == sorted(deltas, reverse=True)
+
+    # The process pool and in-process scoring agree.
+    monkeypatch.setattr(what_if, "WHATIF_PARALLEL_MIN", 0)
+    monkeypatch.setattr(what_if, "WHATIF_CHUNK_SIZE", 4)
+    pooled = client.get(f"/deck/{deck_id}/what-if?limit=5&budget_ms=5000",
+                        headers=deck_user).json()
+    assert pooled["parallel"]
+    assert pooled["changes"] == result["changes"]
+    # A pool that delivers nothing in time does not count as parallel.
+    monkeypatch.setattr(what_if, "wait", lambda futures, timeout: (set(), set(futures)))
+    late = client.get(f"/deck/{deck_id}/what-if?limit=5", headers=deck_user).json()
+    what_if.shutdown_pool()
+    assert not late["parallel"]
+    assert late["changes"] == result["changes"]
+
+
+def test_optimizer_finds_best_team(deck_user):
+    from itertools import combinations
+    from types import SimpleNamespace
+    from database import SessionLocal
+    from deck_analytics import deck_score
+    from deck_optimizer import required_energy
+    from models import Pokemon
+
+    db = SessionLocal()
+    for i, types in enumerate([["Fire"], ["Water"], ["Grass"], ["Ground", "Flying"],
+                               ["Fighting"], ["Ice", "Psychic"], ["Fairy"], ["Electric"]]):
+        db.merge(Pokemon(id=9000 + i, name=f"optimizer-{i}", types=types, hp=40 + 10 * i,
+                         attack=60, defense=60, special_attack=60, special_defense=60, speed=60))
+    db.commit()
+    cache.clear_all()
+    catalogue = db.query(Pokemon).all()
+    best = 0
+    for team in combinations(catalogue, 3):
+        energies = {required_energy(p.types) for p in team}
+        if len(energies) <= 2:
+            cards = [SimpleNamespace(energy_type=e, name=f"{e} Energy") for e in energies]
+            best = max(best, deck_score(team, cards))
+    db.close()
+
+    result = client.post("/deck/optimize", headers=deck_user, json={
+        "size": 3, "max_energy_types": 2, "required_pokemon_ids": [9000], "results": 2}).json()
+    assert result["complete"]
+    team = result["decks"][0]
+    assert 9000 in [p["id"] for p in team["pokemon"]]
+    assert len(team["energy_cards"]) <= 2
+    assert [d["score"] for d in result["decks"]] == sorted(
+        [d["score"] for d in result["decks"]], reverse=True)
+
+    unconstrained = client.post("/deck/optimize", headers=deck_user, json={
+        "size": 3, "max_energy_types": 2, "beam_width": 1024}).json()
+    assert unconstrained["decks"][0]["score"] == best
+
+    assert client.post("/deck/optimize", headers=deck_user, json={
+        "size": 2, "required_pokemon_ids": [9000, 9001, 9002]}).status_code == 400
+
+
+def test_type_masks_filter_in_sql(deck_user):
+    from database import SessionLocal
+    from models import Pokemon
+    from type_filters import find_pokemon_ids
+    from type_matchups import TYPE_BITS, mask_to_types
+
+    db = SessionLocal()
+    db.merge(Pokemon(id=9100, name="mask-squirtle", types=["Water"]))
+    db.merge(Pokemon(id=9101, name="mask-geodude", types=["Rock", "Ground"],
+                     strengths=["Fire", "Electric"], weaknesses=["Water", "Grass"]))
+    db.commit()
+    squirtle = db.get(Pokemon, 9100)
+    assert squirtle.types_mask == TYPE_BITS["Water"]
+    assert set(mask_to_types(squirtle.strengths_mask)) == {"Fire", "Ground", "Rock"}
+
+    squirtle.types = ["Water", "Ice"]
+    db.commit()
+    assert db.get(Pokemon, 9100).types_mask == TYPE_BITS["Water"] | TYPE_BITS["Ice"]
+
+    fire_counters = find_pokemon_ids(db, strong_against="Fire")
+    assert {9100, 9101} <= set(fire_counters)
+    assert 9101 not in find_pokemon_ids(db, strong_against="Fire", not_weak_to="Water")
+    db.close()
+
+    found = client.get("/pokemon/search?strong_against=Fire&weak_to=Grass&weak_to=Water",
+                       headers=deck_user).json()
+    assert 9101 in [p["id"] for p in found]
+    assert client.get("/pokemon/search?types=Plasma", headers=deck_user).status_code == 400
+
+
+def test_strength_picks_agree_between_local_and_pokeapi(stub_upstreams, deck_user, monkeypatch):
+    from database import SessionLocal
+    from models import Pokemon
+    from type_matchups import counter_types
+
+    strong = set(counter_types("Water"))
+    assert strong == {"Electric", "Grass"}
+    db = SessionLocal()
+    db.merge(Pokemon(id=9110, name="mask-pikachu", types=["Electric"], has_image=True))
+    db.merge(Pokemon(id=9111, name="mask-charmander", types=["Fire"], has_image=True))
+    db.commit()
+
+    # The local mask query and the PokéAPI fallback draw from the same types.
+    candidates = []
+    monkeypatch.setattr(recommendations.random, "sample",
+                        lambda rows, k: candidates.extend(rows) or list(rows))
+    assert recommendations.fetch_pokemon_by_strength("Water", db)["id"] == candidates[0][0]
+    assert 9110 in [row[0] for row in candidates] and 9111 not in [row[0] for row in candidates]
+    assert all(set(db.get(Pokemon, row[0]).types) & strong for row in candidates)
+    db.close()
+
+    listed = []
+    monkeypatch.setattr(recommendations, "fetch_type_listing",
+                        lambda type_name: listed.append(type_name) or [{"name": "Pikachu", "id": 25}])
+    for _ in range(10):
+        recommendations.fetch_pokemon_by_strength("Water")
+    assert listed and set(listed) <= strong
+
+
+def test_pokemon_catalogue_is_columnar_and_hot_swapped(deck_user):
+    from database import SessionLocal
+    from models import Pokemon
+    from pokemon_catalogue import get_catalogue
+
+    db = SessionLocal()
+    db.merge(Pokemon(id=9200, name="catalogue-vulpix", types=["Fire"], hp=38, speed=65))
+    db.commit()
+    before = get_catalogue()
+    record = before.get(9200)
+    assert (record.name, record.types, record.stat_total) == ("catalogue-vulpix", ["Fire"], 103)
+    assert before.get(-1) is None
+    assert get_catalogue() is before
+
+    db.merge(Pokemon(id=9201, name="catalogue-ninetales", types=["Fire"], hp=73))
+    db.commit()
+    db.close()
+    after = get_catalogue()
+    assert after is not before and after.version > before.version
+    assert after.get(9201).name == "catalogue-ninetales"
+    assert before.get(9201) is None
+    assert after.rows([123456])[0] == -1
+
+
+def test_moves_are_linked_without_extra_upstream_calls(stub_upstreams, deck_user):
+    from database import SessionLocal
+    from move_data import import_details
+
+    client.post("/deck/", headers=deck_user,
+                json={"pokemon_ids": [7], "trainer_names": [], "energy_types": []})
+    calls = stub_upstreams.stats()["pokeapi.pokemon"]
+
+    moves = client.get("/pokemon/7/moves", headers=deck_user).json()
+    assert len(moves["moves"]) == 7
+    assert [a["name"] for a in moves["abilities"]] == ["torrent", "rain-dish"]
+    assert moves["abilities"][1]["is_hidden"] is True
+    assert stub_upstreams.stats()["pokeapi.pokemon"] == calls
+
+    batch = client.get("/pokemon/moves?ids=7,999999", headers=deck_user).json()
+    assert batch["pending"] == [999999]
+    assert client.get("/pokemon/moves?ids=7,x", headers=deck_user).status_code == 400
+
+    db = SessionLocal()
+    try:
+        import_details(db, "moves", [{
+            "id": 33, "name": "tackle", "power": 40, "accuracy": 100, "pp": 35,
+            "type": {"name": "normal"}, "damage_class": {"name": "physical"},
+            "effect_entries": [{"language": {"name": "en"}, "short_effect": "Inflicts damage."}],
+        }])
+    finally:
+        db.close()
+    moves = client.get("/pokemon/7/moves", headers=deck_user).json()
+    tackle = next(m for m in moves["moves"] if m["name"] == "tackle")
+    assert (tackle["type"], tackle["power"], tackle["effect"]) == ("Normal", 40, "Inflicts damage.")
+
+
+def test_move_link_failure_does_not_fail_the_deck_save(stub_upstreams, deck_user, monkeypatch):
+    from sqlalchemy.exc import IntegrityError
+    import move_data
+
+    def conflict(*args):
+        raise IntegrityError("INSERT INTO moves", {}, Exception("duplicate key"))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(move_data, "_ensure_rows", conflict)
+        response = client.post("/deck/", headers=deck_user,
+                               json={"pokemon_ids": [196], "trainer_names": [], "energy_types": []})
+        assert response.status_code == 200
+        assert [p["id"] for p in response.json()["added_pokemon"]] == [196]
+        assert client.get("/pokemon/196/moves", headers=deck_user).status_code == 404
+
+    # Move rows stored by someone else meanwhile are kept, not a conflict.
+    moves = client.get("/pokemon/196/moves", headers=deck_user).json()
+    assert moves["linked"] and moves["moves"]
+
+
+def test_pokemon_provider_fetches_once_per_cycle(stub_upstreams, tmp_path, monkeypatch):
+    import time
+    from types import SimpleNamespace
+    from concurrent.futures import ThreadPoolExecutor
+    from cache import CountingCache
+    from pokemon_provider import PokemonProvider, SnapshotBackend, HttpBackend, write_snapshot
+    from services.pokeapi_service import fetch_pokemon_data as fetch_raw
+
+    snapshot = tmp_path / "pokemon.ndjson"
+    with open(snapshot, "w", encoding="utf-8") as f:
+        assert write_snapshot([25], f) == 1
+    provider = PokemonProvider([SnapshotBackend(str(snapshot)), HttpBackend()],
+                               CountingCache("provider_test", maxsize=64, ttl=60),
+                               CountingCache("provider_test_refs", maxsize=64, ttl=60))
+
+    pikachu = provider.get("Pikachu")
+    assert (pikachu["id"], pikachu["types"], pikachu["stats"]["speed"]) == (25, ["Electric"], 90)
+    assert pikachu["base_experience"] is not None
+    assert provider.refs(25, fetch=False) is not None
+    assert stub_upstreams.stats()["pokeapi.pokemon"] == 1
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(provider.get, [4] * 16))
+    assert {r["name"] for r in results} == {"charmander"}
+    assert provider.get("charmander")["id"] == 4
+    assert stub_upstreams.stats()["pokeapi.pokemon"] == 2
+    assert provider.cache.stats()["hits"] >= 1
+
+    # Once the entries expire, the next cycle looks them up again.
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: time.monotonic() + 61))
+    provider.get(4)
+    assert stub_upstreams.stats()["pokeapi.pokemon"] == 3
+
+    raw = fetch_raw("pikachu")
+    assert raw["types"] == ["electric"] and "base_experience" in raw
+
+
+def test_tcg_scheduler_quota_priorities_and_coalescing(stub_upstreams):
+    import threading
+    import time
+    from tcg_scheduler import TCGScheduler, INTERACTIVE, BACKGROUND
+
+    url = f"{utils.TCG_API_URL}?q=supertype:Energy&pageSize=250"
+    stub_upstreams.latency_ms = 100
+    scheduler = TCGScheduler(requests_per_minute=600, burst=1, max_wait=2)
+    threads = [threading.Thread(target=scheduler.get, args=(url,)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert stub_upstreams.stats()["tcg.cards"] == 1
+    stub_upstreams.latency_ms = 0
+
+    # One token every 100 ms: the interactive call that queued later still goes first.
+    order = []
+    scheduler.acquire()
+    background = threading.Thread(target=lambda: order.append(("bg", scheduler.acquire(BACKGROUND))))
+    background.start()
+    time.sleep(0.02)
+    scheduler.acquire(INTERACTIVE)
+    order.append(("ui", True))
+    background.join()
+    assert order == [("ui", True), ("bg", True)]
+
+    quick = TCGScheduler(requests_per_minute=6, burst=1, max_wait=0.05)
+    assert quick.get(url).status_code == 200
+    throttled = quick.get(url)
+    assert throttled.status_code == 429 and int(throttled.headers["Retry-After"]) >= 1
+
+    stub_upstreams.error_rate, stub_upstreams.error_status, stub_upstreams.retry_after = 1.0, 429, 30
+    paused = TCGScheduler(requests_per_minute=600, burst=5, max_wait=0.5)
+    assert paused.get(url).status_code == 429
+    calls = stub_upstreams.stats()["tcg.cards"]
+    assert paused.get(url).status_code == 429
+    assert stub_upstreams.stats()["tcg.cards"] == calls
+
+
+def test_circuit_breaker_serves_degraded_deck(stub_upstreams, deck_user):
+    import time
+
+    assert client.post("/deck/", headers=deck_user, json={
+        "pokemon_ids": [4], "trainer_names": [], "energy_types": []}).status_code == 200
+
+    stub_upstreams.error_rate = 1.0
+    for pokemon_id in (1, 7, 9, 39, 52):
+        assert pokemon_provider.fetch_pokemon_data(pokemon_id) is None
+    assert http_client.breaker_states()["pokeapi"] == "open"
+    calls = stub_upstreams.stats()["pokeapi.pokemon"]
+    assert pokemon_provider.fetch_pokemon_data(66) is None
+    assert stub_upstreams.stats()["pokeapi.pokemon"] == calls
+
+    for breaker_name in ("pokemondb", "tcg"):
+        for _ in range(http_client.BREAKER_FAILURE_THRESHOLD):
+            http_client.breaker(breaker_name).record_failure()
+    before = stub_upstreams.stats()
+    deck = client.get("/deck/", headers=deck_user).json()
+    assert deck["degraded"] is True
+    assert set(deck["unavailable_upstreams"]) == {"pokeapi", "pokemondb", "tcg"}
+    assert [p["id"] for p in deck["deck"]["pokemon"]] == [4]
+    assert stub_upstreams.stats() == before
+
+    stub_upstreams.error_rate = 0.0
+    http_client.breaker("pokeapi").reset_timeout = 0.05
+    time.sleep(0.06)
+    assert pokemon_provider.fetch_pokemon_data(66)["name"] == "machop"
+    assert http_client.breaker_states()["pokeapi"] == "closed"
+
+
+def test_jobs_are_deduplicated_retried_and_run_by_the_worker(stub_upstreams, deck_user):
+    import jobs
+    import pokemon_catalogue
+    from worker import Worker
+
+    first = client.post("/tcg/external/cache?background=true")
+    assert first.status_code == 202
+    assert client.post("/tcg/external/cache?background=true").json()["id"] == first.json()["id"]
+    assert client.post("/jobs", headers=deck_user, json={"type": "nope"}).status_code == 400
+    backfill = client.post("/jobs", headers=deck_user, json={
+        "type": "pokemon_backfill", "payload": {"ids": [131, 999999]}}).json()
+    # Bad payloads are rejected up front instead of failing in the worker.
+    for payload in ({}, {"ids": []}, {"ids": ["pikachu"]}, {"ids": [0]},
+                    {"ids": list(range(1, 1002))}):
+        assert client.post("/jobs", headers=deck_user, json={
+            "type": "pokemon_backfill", "payload": payload}).status_code == 400
+
+    failures = []
+
+    @jobs.job_type("test_flaky", backoff_seconds=0, public=True)
+    def flaky(db, payload):
+        if not failures:
+            failures.append(1)
+            raise RuntimeError("first attempt fails")
+        return {"ok": True}
+
+    longest = {"type": "test_flaky", "dedupe_key": "k" * 200}
+    flaky_job = client.post("/jobs", headers=deck_user, json=longest).json()
+    assert client.post("/jobs", headers=deck_user, json=longest).json()["id"] == flaky_job["id"]
+    assert client.post("/jobs", headers=deck_user, json={
+        "type": "test_flaky", "dedupe_key": "k" * 201}).status_code == 422
+    Worker(concurrency=2, poll_seconds=0.01).run(once=True)
+    jobs.JOB_TYPES.pop("test_flaky")
+
+    sync = client.get(f"/jobs/{first.json()['id']}", headers=deck_user).json()
+    assert sync["status"] == "succeeded" and sync["result"]["trainers_count"] > 0
+    backfill = client.get(f"/jobs/{backfill['id']}", headers=deck_user).json()
+    assert backfill["result"] == {"added": [131], "missing": [999999]}
+    # The job publishes the new Pokémon to every process itself.
+    client.post("/jobs", headers=deck_user, json={
+        "type": "pokemon_backfill", "payload": {"ids": [133]}})
+    Worker(concurrency=1, poll_seconds=0.01).run(once=True)
+    published = pokemon_catalogue.load_version(pokemon_catalogue.read_current_version())
+    assert published.rows([133])[0] >= 0
+    flaky_job = client.get(f"/jobs/{flaky_job['id']}", headers=deck_user).json()
+    assert (flaky_job["status"], flaky_job["attempts"]) == ("succeeded", 2)
+    assert client.post("/tcg/external/cache?background=true").json()["id"] != first.json()["id"]
+
+    # Maintenance job types and other users' jobs are off limits.
+    assert client.post("/jobs", headers=deck_user,
+                       json={"type": "deck_summary_rebuild"}).status_code == 403
+    listed = client.get("/jobs", headers=deck_user).json()
+    assert {job["id"] for job in listed["jobs"]} >= {backfill["id"], flaky_job["id"]}
+    assert all(job["owner_id"] == listed["jobs"][0]["owner_id"] for job in listed["jobs"])
+    assert list(listed["types"]) == ["pokemon_backfill"]
+
+
+def test_job_claims_respect_limits_and_expired_leases_fail(deck_user, monkeypatch):
+    from datetime import timedelta
+    from database import SessionLocal
+    from models import Job
+    import jobs
+
+    @jobs.job_type("test_single", concurrency=1)
+    def single(db, payload):
+        return {}
+
+    db = SessionLocal()
+    try:
+        first = jobs.enqueue(db, "test_single")
+        second = jobs.enqueue(db, "test_single")
+        assert jobs.claim(db, "worker-a", ["test_single"]).id == first.id
+        # Another worker read the running counts before that claim: the
+        # claiming UPDATE still refuses the second job.
+        with monkeypatch.context() as patch:
+            patch.setattr(jobs, "_running_counts", lambda db: {})
+            assert jobs.claim(db, "worker-b", ["test_single"]) is None
+
+        # A job that crashed its worker on the last attempt fails for good.
+        expired = jobs._now() - timedelta(seconds=1)
+        db.execute(jobs.update(Job).where(Job.id == first.id)
+                   .values(attempts=Job.max_attempts, locked_until=expired))
+        db.commit()
+        jobs.requeue_expired(db)
+        db.expire_all()
+        assert db.get(Job, first.id).status == jobs.FAILED
+        assert db.get(Job, second.id).status == jobs.QUEUED
+        db.execute(jobs.update(Job).where(Job.id == second.id).values(status=jobs.SUCCEEDED))
+        db.commit()
+    finally:
+        db.close()
+        jobs.JOB_TYPES.pop("test_single")
+
+
+def test_image_proxy_caches_and_resizes(stub_upstreams, monkeypatch, tmp_path):
+    import image_cache
+
+    monkeypatch.setattr(image_cache, "IMAGE_CACHE_DIR", str(tmp_path))
+    url = f"{utils.POKEMON_IMAGE_BASE_URL}/pikachu.jpg"
+    first = client.get("/images", params={"url": url, "size": "thumb"})
+    assert first.status_code == 200
+    assert first.headers["content-type"] == "image/webp"
+    assert "immutable" in first.headers["cache-control"]
+    original = client.get("/images", params={"url": url, "size": "original"})
+    assert original.headers["content-type"] == "image/jpeg"
+    assert stub_upstreams.stats() == {"images.pokemondb": 1}
+
+    again = client.get("/images", params={"url": url, "size": "thumb"},
+                       headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+    assert client.get("/images", params={"url": "http://example.com/a.png"}).status_code == 400
+    missing_url = f"{utils.POKEMON_IMAGE_BASE_URL}/missingno.jpg"
+    missing = client.get("/images", params={"url": missing_url}, follow_redirects=False)
+    assert (missing.status_code, missing.headers["location"]) == (307, missing_url)
+
+
+def test_image_proxy_redirects_corrupt_images(stub_upstreams, monkeypatch, tmp_path):
+    import os
+    from types import SimpleNamespace
+    import image_cache
+
+    monkeypatch.setattr(image_cache, "IMAGE_CACHE_DIR", str(tmp_path))
+    corrupt = SimpleNamespace(status_code=200, headers={"Content-Type": "image/png"},
+                              content=b"\x89PNG\r\n\x1a\n not really a png")
+    monkeypatch.setattr(image_cache.http_client, "get", lambda url, **kwargs: corrupt)
+    url = f"{utils.POKEMON_IMAGE_BASE_URL}/glitch.png"
+    for size in ("thumb", "original"):
+        response = client.get("/images", params={"url": url, "size": size}, follow_redirects=False)
+        assert (response.status_code, response.headers["location"]) == (307, url)
+    # Nothing was cached, so a fixed upstream is fetched again.
+    assert not os.path.exists(tmp_path / "urls")
+
+    # An unreadable original cached before the check is redirected too.
+    original = image_cache._sharded("originals", "0" * 64 + ".png")
+    image_cache._write_atomic(original, corrupt.content)
+    monkeypatch.setattr(image_cache, "fetch_original", lambda url: original)
+    response = client.get("/images", params={"url": url}, follow_redirects=False)
+    assert response.status_code == 307
+
+
+def test_deck_returns_at_once_and_streams_recommendations(stub_upstreams, deck_user):
+    import json
+
+    saved = client.post("/deck/", headers=deck_user, json={
+        "pokemon_ids": [4], "trainer_names": [], "energy_types": []}).json()
+    # The save does not compute recommendations; it hands out the stream token.
+    assert "recommendations" not in saved and saved["recommendations_token"]
+    before = stub_upstreams.stats()
+    deck = client.get("/deck/", headers=deck_user).json()
+    assert deck["recommendations"] == [] and deck["recommendations_token"]
+    assert stub_upstreams.stats() == before
+    scoped = {"Authorization": f"Bearer {deck['recommendations_token']}"}
+    assert client.get("/deck/", headers=scoped).status_code == 401
+    assert client.get("/deck/recommendations/stream",
+                      params={"token": deck_user["Authorization"][7:]}).status_code == 401
+
+    response = client.get(saved["recommendations_url"])
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+              for block in response.text.strip().split("\n\n")]
+    events = [event for event in events if event]
+    items = [json.loads(event["data"]) for event in events if event["event"] == "recommendation"]
+    assert events[-1]["event"] == "done"
+    assert json.loads(events[-1]["data"])["count"] == len(items)
+    assert any(item["type"] == "pokemon" for item in items)
+    assert stub_upstreams.stats() != before
+
+
+def test_batch_pokemon_fills_misses_in_request_order(stub_upstreams, deck_user):
+    client.get("/pokemon/25", headers=deck_user)
+    first = client.get("/pokemon/25", headers=deck_user).json()
+    before = stub_upstreams.stats().get("pokeapi.pokemon", 0)
+    response = client.get("/pokemon?ids=143,25,999999,147,143", headers=deck_user).json()
+    assert [entry and entry["id"] for entry in response["pokemon"]] == [143, 25, None, 147, 143]
+    assert response["pokemon"][1] == first
+    assert response["missing"] == [999999]
+    assert stub_upstreams.stats()["pokeapi.pokemon"] - before == 3
+
+    again = client.post("/pokemon", headers=deck_user, json={"ids": [147, 143]}).json()
+    assert [entry["name"] for entry in again["pokemon"]] == ["dratini", "snorlax"]
+    assert stub_upstreams.stats()["pokeapi.pokemon"] - before == 3
+    assert client.get("/pokemon?ids=a,b", headers=deck_user).status_code == 400
+    assert client.post("/pokemon", headers=deck_user, json={"ids": []}).status_code == 400
+
+
+def test_reads_use_replica_with_read_your_writes(stub_upstreams, deck_user, monkeypatch, tmp_path):
+    import sqlite3
+    import database
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.engine import make_url
+    from auth import decode_scoped_token
+    from models import Pokemon
+
+    replica_path = str(tmp_path / "replica.db")
+    with sqlite3.connect(make_url(os.environ["DATABASE_URL"]).database) as primary, \
+            sqlite3.connect(replica_path) as copy:
+        primary.backup(copy)
+    replica = create_engine(f"sqlite:///{replica_path}")
+    with replica.begin() as connection:
+        connection.execute(insert(Pokemon), [{"id": 9500, "name": "replicamon", "types": ["Normal"],
+                                              "strengths": [], "weaknesses": ["Fighting"]}])
+    database.set_replica_engines([replica])
+    # Earlier tests' writes would send this client to the primary.
+    client.cookies.clear()
+    try:
+        assert client.get("/pokemon/9500", headers=deck_user).json()["name"] == "replicamon"
+
+        saved = client.post("/deck/", headers=deck_user, json={
+            "pokemon_ids": [1], "trainer_names": [], "energy_types": []})
+        assert saved.status_code == 200
+        last_write = float(saved.cookies["last_write"])
+        deck = client.get("/deck/", headers=deck_user).json()
+        assert [p["id"] for p in deck["deck"]["pokemon"]] == [1]
+        assert decode_scoped_token(saved.json()["recommendations_token"],
+                                   "recommendations")["last_write"] == pytest.approx(last_write, abs=1e-3)
+        # Another client, without the cookie, reads the replica.
+        assert TestClient(app).get("/deck/", headers=deck_user).json()["deck_count"] == 0
+        monkeypatch.setenv("READ_YOUR_WRITES_SECONDS", "0")
+        assert client.get("/deck/", headers=deck_user).json()["deck_count"] == 0
+
+        monkeypatch.setattr(database, "replica_lag", lambda engine: float("inf"))
+        database.set_replica_engines([replica])
+        assert client.get("/pokemon/9500", headers=deck_user).status_code == 404
+    finally:
+        database.set_replica_engines([])
+        replica.dispose()
+
+
+def test_catalogue_is_shared_through_memory_mapped_versions(stub_upstreams, deck_user, monkeypatch):
+    import subprocess
+    import sys
+    import numpy as np
+    import pokemon_catalogue
+
+    assert client.post("/tcg/external/cache").status_code == 200
+    live = pokemon_catalogue.read_current_version()
+    catalogue = pokemon_catalogue.get_catalogue()
+    assert catalogue.version == live and isinstance(catalogue.records, np.memmap)
+    assert len(catalogue.trainers) > 0 and catalogue.type_chart.shape == (2, 18, 18)
+    assert pokemon_catalogue.refresh_catalogue().version == live
+
+    # Another worker process maps the same files, without a database.
+    code = ("import pokemon_catalogue as c; s = c.load_version(c.read_current_version()); "
+            "print(s.version, len(s.records), len(s.trainers))")
+    other = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                           cwd=os.path.dirname(os.path.abspath(__file__)),
+                           env={**os.environ, "DATABASE_URL": "sqlite:////nonexistent/none.db"})
+    assert other.stdout.split() == [str(live), str(len(catalogue)), str(len(catalogue.trainers))]
+
+    # A version published elsewhere is swapped in; the old object stays usable.
+    smaller = pokemon_catalogue.PokemonCatalogue(np.array(catalogue.records),
+                                                 trainers=np.array(catalogue.trainers[:1]))
+    assert pokemon_catalogue.publish_catalogue(smaller) == live + 1
+    monkeypatch.setattr(pokemon_catalogue, "CATALOGUE_CHECK_SECONDS", 0)
+    swapped = pokemon_catalogue.get_catalogue()
+    assert (swapped.version, len(swapped.trainers)) == (live + 1, 1)
+    assert len(catalogue.trainers) > 1
+    pokemon_catalogue.mark_stale()
+    rebuilt = pokemon_catalogue.get_catalogue()
+    assert rebuilt.version == live + 2 and len(rebuilt.trainers) == len(catalogue.trainers)
+
+
+def test_deck_simulator_matches_hypergeometric_odds(stub_upstreams, deck_user, monkeypatch):
+    from math import comb
+    import what_if
+    import deck_simulator
+
+    deck = deck_simulator.DeckDraws(0, [["Fire"]] * 20, [("Fire", "Fire Energy")] * 10, 30)
+    result = deck_simulator.run_simulation(deck, trials=50000, budget_ms=10000, seed=1)
+    assert result["trials_run"] == 50000 and not result["partial"]
+    assert abs(result["opening_hand"]["has_pokemon"] - (1 - comb(40, 7) / comb(60, 7))) < 0.01
+    assert abs(result["opening_hand"]["expected"]["energy"] - 7 * 10 / 60) < 0.02
+    drawn = [turn["drawn"]["Fire"] for turn in result["draws"]]
+    assert drawn == sorted(drawn) and drawn[-1] == result["draws"][-1]["pokemon_with_energy"]
+
+    client.post("/deck/", headers=deck_user,
+                json={"pokemon_ids": [4, 6, 7, 25, 39, 52, 66, 74, 92, 94], "trainer_names": [],
+                      "energy_types": []})
+    deck_id = client.get("/deck/summary", headers=deck_user).json()["deck_id"]
+    monkeypatch.setattr(deck_simulator, "SIMULATE_CHUNK_TRIALS", 500)
+    serial = client.get(f"/deck/{deck_id}/simulate?trials=2000&seed=7&prize_count=2",
+                        headers=deck_user).json()
+    assert (serial["deck_size"], serial["hand_size"], len(serial["draws"])) == (10, 7, 2)
+    assert serial["opening_hand"]["has_pokemon"] == 1.0
+
+    # The process pool gives the same numbers for the same seed.
+    monkeypatch.setattr(deck_simulator, "SIMULATE_PARALLEL_MIN", 0)
+    pooled = client.get(f"/deck/{deck_id}/simulate?trials=2000&seed=7&prize_count=2&budget_ms=10000",
+                        headers=deck_user).json()
+    assert pooled["parallel"] and not serial["parallel"]
+    assert {key: pooled[key] for key in ("opening_hand", "prizes", "draws")} == \
+        {key: serial[key] for key in ("opening_hand", "prizes", "draws")}
+    monkeypatch.setattr(deck_simulator, "wait", lambda futures, timeout: (set(), set(futures)))
+    late = client.get(f"/deck/{deck_id}/simulate?trials=2000&seed=7&prize_count=2",
+                      headers=deck_user).json()
+    what_if.shutdown_pool()
+    assert not late["parallel"] and late["opening_hand"] == serial["opening_hand"]
+
+
+def test_matchup_round_robin_matches_pairwise_play(stub_upstreams, deck_user):
+    from itertools import product
+    import numpy as np
+    from database import SessionLocal
+    from deck_analytics import TYPES
+    from models import Deck, DeckPokemon, Pokemon
+    import deck_matchups
+
+    rng = np.random.default_rng(3)
+    profiles = (rng.random((40, len(TYPES))) < 0.15)[rng.integers(0, 12, 40)].astype(float)
+    blocked = deck_matchups.round_robin(profiles, block=5)
+    margins = deck_matchups.matchup_matrix(profiles, profiles)
+    chart = deck_matchups.BEATS
+    for a in range(len(profiles)):
+        # Naive play: every type of deck a against every type of deck b.
+        naive = [sum(profiles[a, x] * profiles[b, y] * (int(chart[x, y]) - int(chart[y, x]))
+                     for x, y in product(range(len(TYPES)), repeat=2)) for b in range(len(profiles))]
+        assert np.allclose(naive, margins[a])
+        others = np.delete(margins[a], a)
+        assert blocked["wins"][a] == (others > 1e-9).sum()
+        assert blocked["losses"][a] == (others < -1e-9).sum()
+        assert np.isclose(blocked["margin"][a], others.mean())
+    assert blocked["distinct"] <= 12
+
+    client.post("/deck/", headers=deck_user,
+                json={"pokemon_ids": [7], "trainer_names": [], "energy_types": []})
+    db = SessionLocal()
+    try:
+        db.merge(Pokemon(id=9400, name="matchup-fire", types=["Fire"]))
+        deck = Deck()
+        db.add(deck)
+        db.flush()
+        db.add(DeckPokemon(deck_id=deck.id, pokemon_id=9400))
+        db.commit()
+        fire_deck = deck.id
+    finally:
+        db.close()
+    deck_matchups.matchup_cache.clear()
+    report = client.get("/deck/matchups?limit=100", headers=deck_user).json()
+    assert report["your_deck"]["types"] == ["Water"] and report["your_deck"]["wins"] >= 1
+    records = {row["deck_id"]: row for row in report["leaderboard"]}
+    assert fire_deck not in records or records[fire_deck]["losses"] >= 1
+    assert report["meta"]["decks"] >= 2 and {"Water", "Fire"} <= set(report["meta"]["type_share"])
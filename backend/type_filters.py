@@ -0,0 +1,100 @@
+from sqlalchemy import select, and_
+from sqlalchemy.orm import Session
+from models import Pokemon
+from type_matchups import TYPE_BITS, types_to_mask
+
+"""
+    This module filters Pokémon by type with bitwise predicates on the
+    Pokemon.types_mask / strengths_mask / weaknesses_mask columns, so a
+    question such as "strong against Fire and not weak to Water" is answered
+    in SQL from the ix_pokemon_type_masks index instead of loading every row
+    and reading its JSON lists in Python.
+
+    Each argument takes one type name or a list of them:
+      - types / strong_against / weak_to:  every listed type must match,
+      - any_types:                         at least one listed type matches,
+      - not_types / not_weak_to:           none of the listed types match.
+
+    Usage:
+        find_pokemon(db, strong_against="Fire", not_weak_to="Water")
+"""
+
+
+def _mask(type_names) -> int:
+    if type_names is None:
+        return 0
+    if isinstance(type_names, str):
+        type_names = [type_names]
+    unknown = [name for name in type_names if str(name).capitalize() not in TYPE_BITS]
+    if unknown:
+        raise ValueError(f"Unknown types: {unknown}")
+    return types_to_mask(type_names)
+
+
+def _has_all(column, mask: int):
+    return column.bitwise_and(mask) == mask
+
+
+def _has_any(column, mask: int):
+    return column.bitwise_and(mask) != 0
+
+
+def _has_none(column, mask: int):
+    return column.bitwise_and(mask) == 0
+
+
+def type_filter(types=None, any_types=None, not_types=None, strong_against=None,
+                weak_to=None, not_weak_to=None):
+    """
+        Builds the SQL condition for the given type constraints.
+        Returns:
+            ColumnElement: A condition for .where()/.filter() (always true
+            when no constraint is given).
+        Raises:
+            ValueError: If a type name is not one of the 18 types.
+    """
+
+    conditions = []
+    for column, mask, check in (
+        (Pokemon.types_mask, _mask(types), _has_all),
+        (Pokemon.types_mask, _mask(any_types), _has_any),
+        (Pokemon.types_mask, _mask(not_types), _has_none),
+        (Pokemon.strengths_mask, _mask(strong_against), _has_all),
+        (Pokemon.weaknesses_mask, _mask(weak_to), _has_all),
+        (Pokemon.weaknesses_mask, _mask(not_weak_to), _has_none),
+    ):
+        if mask:
+            conditions.append(check(column, mask))
+    return and_(True, *conditions)
+
+
+def find_pokemon_ids(db: Session, limit: int = None, **filters):
+    """
+        Returns the ids of the stored Pokémon matching type_filter(**filters),
+        read from the mask index alone.
+    """
+
+    query = select(Pokemon.id).where(type_filter(**filters)).order_by(Pokemon.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return db.execute(query).scalars().all()
+
+
+def find_pokemon(db: Session, limit: int = None, offset: int = 0, **filters):
+    """
+        Returns the stored Pokémon matching type_filter(**filters).
+        Args:
+            db (Session): The database session.
+            limit (int, optional): Maximum number of rows.
+            offset (int): Rows to skip, for paging.
+            **filters: See type_filter().
+        Returns:
+            list: Pokemon objects ordered by id.
+    """
+
+    query = db.query(Pokemon).filter(type_filter(**filters)).order_by(Pokemon.id)
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
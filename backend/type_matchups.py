@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 """
     This module provides the type match-up information for Pokémon.
     It defines a type chart that maps each Pokémon type to the types it is weak to
@@ -70,3 +72,95 @@ def get_strengths_and_weaknesses(pokemon_types):
             weaknesses.update(type_chart[p_type]["weak_to"])
 
     return list(strengths), list(weaknesses)
+
+
+@lru_cache(maxsize=None)
+def counter_types(weak_type: str):
+    """
+        Lists the types that have weak_type in their "strong_against" list,
+        the same test as a Pokémon's strengths (and its strengths_mask); the
+        recommendations draw their suggested Pokémon from these types. The
+        reverse lookup is computed once per type and cached.
+        Args:
+            weak_type (str): A type name such as "Fire".
+        Returns:
+            tuple: Type names, in type chart order.
+    """
+
+    return tuple(p_type for p_type, matchups in type_chart.items()
+                 if weak_type in matchups["strong_against"])
+
+
+# Bitset encoding: each of the 18 types is one bit, in type chart order, so a
+# set of types fits in one integer and set operations become bitwise ones.
+TYPE_BITS = {p_type: 1 << i for i, p_type in enumerate(type_chart)}
+ALL_TYPES_MASK = (1 << len(type_chart)) - 1
+
+
+def types_to_mask(pokemon_types) -> int:
+    """
+        Encodes type names as an 18-bit mask; unknown names are ignored.
+        Args:
+            pokemon_types (list): Type names such as ["Fire", "Flying"].
+        Returns:
+            int: The mask.
+    """
+
+    mask = 0
+    for p_type in pokemon_types or ():
+        mask |= TYPE_BITS.get(str(p_type).capitalize(), 0)
+    return mask
+
+
+def mask_to_types(mask: int):
+    """
+        Decodes an 18-bit mask back into type names, in type chart order.
+    """
+
+    return [p_type for p_type, bit in TYPE_BITS.items() if mask & bit]
+
+
+STRONG_AGAINST_MASKS = {p_type: types_to_mask(matchups["strong_against"])
+                        for p_type, matchups in type_chart.items()}
+WEAK_TO_MASKS = {p_type: types_to_mask(matchups["weak_to"])
+                 for p_type, matchups in type_chart.items()}
+
+
+def strengths_mask(types_mask: int) -> int:
+    """
+        The bitset version of get_strengths_and_weaknesses()[0]: the types
+        a Pokémon with these types is strong against.
+    """
+
+    mask = 0
+    for p_type, bit in TYPE_BITS.items():
+        if types_mask & bit:
+            mask |= STRONG_AGAINST_MASKS[p_type]
+    return mask
+
+
+def weaknesses_mask(types_mask: int) -> int:
+    """
+        The bitset version of get_strengths_and_weaknesses()[1]: the types a
+        Pokémon with these types is weak to.
+    """
+
+    mask = 0
+    for p_type, bit in TYPE_BITS.items():
+        if types_mask & bit:
+            mask |= WEAK_TO_MASKS[p_type]
+    return mask
+
+
+def type_profile_masks(pokemon_types, strengths=None, weaknesses=None):
+    """
+        Returns the (types, strengths, weaknesses) masks of a Pokémon. Stored
+        strength/weakness lists win; missing ones are derived from the types.
+    """
+
+    types = types_to_mask(pokemon_types)
+    return (
+        types,
+        types_to_mask(strengths) if strengths is not None else strengths_mask(types),
+        types_to_mask(weaknesses) if weaknesses is not None else weaknesses_mask(types),
+    )
@@ -1,72 +1,44 @@
-import requests
+import logging
+import os
+import tcg_scheduler
 import urllib.parse
-from type_matchups import get_strengths_and_weaknesses
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import Pokemon, Trainer, Energy
-from functools import lru_cache
+from logging_config import truncate
 
 
 """
-    This module contains utility functions for fetching Pokémon data from the
-    PokéAPI and TCG card data from the Pokémon TCG API. It also uses type match-up
-    information (from type_matchups.py) to calculate strengths and weaknesses,
-    so you can easily build a well-balanced deck.
+    This module contains the upstream API settings and utility functions for
+    fetching TCG card data from the Pokémon TCG API. Pokémon data comes from
+    pokemon_provider.py.
 """
 
 
-POKEAPI_URL = "https://pokeapi.co/api/v2/pokemon/"
-TCG_API_URL = "https://api.pokemontcg.io/v2/cards"
-TCG_API_HEADERS = {"X-Api-Key": "32cf5b1e-8a85-42bc-8f67-de814b3894ed"}
+logger = logging.getLogger(__name__)
 
+POKEAPI_BASE_URL = os.getenv("POKEAPI_BASE_URL", "https://pokeapi.co/api/v2").rstrip("/")
+TCG_API_BASE_URL = os.getenv("TCG_API_BASE_URL", "https://api.pokemontcg.io/v2").rstrip("/")
+POKEMON_IMAGE_BASE_URL = os.getenv("POKEMON_IMAGE_BASE_URL",
+                                   "https://img.pokemondb.net/artwork/large").rstrip("/")
+TCG_API_KEY = os.getenv("TCG_API_KEY")
 
-def fetch_pokemon_data(pokemon_id_or_name):
+POKEAPI_URL = f"{POKEAPI_BASE_URL}/pokemon/"
+POKEAPI_TYPE_URL = f"{POKEAPI_BASE_URL}/type/"
+TCG_API_URL = f"{TCG_API_BASE_URL}/cards"
+TCG_API_HEADERS = {"X-Api-Key": TCG_API_KEY} if TCG_API_KEY else {}
+
+
+def pokemon_image_url(pokemon_name: str) -> str:
     """
-        Fetches Pokémon data from the PokéAPI and calculates its strengths and
-        weaknesses. This function retrieves the Pokémon details by ID or name,
-        processes the data to extract the Pokémon's name, types, moves, abilities,
-        stats, and calculates its strengths and weaknesses using our type match-up
-        helper.
+        Builds the PokémonDB artwork URL for a Pokémon name.
         Args:
-            pokemon_id_or_name (int or str): The Pokémon's ID or name to fetch.
+            pokemon_name (str): The Pokémon's name.
         Returns:
-            dict: A dictionary containing Pokémon details including a nicely formatted
-            image URL (using PokémonDB.net), or None if the Pokémon is not found.
+            str: The image URL.
     """
 
-    response = requests.get(f"{POKEAPI_URL}{str(pokemon_id_or_name).lower()}")
-
-    if response.status_code != 200:
-        return None
-
-    data = response.json()
-
-    name = data["name"]
-    types = [t["type"]["name"].capitalize() for t in data["types"]]
-    strengths, weaknesses = get_strengths_and_weaknesses(types)
-    moves = [move["move"]["name"].capitalize() for move in data["moves"][:4]]
-    abilities = [ability["ability"]["name"].capitalize()
-                 for ability in data["abilities"]]
-    stats = {stat["stat"]["name"]: stat["base_stat"] for stat in data["stats"]}
-    print(f"DEBUG: {name} - Types: {types} - Strengths: {strengths} - Weaknesses: {weaknesses}")
-
-    return {
-        "id": data["id"],
-        "name": name,
-        "types": types,
-        "strengths": strengths,
-        "weaknesses": weaknesses,
-        "moves": moves,
-        "abilities": abilities,
-        "hp": stats.get("hp", 0),
-        "attack": stats.get("attack", 0),
-        "defense": stats.get("defense", 0),
-        "special_attack": stats.get("special-attack", 0),
-        "special_defense": stats.get("special-defense", 0),
-        "speed": stats.get("speed", 0),
-        "image_url":
-            f"https://img.pokemondb.net/artwork/large/{data['name'].lower()}.jpg"
-    }
+    return f"{POKEMON_IMAGE_BASE_URL}/{pokemon_name.lower()}.jpg"
 
 
 def fetch_pokemon_tcg_card(pokemon_name):
@@ -80,7 +52,8 @@ def fetch_pokemon_tcg_card(pokemon_name):
             dict: A dictionary with TCG card details, or None if no data is found.
     """
 
-    response = requests.get(f"{TCG_API_URL}?q=name:{pokemon_name}")
+    response = tcg_scheduler.get(f"{TCG_API_URL}?q=name:{pokemon_name}",
+                                 headers=TCG_API_HEADERS)
 
     if response.status_code != 200:
         return None
@@ -115,10 +88,11 @@ def fetch_trainer_data(trainer_name: str):
 
     query = "supertype:Trainer"
     url = f"{TCG_API_URL}?q={query}&pageSize=250"
-    print("Fetching trainer data with URL:", url)
-    response = requests.get(url, headers=TCG_API_HEADERS)
-    print("Status Code:", response.status_code)
-    print("Response Text:", response.text)
+    response = tcg_scheduler.get(url, headers=TCG_API_HEADERS)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Fetched trainer cards", extra={
+            "url": url, "status_code": response.status_code,
+            "body": truncate(response.text, 500), "sample_rate": 0.1})
     if response.status_code != 200:
         return None
     data = response.json()
@@ -155,10 +129,11 @@ def fetch_energy_data(energy_type: str):
 
     query = "supertype:Energy"
     url = f"{TCG_API_URL}?q={query}&pageSize=250"
-    print("Fetching energy data with URL:", url)
-    response = requests.get(url, headers=TCG_API_HEADERS)
-    print("Status Code:", response.status_code)
-    print("Response Text:", response.text)
+    response = tcg_scheduler.get(url, headers=TCG_API_HEADERS)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Fetched energy cards", extra={
+            "url": url, "status_code": response.status_code,
+            "body": truncate(response.text, 500), "sample_rate": 0.1})
     if response.status_code != 200:
         return None
     data = response.json()
@@ -0,0 +1,229 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from sqlalchemy import func
+from cache import cache_stats
+from database import SessionLocal
+from models import DeckPokemon
+from pokemon_catalogue import refresh_catalogue
+from profiling import METRICS
+from recommendations import load_catalogue, fetch_type_listing, has_valid_image
+from type_matchups import type_chart, counter_types
+from pokemon_provider import fetch_pokemon_data
+
+"""
+    This module warms the in-process caches right after startup, so the first
+    users after a deploy do not pay for every cold PokéAPI fetch, type listing
+    and image probe.
+
+    The warm-up runs in a background thread (the server accepts requests
+    straight away) and works through these stages:
+      - type_chart:    the reverse type look-ups used by the recommendations,
+      - catalogue:     the Trainer/Energy cards read from the database,
+      - pokemon_catalogue: the columnar Pokémon catalogue (pokemon_catalogue.py),
+      - pokemon:       the WARMUP_TOP_POKEMON most used Pokémon in decks,
+      - type_listings: the PokéAPI listing of every type,
+      - images:        PokémonDB image probes for the listed Pokémon
+                       (at most WARMUP_MAX_IMAGE_PROBES).
+    Network stages run on a pool of WARMUP_CONCURRENCY threads and stop
+    early once WARMUP_TIMEOUT_SECONDS is reached. A failing task is counted
+    and logged but never stops the warm-up.
+
+    GET /ready answers 503 until the warm-up has finished and 200 after,
+    with the duration, per-stage counts and cache hit rates. Set
+    WARMUP_ENABLED=0 to skip the warm-up (the app is then ready at once).
+"""
+
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "8"))
+WARMUP_TOP_POKEMON = int(os.getenv("WARMUP_TOP_POKEMON", "100"))
+WARMUP_MAX_IMAGE_PROBES = int(os.getenv("WARMUP_MAX_IMAGE_PROBES", "500"))
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "120"))
+
+METRICS.describe("warmup_duration_seconds", "How long the startup cache warm-up took.")
+
+
+def most_used_pokemon(limit: int):
+    """
+        Returns the ids of the Pokémon found in the most decks.
+        Args:
+            limit (int): Maximum number of ids.
+        Returns:
+            list: Pokémon ids, most used first.
+    """
+
+    db = SessionLocal()
+    try:
+        rows = (db.query(DeckPokemon.pokemon_id)
+                .group_by(DeckPokemon.pokemon_id)
+                .order_by(func.count(DeckPokemon.id).desc())
+                .limit(limit).all())
+        return [row.pokemon_id for row in rows]
+    finally:
+        db.close()
+
+
+def _load_catalogue():
+    db = SessionLocal()
+    try:
+        return load_catalogue(db)
+    finally:
+        db.close()
+
+
+class Warmup:
+    """
+        Runs the warm-up stages once and keeps their report.
+
+        Args:
+            concurrency (int): Threads used for network stages.
+            top_pokemon (int): How many of the most used Pokémon to preload.
+            max_image_probes (int): Cap on PokémonDB image probes.
+            timeout (float): Seconds after which remaining tasks are skipped.
+    """
+
+    def __init__(self, concurrency: int = WARMUP_CONCURRENCY,
+                 top_pokemon: int = WARMUP_TOP_POKEMON,
+                 max_image_probes: int = WARMUP_MAX_IMAGE_PROBES,
+                 timeout: float = WARMUP_TIMEOUT_SECONDS):
+        self.concurrency = max(1, concurrency)
+        self.top_pokemon = top_pokemon
+        self.max_image_probes = max_image_probes
+        self.timeout = timeout
+        self.state = "pending"
+        self.started = None
+        self.finished = None
+        self.stages = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._deadline = None
+
+    @property
+    def ready(self):
+        return self.state == "done"
+
+    def start(self):
+        """
+            Starts the warm-up in a background thread.
+        """
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="cache-warmup", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+            Asks a running warm-up to skip its remaining tasks and waits for it.
+        """
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _count(self, stage: str, outcome: str):
+        with self._lock:
+            counts = self.stages.setdefault(stage, {"ok": 0, "failed": 0, "skipped": 0})
+            counts[outcome] += 1
+
+    def _task(self, stage: str, func, *args):
+        if self._stop.is_set() or time.monotonic() > self._deadline:
+            self._count(stage, "skipped")
+            return None
+        try:
+            result = func(*args)
+        except Exception:
+            logger.warning("Warm-up task failed", exc_info=True,
+                           extra={"stage": stage, "task_args": args})
+            self._count(stage, "failed")
+            return None
+        self._count(stage, "ok" if result is not None else "failed")
+        return result
+
+    def run(self):
+        """
+            Runs all stages; called by start() or directly (e.g. in tests).
+        """
+
+        self.state = "running"
+        self.started = time.time()
+        self._deadline = time.monotonic() + self.timeout
+        start = time.perf_counter()
+
+        for type_name in type_chart:
+            self._task("type_chart", counter_types, type_name)
+        self._task("catalogue", _load_catalogue)
+        self._task("pokemon_catalogue", refresh_catalogue)
+        pokemon_ids = self._task("top_pokemon_query", most_used_pokemon, self.top_pokemon) or []
+
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix="warmup") as pool:
+            pokemon = [pool.submit(self._task, "pokemon", fetch_pokemon_data, pokemon_id)
+                       for pokemon_id in pokemon_ids]
+            listings = [pool.submit(self._task, "type_listings", fetch_type_listing, type_name)
+                        for type_name in type_chart]
+            wait(pokemon + listings)
+
+            names = []
+            seen = set()
+            for future in listings:
+                for entry in future.result() or []:
+                    if entry["name"] not in seen:
+                        seen.add(entry["name"])
+                        names.append(entry["name"])
+            probes = [pool.submit(self._task, "images", has_valid_image, name)
+                      for name in names[:self.max_image_probes]]
+            wait(probes)
+
+        duration = time.perf_counter() - start
+        self.finished = time.time()
+        self.state = "done"
+        METRICS.set("warmup_duration_seconds", value=duration)
+        logger.info("Cache warm-up finished", extra={
+            "duration_seconds": round(duration, 3), "stages": self.stages})
+
+    def report(self):
+        """
+            Returns:
+                dict: state, duration_seconds, per-stage counts and cache stats.
+        """
+
+        duration = None
+        if self.started is not None:
+            duration = round((self.finished or time.time()) - self.started, 3)
+        with self._lock:
+            stages = {name: dict(counts) for name, counts in self.stages.items()}
+        return {
+            "ready": self.ready,
+            "state": self.state,
+            "duration_seconds": duration,
+            "stages": stages,
+            "caches": cache_stats(),
+        }
+
+
+warmup = Warmup()
+
+if not WARMUP_ENABLED:
+    warmup.state = "done"
+
+router = APIRouter()
+
+
+@router.get("")
+def get_readiness():
+    """
+        Readiness probe: 503 while the startup warm-up is still running,
+        200 once it has finished. The body reports the warm-up duration,
+        per-stage task counts and cache hit rates.
+    """
+
+    return JSONResponse(warmup.report(), status_code=200 if warmup.ready else 503)
@@ -0,0 +1,343 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from deck_analytics import TYPES, WEIGHTS, energy_mask, score_arrays
+from models import Energy, DeckPokemon, DeckEnergy
+from pokemon_catalogue import get_catalogue
+
+"""
+    This module answers "which single card change would improve my deck the
+    most?".
+
+    The request handler loads the deck and the local card catalogue once into
+    an in-memory model (numpy arrays). Every candidate change (adding any
+    Pokémon or Energy card that is not in the deck, or removing any card that
+    is) becomes a variant of the deck, and all variants are scored with the
+    same vectorised score function as the deck itself.
+
+    Candidates are split into chunks and scored on a pool of worker
+    processes. Workers only receive arrays and run pure numpy code - no
+    database or HTTP access - so they stay cheap to start and safe to run in
+    parallel. Results are collected until the latency budget runs out; chunks
+    that did not finish in time are dropped and the answer is marked partial.
+    Small candidate sets are scored in-process, where the pool's overhead
+    would cost more than it saves.
+
+    Settings (environment variables):
+        WHATIF_WORKERS        worker processes (default: up to 4, one per CPU)
+        WHATIF_CHUNK_SIZE     candidates per task (default 256)
+        WHATIF_PARALLEL_MIN   smallest candidate count sent to the pool (default 1024)
+        WHATIF_BUDGET_MS      default latency budget (default 800)
+"""
+
+
+logger = logging.getLogger(__name__)
+
+WHATIF_WORKERS = int(os.getenv("WHATIF_WORKERS", str(min(4, os.cpu_count() or 1))))
+WHATIF_CHUNK_SIZE = int(os.getenv("WHATIF_CHUNK_SIZE", "256"))
+WHATIF_PARALLEL_MIN = int(os.getenv("WHATIF_PARALLEL_MIN", "1024"))
+WHATIF_BUDGET_MS = int(os.getenv("WHATIF_BUDGET_MS", "800"))
+
+ADD, REMOVE = 0, 1
+POKEMON, ENERGY = 0, 1
+
+_pool = None
+
+
+def get_pool():
+    """
+        Returns the shared worker pool, creating it on first use. Workers are
+        started with 'spawn' so they never inherit the server's threads,
+        sockets or database connections.
+    """
+
+    global _pool
+    if _pool is None and WHATIF_WORKERS > 0:
+        _pool = ProcessPoolExecutor(max_workers=WHATIF_WORKERS,
+                                    mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _noop():
+    return None
+
+
+def start_pool():
+    """
+        Starts the workers ahead of the first request (called from the app
+        lifespan), so the first what-if call does not pay for process start-up.
+    """
+
+    pool = get_pool()
+    if pool is not None:
+        for _ in range(WHATIF_WORKERS):
+            pool.submit(_noop)
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class DeckModel:
+    """
+        A deck and the candidate card changes, as plain arrays.
+
+        Base deck:
+            pokemon_ids, pokemon_types (n, 18), pokemon_stats (n,)
+            energy_ids, energy_types (m, 18)
+        Candidates (one entry per candidate change):
+            action (ADD/REMOVE), kind (POKEMON/ENERGY), card_id,
+            row (index in the base arrays, for removals),
+            types (18,) and stats for additions.
+    """
+
+    def __init__(self, deck_id: int):
+        self.deck_id = deck_id
+        self.catalogue = None
+        self.names = {}
+        n_types = len(TYPES)
+        self.pokemon_ids = np.zeros(0, dtype=np.int64)
+        self.pokemon_types = np.zeros((0, n_types), dtype=bool)
+        self.pokemon_stats = np.zeros(0, dtype=float)
+        self.energy_ids = np.zeros(0, dtype=np.int64)
+        self.energy_types = np.zeros((0, n_types), dtype=bool)
+        self.action = np.zeros(0, dtype=np.int8)
+        self.kind = np.zeros(0, dtype=np.int8)
+        self.card_id = np.zeros(0, dtype=np.int64)
+        self.row = np.zeros(0, dtype=np.int64)
+        self.add_types = np.zeros((0, n_types), dtype=bool)
+        self.add_stats = np.zeros(0, dtype=float)
+
+    def card_name(self, kind: int, card_id: int):
+        if kind == POKEMON:
+            record = self.catalogue.get(card_id) if self.catalogue is not None else None
+            return record.name if record is not None else None
+        return self.names.get((kind, card_id))
+
+    @property
+    def base(self):
+        return {"pokemon_types": self.pokemon_types, "pokemon_stats": self.pokemon_stats,
+                "energy_types": self.energy_types}
+
+    def candidates(self, start: int = 0, stop: int = None):
+        window = slice(start, stop)
+        return {"action": self.action[window], "kind": self.kind[window],
+                "row": self.row[window], "add_types": self.add_types[window],
+                "add_stats": self.add_stats[window]}
+
+
+def load_deck_model(db: Session, deck_id: int):
+    """
+        Loads a deck and the local catalogue into a DeckModel.
+        Args:
+            db (Session): The database session.
+            deck_id (int): The deck to analyse.
+        Returns:
+            DeckModel: The deck with one candidate per possible single change.
+    """
+
+    model = DeckModel(deck_id)
+    in_deck = set(db.execute(select(DeckPokemon.pokemon_id)
+                             .where(DeckPokemon.deck_id == deck_id)).scalars())
+    energy_in_deck = set(db.execute(select(DeckEnergy.energy_id)
+                                    .where(DeckEnergy.deck_id == deck_id)).scalars())
+
+    # Pokémon come from the shared in-memory catalogue as arrays; Energy
+    # cards are few and read from the database.
+    catalogue = get_catalogue()
+    model.catalogue = catalogue
+    pokemon_types = catalogue.type_matrix()
+    pokemon_stats = catalogue.records["stat_total"].astype(float)
+    in_deck_mask = np.isin(catalogue.ids, np.fromiter(in_deck, dtype=np.int64))
+    pokemon_deck = (catalogue.ids[in_deck_mask].astype(np.int64),
+                    pokemon_types[in_deck_mask], pokemon_stats[in_deck_mask])
+    pokemon_add = (catalogue.ids[~in_deck_mask].astype(np.int64),
+                   pokemon_types[~in_deck_mask], pokemon_stats[~in_deck_mask])
+
+    n_types = len(TYPES)
+    energy_deck_rows, energy_add_rows = [], []
+    for row in db.execute(select(Energy.id, Energy.name, Energy.energy_type)
+                          .order_by(Energy.id)):
+        model.names[(ENERGY, row.id)] = row.name
+        entry = (row.id, energy_mask(row.energy_type, row.name))
+        (energy_deck_rows if row.id in energy_in_deck else energy_add_rows).append(entry)
+
+    def energy_group(rows):
+        return (np.array([r[0] for r in rows], dtype=np.int64),
+                np.array([r[1] for r in rows], dtype=bool).reshape(-1, n_types),
+                np.zeros(len(rows)))
+
+    energy_deck, energy_add = energy_group(energy_deck_rows), energy_group(energy_add_rows)
+
+    model.pokemon_ids, model.pokemon_types, model.pokemon_stats = pokemon_deck
+    model.energy_ids, model.energy_types, _ = energy_deck
+
+    # Each group is (ids, types, stats).
+    groups = [
+        (ADD, POKEMON, pokemon_add),
+        (REMOVE, POKEMON, pokemon_deck),
+        (ADD, ENERGY, energy_add),
+        (REMOVE, ENERGY, energy_deck),
+    ]
+    model.action = np.concatenate([np.full(len(group[0]), action, dtype=np.int8)
+                                   for action, _, group in groups])
+    model.kind = np.concatenate([np.full(len(group[0]), kind, dtype=np.int8)
+                                 for _, kind, group in groups])
+    model.card_id = np.concatenate([group[0] for _, _, group in groups])
+    model.row = np.concatenate([np.arange(len(group[0])) if action == REMOVE
+                                else np.full(len(group[0]), -1) for action, _, group in groups])
+    model.add_types = np.concatenate([group[1] if action == ADD
+                                      else np.zeros((len(group[0]), n_types), dtype=bool)
+                                      for action, _, group in groups])
+    model.add_stats = np.concatenate([group[2] if action == ADD else np.zeros(len(group[0]))
+                                      for action, _, group in groups])
+    return model
+
+
+def _variant_links(base_rows: np.ndarray, n_variants: int, removed: np.ndarray,
+                   added: np.ndarray, added_rows: np.ndarray):
+    """
+        Builds (variant, row) link arrays for n_variants copies of a base set
+        of rows, where variant i drops base row removed[i] (if >= 0) and adds
+        added_rows[j] for each j with added[j] == i.
+    """
+
+    n = len(base_rows)
+    variant = np.repeat(np.arange(n_variants), n)
+    source = np.tile(np.arange(n), n_variants)
+    keep = source != np.repeat(removed, n)
+    variant = np.concatenate([variant[keep], added])
+    rows = np.concatenate([base_rows[source[keep]], added_rows])
+    return variant, rows
+
+
+def evaluate_candidates(base: dict, candidates: dict):
+    """
+        Scores every candidate variant of a deck. Pure numpy: runs in the
+        worker processes and needs no database or network access.
+        Args:
+            base (dict): pokemon_types, pokemon_stats and energy_types of the deck.
+            candidates (dict): action, kind, row, add_types and add_stats arrays.
+        Returns:
+            dict: "score" and one array per score component, per candidate.
+    """
+
+    action, kind = candidates["action"], candidates["kind"]
+    count = len(action)
+    candidate = np.arange(count)
+
+    removes_pokemon = (action == REMOVE) & (kind == POKEMON)
+    adds_pokemon = (action == ADD) & (kind == POKEMON)
+    removes_energy = (action == REMOVE) & (kind == ENERGY)
+    adds_energy = (action == ADD) & (kind == ENERGY)
+
+    pokemon_base = np.column_stack([base["pokemon_types"], base["pokemon_stats"]])
+    pokemon_added = np.column_stack([candidates["add_types"], candidates["add_stats"]])
+    pokemon_deck, pokemon_rows = _variant_links(
+        pokemon_base, count, np.where(removes_pokemon, candidates["row"], -1),
+        candidate[adds_pokemon], pokemon_added[adds_pokemon])
+    energy_deck, energy_rows = _variant_links(
+        base["energy_types"], count, np.where(removes_energy, candidates["row"], -1),
+        candidate[adds_energy], candidates["add_types"][adds_energy])
+
+    n_types = len(TYPES)
+    return score_arrays(count, pokemon_deck,
+                        pokemon_rows[:, :n_types].astype(bool), pokemon_rows[:, n_types],
+                        energy_deck, energy_rows.astype(bool))
+
+
+def _keep_scores(result: dict):
+    return {name: result[name] for name in ("score", *WEIGHTS)}
+
+
+def run_what_if(model: DeckModel, budget_ms: int = WHATIF_BUDGET_MS, limit: int = 10):
+    """
+        Scores all candidate changes within a latency budget and ranks them.
+        Args:
+            model (DeckModel): The deck and its candidates.
+            budget_ms (int): Time allowed for scoring, in milliseconds.
+            limit (int): How many of the best changes to return.
+        Returns:
+            dict: base score, candidate/evaluated counts, whether the result
+            is partial, elapsed time and the ranked "changes".
+    """
+
+    start = time.perf_counter()
+    deadline = start + budget_ms / 1000
+    base = _keep_scores(score_arrays(
+        1, np.zeros(len(model.pokemon_ids), dtype=np.intp), model.pokemon_types,
+        model.pokemon_stats, np.zeros(len(model.energy_ids), dtype=np.intp),
+        model.energy_types))
+
+    total = len(model.action)
+    chunks = [(i, min(i + WHATIF_CHUNK_SIZE, total)) for i in range(0, total, WHATIF_CHUNK_SIZE)]
+    results = {}
+    pool = get_pool() if total >= WHATIF_PARALLEL_MIN else None
+
+    if pool is not None:
+        try:
+            futures = {pool.submit(evaluate_candidates, model.base, model.candidates(a, b)): (a, b)
+                       for a, b in chunks}
+            done, pending = wait(futures, timeout=max(0.0, deadline - time.perf_counter()))
+            for future in pending:
+                future.cancel()
+            for future in done:
+                results[futures[future]] = _keep_scores(future.result())
+        except BrokenProcessPool:
+            logger.warning("What-if worker pool broke; scoring in-process")
+            shutdown_pool()
+    pooled = len(results)
+
+    # Whatever the pool did not deliver (small requests, a pool that is still
+    # starting, or a broken pool) is scored here until the budget runs out;
+    # at least one chunk is always scored.
+    for a, b in chunks:
+        if (a, b) in results:
+            continue
+        if results and time.perf_counter() > deadline:
+            break
+        results[(a, b)] = _keep_scores(evaluate_candidates(model.base, model.candidates(a, b)))
+
+    index = np.concatenate([np.arange(a, b) for a, b in sorted(results)]) if results \
+        else np.zeros(0, dtype=np.int64)
+    scores = {name: np.concatenate([results[key][name] for key in sorted(results)])
+              for name in ("score", *WEIGHTS)} if results else {}
+
+    changes = []
+    if len(index):
+        delta = scores["score"] - base["score"][0]
+        order = np.lexsort((model.card_id[index], -delta))[:limit]
+        for i in order:
+            candidate = index[i]
+            kind = int(model.kind[candidate])
+            card_id = int(model.card_id[candidate])
+            changes.append({
+                "action": "add" if model.action[candidate] == ADD else "remove",
+                "card_type": "pokemon" if kind == POKEMON else "energy",
+                "id": card_id,
+                "name": model.card_name(kind, card_id),
+                "score": int(scores["score"][i]),
+                "delta": int(delta[i]),
+                "component_deltas": {name: round(float(scores[name][i] - base[name][0]), 4)
+                                     for name in WEIGHTS},
+            })
+
+    return {
+        "deck_id": model.deck_id,
+        "base_score": int(base["score"][0]),
+        "candidates": total,
+        "evaluated": int(len(index)),
+        "partial": int(len(index)) < total,
+        "parallel": pooled > 0,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        "changes": changes,
+    }
@@ -0,0 +1,140 @@
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from database import load_environment, dispose_engine
+from logging_config import configure_logging
+
+"""
+    This module is the entry point of the background worker. It polls the
+    'jobs' table (see jobs.py), runs up to --concurrency jobs at a time in
+    threads, renews the leases of its running jobs and requeues jobs whose
+    worker died. Start as many workers as needed; each job type's
+    concurrency limit holds across all of them.
+
+    Usage (from the 'backend' folder):
+        python worker.py --concurrency 4
+        python worker.py --types tcg_sync,image_probe --once
+"""
+
+
+logger = logging.getLogger(__name__)
+
+WORKER_POLL_SECONDS = float(os.getenv("WORKER_POLL_SECONDS", "1"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+
+
+class Worker:
+    """
+        Claims and runs jobs until stopped.
+
+        Args:
+            concurrency (int): Jobs run at the same time by this worker.
+            types (list, optional): Job types to take; all by default.
+            poll_seconds (float): Pause when no job is due.
+    """
+
+    def __init__(self, concurrency: int = WORKER_CONCURRENCY, types=None,
+                 poll_seconds: float = WORKER_POLL_SECONDS):
+        self.concurrency = max(1, concurrency)
+        self.types = types
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self._running = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _run(self, job_id: int):
+        from database import SessionLocal
+        from models import Job
+        import jobs
+
+        db = SessionLocal()
+        try:
+            job = jobs.run_job(db, db.get(Job, job_id))
+            logger.info("Job %s (%s) %s", job.id, job.type, job.status)
+        except Exception:
+            logger.exception("Job %s could not be recorded", job_id)
+        finally:
+            db.close()
+            with self._lock:
+                self._running -= 1
+
+    def run_pending(self, pool: ThreadPoolExecutor) -> int:
+        """
+            Claims as many due jobs as there are free slots and submits them.
+            Returns:
+                int: The number of jobs started.
+        """
+
+        from database import SessionLocal
+        import jobs
+
+        started = 0
+        db = SessionLocal()
+        try:
+            jobs.requeue_expired(db)
+            jobs.renew_leases(db, self.worker_id)
+            while not self._stop.is_set():
+                with self._lock:
+                    if self._running >= self.concurrency:
+                        break
+                job = jobs.claim(db, self.worker_id, self.types)
+                if job is None:
+                    break
+                with self._lock:
+                    self._running += 1
+                pool.submit(self._run, job.id)
+                started += 1
+        finally:
+            db.close()
+        return started
+
+    def run(self, once: bool = False):
+        """
+            Polls for jobs until stop() is called; with once=True, returns
+            when no job is due and none is running.
+        """
+
+        logger.info("Worker %s started", self.worker_id)
+        with ThreadPoolExecutor(max_workers=self.concurrency,
+                                thread_name_prefix="job") as pool:
+            while not self._stop.is_set():
+                started = self.run_pending(pool)
+                with self._lock:
+                    idle = self._running == 0
+                if once and not started and idle:
+                    break
+                if not started:
+                    self._stop.wait(self.poll_seconds)
+        logger.info("Worker %s stopped", self.worker_id)
+
+    def stop(self):
+        self._stop.set()
+
+
+def main(argv=None):
+    load_environment()
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Run background jobs.")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY)
+    parser.add_argument("--types", help="Comma-separated job types (default: all).")
+    parser.add_argument("--poll", type=float, default=WORKER_POLL_SECONDS)
+    parser.add_argument("--once", action="store_true",
+                        help="Exit when the queue has no due jobs.")
+    args = parser.parse_args(argv)
+
+    worker = Worker(args.concurrency, args.types.split(",") if args.types else None, args.poll)
+    signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+    signal.signal(signal.SIGINT, lambda *_: worker.stop())
+    try:
+        worker.run(once=args.once)
+    finally:
+        dispose_engine()
+
+
+if __name__ == "__main__":
+    main()
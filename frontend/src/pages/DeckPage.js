@@ -27,6 +27,15 @@ import Footer from "../components/Footer";
 
 import ExpandableCardWrapper from "../components/ExpandableCardWrapper";
 import { getCanonicalPokemonName } from "../utils/pokemonNameUtils";
+import { thumbnailUrl } from "../utils/imageUtils";
+
+// Send the backend its "last_write" cookie, so reads right after a save or
+// delete are served from the primary database rather than a lagging replica.
+axios.interceptors.request.use((config) =>
+  config.url && config.url.startsWith("http://localhost:8000")
+    ? { ...config, withCredentials: true }
+    : config
+);
 
 const MAX_DECK_SIZE = 60;
 const MAX_POKEMON = 20;
@@ -181,6 +190,52 @@ function DeckPage() {
   const [caughtCardIndex, setCaughtCardIndex] = useState(null);
   const [isCatching, setIsCatching] = useState(false);
 
+  // ------------------ STREAMED RECOMMENDATIONS -------------------
+  // GET /deck and POST /deck answer without recommendations; they arrive one
+  // by one over Server-Sent Events and are appended to the deck data as they come.
+  const recommendationStreamRef = useRef(null);
+
+  const streamRecommendations = useCallback((deckResponse) => {
+    if (recommendationStreamRef.current) {
+      recommendationStreamRef.current.close();
+      recommendationStreamRef.current = null;
+    }
+    const streamToken = deckResponse.data.recommendations_token;
+    if (!streamToken) {
+      return;
+    }
+
+    const source = new EventSource(
+      `http://localhost:8000/deck/recommendations/stream?token=${encodeURIComponent(streamToken)}`
+    );
+    recommendationStreamRef.current = source;
+
+    source.addEventListener("recommendation", (event) => {
+      const rec = JSON.parse(event.data);
+      setDeckData((prev) => ({
+        ...prev,
+        recommendations: [...(prev.recommendations || []), rec]
+      }));
+    });
+    source.addEventListener("done", () => {
+      source.close();
+      setDeckData((prev) => {
+        localStorage.setItem("deckData", JSON.stringify(prev));
+        return prev;
+      });
+    });
+    // Do not let EventSource reconnect: that would append every item again.
+    source.onerror = () => source.close();
+  }, []);
+
+  useEffect(() => {
+    return () => {
+      if (recommendationStreamRef.current) {
+        recommendationStreamRef.current.close();
+      }
+    };
+  }, []);
+
   // --------------------- UNIFIED FETCH ----------------------
   const loadEverything = useCallback(async () => {
     if (!shouldFetchFromServer && token) {
@@ -252,6 +307,7 @@ function DeckPage() {
       };
       setDeckData(newDeckData);
       localStorage.setItem("deckData", JSON.stringify(newDeckData));
+      streamRecommendations(deckRes);
 
       setShouldFetchFromServer(false);
     } catch (err) {
@@ -259,7 +315,7 @@ function DeckPage() {
     } finally {
       setLoading(false);
     }
-  }, [selectedType, token, shouldFetchFromServer]);
+  }, [selectedType, token, shouldFetchFromServer, streamRecommendations]);
 
   useEffect(() => {
   if (!token) {
@@ -457,13 +513,22 @@ function DeckPage() {
       energy_types: deck.filter((c) => c.type === "energy").map((c) => c.energy_type || c.name)
     };
 
-    await axios.post("http://localhost:8000/deck", payload, {
+    const saveRes = await axios.post("http://localhost:8000/deck", payload, {
       headers: {
         Authorization: `Bearer ${token}`,
         "Content-Type": "application/json"
       }
     });
 
+    // The save answers at once with a stream token: recommendations start
+    // arriving while the full deck is loaded below.
+    setDeckData((prev) => ({
+      ...prev,
+      deck_score: saveRes.data.deck_score || 0,
+      recommendations: []
+    }));
+    streamRecommendations(saveRes);
+
     const deckRes = await axios.get("http://localhost:8000/deck", {
       headers: { Authorization: `Bearer ${token}` }
     });
@@ -474,19 +539,20 @@ function DeckPage() {
       energy: []
     };
 
-    const newDeckData = {
-      deck: {
-        pokemon: serverDeck.pokemon || [],
-        trainers: serverDeck.trainers || [],
-        energy: serverDeck.energy || []
-      },
-      deck_score: deckRes.data.deck_score || 0,
-      recommendations: deckRes.data.recommendations || [],
-      suggestionImage: deckRes.data.suggestionImage || null
-    };
-
-    setDeckData(newDeckData);
-    localStorage.setItem("deckData", JSON.stringify(newDeckData));
+    setDeckData((prev) => {
+      const newDeckData = {
+        ...prev,
+        deck: {
+          pokemon: serverDeck.pokemon || [],
+          trainers: serverDeck.trainers || [],
+          energy: serverDeck.energy || []
+        },
+        deck_score: deckRes.data.deck_score || 0,
+        suggestionImage: deckRes.data.suggestionImage || null
+      };
+      localStorage.setItem("deckData", JSON.stringify(newDeckData));
+      return newDeckData;
+    });
 
     setDeck([]);
 
@@ -952,7 +1018,7 @@ function DeckPage() {
                           >
                             {card.type === "pokemon" ? (
                               <img
-                                src={`https://img.pokemondb.net/artwork/large/${getCanonicalPokemonName(card.name)}.jpg`}
+                                src={thumbnailUrl(`https://img.pokemondb.net/artwork/large/${getCanonicalPokemonName(card.name)}.jpg`, "small")}
                                 alt={card.name}
                                 className="card-img"
 
@@ -964,7 +1030,7 @@ function DeckPage() {
                               />
                             ) : (
                               <img
-                                src={card.tcg_image_url}
+                                src={thumbnailUrl(card.tcg_image_url, "small")}
                                 alt={card.name}
                                 className="card-img"
                               />
@@ -1090,7 +1156,7 @@ function DeckPage() {
                               }}
                             >
                               <img
-                                src={`https://img.pokemondb.net/artwork/large/${getCanonicalPokemonName(selectedCardDetail.name)}.jpg`}
+                                src={thumbnailUrl(`https://img.pokemondb.net/artwork/large/${getCanonicalPokemonName(selectedCardDetail.name)}.jpg`, "medium")}
                                 alt={selectedCardDetail.name}
                                 className="detail-img"
                                 onError={(e) => {
@@ -1210,7 +1276,7 @@ function DeckPage() {
                           <div className="trainer-detail-container">
                             <div className="trainer-detail-image-container">
                               <img
-                                src={selectedCardDetail.tcg_image_url}
+                                src={thumbnailUrl(selectedCardDetail.tcg_image_url, "medium")}
                                 alt={selectedCardDetail.name}
                                 className="tcg-zoom"
                               />
@@ -1273,7 +1339,7 @@ function DeckPage() {
                           <div className="energy-detail-container">
                             <div className="energy-detail-image-container">
                               <img
-                                src={selectedCardDetail.tcg_image_url}
+                                src={thumbnailUrl(selectedCardDetail.tcg_image_url, "medium")}
                                 alt={selectedCardDetail.name}
                                 className="tcg-zoom"
                               />
@@ -1357,7 +1423,7 @@ function DeckPage() {
                             <div key={index} className="recommendation-card">
                               {rec.tcg_image_url && (
                                 <img
-                                  src={rec.tcg_image_url}
+                                  src={thumbnailUrl(rec.tcg_image_url, "small")}
                                   alt={rec.name}
                                   style={{
                                     width: "200px",
@@ -1691,7 +1757,7 @@ function DeckPage() {
                         <img src={deleteIcon} alt="Delete card" className="delete-icon" />
                       </div>
                         <img
-                          src={`https://img.pokemondb.net/artwork/large/${getCanonicalPokemonName(card.name)}.jpg`}
+                          src={thumbnailUrl(`https://img.pokemondb.net/artwork/large/${getCanonicalPokemonName(card.name)}.jpg`, "small")}
                           alt={card.name}
                           className="deck-pokemon-img"
                         />
@@ -1844,7 +1910,7 @@ function DeckPage() {
                             }`}
                           >
                           <img
-                            src={card.tcg_image_url}
+                            src={thumbnailUrl(card.tcg_image_url, "small")}
                             alt={card.name}
                             style={{ width: "200px", height: "250px", objectFit: "contain" }}
                           />
@@ -1934,7 +2000,7 @@ function DeckPage() {
                           }`}
                         >
                         <img
-                          src={card.tcg_image_url}
+                          src={thumbnailUrl(card.tcg_image_url, "small")}
                           alt={card.name}
                           style={{ width: "200px", height: "250px", objectFit: "contain" }}
                         />
@@ -0,0 +1,10 @@
+const IMAGE_PROXY_URL = "http://localhost:8000/images";
+
+// Serves a card or Pokémon image through the backend's image cache, resized
+// to one of its fixed sizes ("thumb", "small", "medium" or "original").
+export function thumbnailUrl(url, size = "small") {
+  if (!url) {
+    return url;
+  }
+  return `${IMAGE_PROXY_URL}?url=${encodeURIComponent(url)}&size=${size}`;
+}